@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, ClassVar
+from typing import List, ClassVar, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,22 +16,141 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # Modo stateless: o access token carrega id, status e versão do usuário
+    AUTH_STATELESS: bool = False
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    TOKEN_VERSION_CACHE_TTL_SECONDS: int = 30
     
     ENVIRONMENT: str = "development"
+
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    # Ex.: "/auth=DEBUG,/orders=WARNING"
+    LOG_ROUTE_LEVELS: str = ""
+    # Fração de requisições com logs INFO/DEBUG mantidos, ex.: "/products=0.05"
+    LOG_ROUTE_SAMPLING: str = ""
+
+    # Comandos do MongoDB acima disso vão para o log de queries lentas
+    SLOW_QUERY_MS: float = 100.0
+    QUERY_MONITOR_MAX_SHAPES: int = 500
+    # explain() de uma amostra dos formatos lentos, para achar COLLSCAN
+    QUERY_EXPLAIN_ENABLED: bool = False
+    QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    QUERY_EXPLAIN_INTERVAL_SECONDS: int = 60
+
+    # Fases da requisição (auth, db, handler, serialização) no Server-Timing
+    TRACING_ENABLED: bool = True
+    # Sem valor, o header só sai em desenvolvimento: ele expõe tempos internos
+    TRACE_SERVER_TIMING: Optional[bool] = None
+    # Arquivo JSON lines no formato OTLP; vazio = não exporta
+    TRACE_EXPORT_PATH: str = ""
+    TRACE_SAMPLE_RATE: float = 1.0
+    # Em desenvolvimento, avisa quando uma requisição repete a mesma query
+    N_PLUS_ONE_THRESHOLD: int = 5
+
+    # Aquece schema OpenAPI, backend do bcrypt e cliente OAuth antes do primeiro request
+    STARTUP_WARMUP: bool = False
+    # Obsoleto: os pagamentos usam o simulador do gateway (PAYMENT_GATEWAY).
+    # Mantido só para arquivos .env antigos continuarem válidos
     DEMO_MODE: bool = False
+
+    # "simulator" (local, sem rede) ou "http"
+    PAYMENT_GATEWAY: str = "simulator"
+    PAYMENT_GATEWAY_URL: str = ""
+    PAYMENT_GATEWAY_API_KEY: str = ""
+    PAYMENT_GATEWAY_TIMEOUT: float = 10.0
+    PAYMENT_GATEWAY_MAX_CONNECTIONS: int = 20
+    PAYMENT_GATEWAY_MAX_RETRIES: int = 2
+    # Fração das requisições que pode virar retentativa
+    PAYMENT_GATEWAY_RETRY_BUDGET: float = 0.1
+    PAYMENT_SIMULATOR_LATENCY_MS: float = 300.0
+    PAYMENT_SIMULATOR_JITTER_MS: float = 200.0
+    PAYMENT_SIMULATOR_FAILURE_RATE: float = 0.02
+    PAYMENT_SIMULATOR_DECLINE_RATE: float = 0.05
+    PAYMENT_SIMULATOR_PIX_CONFIRM_SECONDS: int = 30
+
+    RECONCILIATION_ENABLED: bool = True
+    RECONCILIATION_INTERVAL_SECONDS: int = 300
+    RECONCILIATION_BATCH_SIZE: int = 1000
+    RECONCILIATION_CONCURRENCY: int = 10
+    # Pedidos pendentes sem pagamento aprovado após esse prazo são cancelados
+    PAYMENT_EXPIRATION_MINUTES: int = 1440
     
     ALLOWED_ORIGINS: str = "http://localhost:3000"
     
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 5242880  
+    UPLOAD_CHUNK_SIZE: int = 65536
+    UPLOAD_CONCURRENCY: int = 3
+    # Processos que geram as variantes (thumb/medium) das imagens
+    IMAGE_WORKERS: int = 1
+    IMAGE_QUALITY: int = 80
     
     GOOGLE_CLIENT_ID: str = ""
     GOOGLE_CLIENT_SECRET: str = ""
     GOOGLE_REDIRECT_URI: str = ""
-    
+
+    OUTBOX_WORKERS: int = 2
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    OUTBOX_BACKOFF_BASE: float = 2.0
+    OUTBOX_BACKOFF_MAX: float = 300.0
+    OUTBOX_LEASE_SECONDS: int = 60
+
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_CACHE_SIZE: int = 1024
+    IDEMPOTENCY_LOCK_SECONDS: int = 60
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 10.0
+
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_INTERVAL_SECONDS: int = 21600
+
+    IMAGE_GC_ENABLED: bool = True
+    IMAGE_GC_INTERVAL_SECONDS: int = 3600
+    IMAGE_GC_GRACE_SECONDS: int = 86400
+    IMAGE_GC_BATCH_SIZE: int = 500
+
+    INVENTORY_FLUSH_INTERVAL: float = 1.0
+    INVENTORY_BATCH_SIZE: int = 1000
+
+    BULK_STATUS_BATCH_SIZE: int = 500
+
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
+
+    # 0 = usa o padrão do passlib, ou calibra no startup se habilitado
+    BCRYPT_ROUNDS: int = 0
+    BCRYPT_CALIBRATE_ON_STARTUP: bool = False
+    BCRYPT_TARGET_MS: float = 250.0
+    BCRYPT_MIN_ROUNDS: int = 10
+    BCRYPT_MAX_ROUNDS: int = 15
+
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_TRUST_PROXY: bool = False
+    LOGIN_IP_BURST: int = 20
+    LOGIN_IP_PER_MINUTE: float = 20
+    LOGIN_ACCOUNT_BURST: int = 5
+    LOGIN_ACCOUNT_PER_MINUTE: float = 5
+    REGISTER_IP_BURST: int = 5
+    REGISTER_IP_PER_MINUTE: float = 5
+    LOCKOUT_THRESHOLD: int = 5
+    LOCKOUT_BASE_SECONDS: int = 30
+    LOCKOUT_MAX_SECONDS: int = 900
+
     def get_allowed_origins(self) -> List[str]:
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
     
+    def server_timing_enabled(self) -> bool:
+        if self.TRACE_SERVER_TIMING is not None:
+            return self.TRACE_SERVER_TIMING
+        return self.ENVIRONMENT == "development"
+    
     def get_google_redirect_uri(self) -> str:
         """
         Retorna a URI de redirect correta baseada no ambiente
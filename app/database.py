@@ -1,12 +1,26 @@
+import logging
+from contextlib import contextmanager
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 from fastapi import HTTPException
 from app.config import settings
+from app.utils.query_monitor import query_monitor
 import certifi
 
 client = None
 db = None
 
+logger = logging.getLogger(__name__)
+
+# Listeners de monitoramento do pymongo (comandos, pool); precisam ser
+# registrados antes do primeiro uso do cliente
+_event_listeners = [query_monitor]
+
+
+def register_event_listener(listener) -> None:
+    _event_listeners.append(listener)
+
+
 class CollectionWrapper:
     def __init__(self, collection_name: str):
         self.collection_name = collection_name
@@ -24,6 +38,15 @@ users_collection = CollectionWrapper("users")
 products_collection = CollectionWrapper("products")
 carts_collection = CollectionWrapper("carts")
 orders_collection = CollectionWrapper("orders")
+orders_archive_collection = CollectionWrapper("orders_archive")
+outbox_collection = CollectionWrapper("outbox")
+outbox_dead_letter_collection = CollectionWrapper("outbox_dead_letter")
+idempotency_collection = CollectionWrapper("idempotency_keys")
+inventory_ledger_collection = CollectionWrapper("inventory_ledger")
+refresh_tokens_collection = CollectionWrapper("refresh_tokens")
+image_blobs_collection = CollectionWrapper("image_blobs")
+payments_collection = CollectionWrapper("payments")
+reconciliation_runs_collection = CollectionWrapper("reconciliation_runs")
 
 
 def get_client():
@@ -35,18 +58,27 @@ def get_client():
                 server_api=ServerApi('1'),
                  tlsCAFile=certifi.where(),
                 serverSelectionTimeoutMS=10000,
-                tls=True
+                tls=True,
+                event_listeners=_event_listeners
             )
             client.admin.command("ping")
             db = client[settings.DB_NAME]
-            print("Conectado ao MongoDB com sucesso!")
+            logger.info("Conectado ao MongoDB com sucesso!")
         except Exception as e:
-            print(f"Falha na conexão com MongoDB: {e}")
+            logger.error("Falha na conexão com MongoDB: %s", e)
             client = None
             db = None
     return client, db
 
 
+def connect_local(uri: str, db_name: str) -> None:
+    """Conecta a um MongoDB local, sem TLS (benchmarks e testes de carga)"""
+    global client, db
+    client = MongoClient(uri, serverSelectionTimeoutMS=5000, event_listeners=_event_listeners)
+    client.admin.command("ping")
+    db = client[db_name]
+
+
 def get_db():
     _, database = get_client()
     if database is None:
@@ -54,13 +86,58 @@ def get_db():
     return database
 
 
+def supports_transactions() -> bool:
+    """Transações só existem em replica sets e clusters shardados"""
+    cli, _ = get_client()
+    if cli is None:
+        return False
+    topology = cli.topology_description.topology_type_name
+    return topology in ("ReplicaSetWithPrimary", "Sharded")
+
+
+@contextmanager
+def start_transaction():
+    """
+    Abre uma sessão com transação multi-documento.
+    Em servidores standalone (desenvolvimento local) devolve None e as
+    operações seguem sem transação.
+    """
+    if not supports_transactions():
+        get_db()
+        yield None
+        return
+
+    cli, _ = get_client()
+    with cli.start_session() as session:
+        with session.start_transaction():
+            yield session
+
+
+def ensure_indexes() -> None:
+    """Índices das coleções principais"""
+    orders_collection.create_index("order_number")
+    orders_collection.create_index([("created_at", 1), ("status", 1)])
+    orders_archive_collection.create_index([("created_at", 1), ("status", 1)])
+    refresh_tokens_collection.create_index("expires_at", expireAfterSeconds=0)
+    refresh_tokens_collection.create_index("family")
+    payments_collection.create_index("order_id")
+    # Um único pagamento ativo (em andamento ou aprovado) por pedido
+    payments_collection.create_index(
+        "order_id",
+        unique=True,
+        partialFilterExpression={"active": True},
+        name="order_active_payment"
+    )
+    payments_collection.create_index([("status", 1), ("created_at", 1)])
+
+
 def test_connection() -> bool:
     """Testa a conexão com o MongoDB"""
     cli, _ = get_client()
     if cli:
-        print("Ping ao MongoDB OK")
+        logger.info("Ping ao MongoDB OK")
         return True
-    print("Falha no ping ao MongoDB")
+    logger.error("Falha no ping ao MongoDB")
     return False
 
 
@@ -68,8 +145,8 @@ def init_collections() -> bool:
     """Verifica se as collections estão disponíveis"""
     try:
         get_db()
-        print("Collections prontas.")
+        logger.info("Collections prontas.")
         return True
     except Exception as e:
-        print(f"Não foi possível carregar as collections: {e}")
+        logger.error("Não foi possível carregar as collections: %s", e)
         return False
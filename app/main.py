@@ -1,14 +1,33 @@
 import os
+import asyncio
+import logging
 from datetime import datetime
-from fastapi import FastAPI
+from fastapi import FastAPI, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from starlette.middleware.sessions import SessionMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.database import test_connection, init_collections
+from app import database
 from app.routes import auth, products, cart, orders, uploads, payments
+from app.utils.outbox import outbox_worker
+from app.utils import idempotency, archive, inventory, images, upload, image_gc, reconciliation
+from app.utils.payment_gateway import payment_gateway
+from app.utils.upload import ImmutableStaticFiles
+from app.utils import scheduler
+from app.utils.scheduler import register_job, start_jobs, stop_jobs
+from app.utils.password_pool import password_pool
+from app.utils.auth import user_cache, configure_bcrypt_rounds, get_current_admin_user
+from app.utils.log import setup_logging, shutdown_logging, RequestContextMiddleware
+from app.utils.startup import startup_timer, warm_up, FirstResponseMiddleware
+from app.utils.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, register_stats, render
+from app.utils.query_monitor import query_monitor, QueryCountMiddleware
+from app.utils import tracing
+from app.utils.tracing import TracingMiddleware
+
+setup_logging()
+logger = logging.getLogger("app.main")
 
 
 @asynccontextmanager
@@ -16,23 +35,80 @@ async def lifespan(app: FastAPI):
     """
     Gerencia o ciclo de vida da aplicação
     """
-    print(f"\n{'='*60}")
-    print(f"Iniciando aplicação - Ambiente: {settings.ENVIRONMENT}")
-    print(f"{'='*60}\n")
+    startup_timer.mark_startup()
+    logger.info("Iniciando aplicação", extra={"environment": settings.ENVIRONMENT})
     
     test_connection()
     init_collections()
+    for module in (database, idempotency, archive, inventory, upload, reconciliation):
+        try:
+            module.ensure_indexes()
+        except Exception:
+            logger.exception("Não foi possível criar índices", extra={"indexes": module.__name__})
+    if not settings.BCRYPT_ROUNDS and settings.BCRYPT_CALIBRATE_ON_STARTUP:
+        from app.utils.bcrypt_tuning import calibrate_bcrypt_rounds
+        rounds, elapsed = await asyncio.to_thread(calibrate_bcrypt_rounds)
+        configure_bcrypt_rounds(rounds)
+        logger.info("bcrypt calibrado", extra={"rounds": rounds, "hash_ms": round(elapsed, 1)})
+    
+    if settings.STARTUP_WARMUP:
+        warm_up(app)
     
-    print(f"\n{'='*60}")
-    print("API inicializada com sucesso!")
-    if settings.ENVIRONMENT == "development":
-        print("Documentação: /docs")
-    print(f"{'='*60}\n")
+    await outbox_worker.start()
+    await start_jobs()
+    
+    startup_timer.mark_ready()
+    logger.info("API inicializada com sucesso!", extra=startup_timer.stats())
     
     yield
     
     # Shutdown
-    print("\nEncerrando aplicação...")
+    logger.info("Encerrando aplicação...")
+    await stop_jobs()
+    await outbox_worker.stop()
+    await payment_gateway.aclose()
+    password_pool.shutdown()
+    images.shutdown()
+    tracing.shutdown()
+    shutdown_logging()
+
+
+register_job(
+    "inventory-projection",
+    settings.INVENTORY_FLUSH_INTERVAL,
+    inventory.apply_pending
+)
+
+if settings.ARCHIVE_ENABLED:
+    register_job(
+        "archive-orders",
+        settings.ARCHIVE_INTERVAL_SECONDS,
+        archive.archive_orders,
+        initial_delay=60
+    )
+
+if settings.RECONCILIATION_ENABLED:
+    register_job(
+        "payment-reconciliation",
+        settings.RECONCILIATION_INTERVAL_SECONDS,
+        reconciliation.reconcile_payments,
+        initial_delay=30
+    )
+
+if settings.QUERY_EXPLAIN_ENABLED:
+    register_job(
+        "query-explain",
+        settings.QUERY_EXPLAIN_INTERVAL_SECONDS,
+        query_monitor.explain_pending
+    )
+
+if settings.IMAGE_GC_ENABLED:
+    register_job(
+        "image-gc",
+        settings.IMAGE_GC_INTERVAL_SECONDS,
+        image_gc.collect_orphans,
+        initial_delay=120
+    )
 
 
 # Criar diretório de uploads
@@ -47,6 +123,9 @@ app = FastAPI(
     redoc_url="/redoc" if settings.ENVIRONMENT == "development" else None,
 )
 
+# Request id e contexto de log por requisição
+app.add_middleware(RequestContextMiddleware)
+
 # Middleware de sessão (necessário para OAuth)
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
@@ -59,8 +138,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Mede o time-to-first-response do processo
+app.add_middleware(FirstResponseMiddleware)
+
+# Fases da requisição no Server-Timing (usa as queries contadas abaixo)
+app.add_middleware(TracingMiddleware)
+
+# Queries do MongoDB por requisição
+app.add_middleware(QueryCountMiddleware)
+
+# Latência e status por rota para o /metrics (mais externo, mede tudo)
+app.add_middleware(MetricsMiddleware)
+
+register_stats("user_cache", user_cache.stats, "Cache de usuários autenticados")
+register_stats("password_pool", password_pool.stats, "Pool de hash de senhas")
+register_stats("outbox", outbox_worker.stats, "Fila da outbox")
+register_stats("payment_gateway", payment_gateway.stats, "Cliente do gateway de pagamento")
+register_stats("jobs", scheduler.stats, "Jobs periódicos")
+register_stats("startup", startup_timer.stats, "Cold start do processo")
+register_stats("query_monitor", query_monitor.stats, "Comandos do MongoDB")
+
 # Servir arquivos estáticos (uploads)
-app.mount(f"/{settings.UPLOAD_DIR}", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+app.mount(f"/{settings.UPLOAD_DIR}", ImmutableStaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
 
 @app.get("/health", tags=["health"])
@@ -72,6 +171,51 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Síncrono: roda no threadpool, já que alguns stats consultam o MongoDB
+    return Response(render(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+@app.get("/health/outbox", tags=["health"])
+async def outbox_health():
+    return outbox_worker.stats()
+
+
+@app.get("/health/password-pool", tags=["health"])
+async def password_pool_health():
+    return password_pool.stats()
+
+
+@app.get("/health/user-cache", tags=["health"])
+async def user_cache_health():
+    return user_cache.stats()
+
+
+@app.get("/health/payment-gateway", tags=["health"])
+async def payment_gateway_health():
+    return payment_gateway.stats()
+
+
+@app.get("/health/startup", tags=["health"])
+async def startup_health():
+    return startup_timer.stats()
+
+
+@app.get("/health/queries", tags=["health"])
+async def queries_health(
+    limit: int = 20,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Formatos de query com mais tempo no MongoDB e queries por rota (somente administradores)"""
+    return {
+        "slow_query_ms": settings.SLOW_QUERY_MS,
+        **query_monitor.stats(),
+        "top_offenders": query_monitor.top_offenders(min(max(limit, 1), 100)),
+        "routes": query_monitor.route_stats(),
+    }
+
+
 # Incluir routers
 app.include_router(auth.router)
 app.include_router(products.router)
@@ -129,4 +129,28 @@ class OrderStatsResponse(BaseModel):
     total_spent: float
     pending_orders: int
     completed_orders: int
-    cancelled_orders: int
\ No newline at end of file
+    cancelled_orders: int
+
+class BulkStatusRow(BaseModel):
+    order_number: str = Field(..., min_length=1, max_length=50)
+    status: OrderStatus
+    tracking_code: Optional[str] = Field(None, max_length=100)
+
+    @validator('status')
+    def reject_cancellation(cls, v):
+        # Cancelar devolve estoque pelo ledger; só o endpoint de cancelamento faz isso
+        if v == OrderStatus.CANCELLED:
+            raise ValueError("cancelamento não é aceito em lote, use POST /orders/{id}/cancel")
+        return v
+
+class BulkStatusRowError(BaseModel):
+    row: int
+    order_number: Optional[str] = None
+    error: str
+
+class BulkStatusReport(BaseModel):
+    total_rows: int
+    updated: int
+    not_found: int
+    invalid: int
+    errors: List[BulkStatusRowError] = Field(default_factory=list)
@@ -1,11 +1,41 @@
 from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
 
 class CardPayment(BaseModel):
+    order_id: str
     card_number: str
     card_holder: str
     expiry_date: str
     cvv: str
-    amount: float
+    # Opcional: se enviado, precisa bater com o total do pedido
+    amount: Optional[float] = None
 
 class PixPayment(BaseModel):
-    amount: float
+    order_id: str
+    amount: Optional[float] = None
+
+class PaymentResponse(BaseModel):
+    payment_id: str
+    order_id: str
+    status: str
+    order_status: str
+    transaction_id: Optional[str] = None
+    pix_code: Optional[str] = None
+    message: str
+    created_at: datetime
+
+class ReconciliationRun(BaseModel):
+    id: str
+    started_at: datetime
+    finished_at: datetime
+    duration_seconds: float
+    batches: int
+    orders_scanned: int
+    payments_checked: int
+    confirmed: int
+    declined: int
+    expired: int
+    stock_released: int
+    refunds_flagged: int
+    gateway_errors: int
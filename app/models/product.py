@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -47,6 +47,9 @@ class ProductUpdate(BaseModel):
 class ProductResponse(ProductBase):
     id: str
     image_urls: List[str] = Field(default_factory=list)
+    # {chave da imagem: {variante: {formato: url}}}
+    image_variants: Dict[str, Dict[str, Dict[str, str]]] = Field(default_factory=dict)
+    thumbnail_url: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     created_by: str
@@ -1,26 +1,38 @@
 import json
-import traceback
-from fastapi import APIRouter, HTTPException, status, Depends
+import logging
+from fastapi import APIRouter, HTTPException, status, Depends, BackgroundTasks
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import timedelta, datetime
+from datetime import datetime
 from pydantic import BaseModel, Field
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from app.database import users_collection
-from app.models.user import UserCreate, UserResponse, Token
+from app.models.user import UserCreate, UserResponse, Token, RefreshTokenRequest
 from app.utils.auth import (
-    verify_password, 
-    get_password_hash, 
-    create_access_token,
-    get_current_active_user
+    verify_password_async,
+    get_password_hash_async,
+    password_needs_rehash,
+    rehash_password,
+    create_user_access_token,
+    issue_tokens,
+    rotate_refresh_token,
+    revoke_user_tokens,
+    get_current_active_user,
+    get_current_admin_user,
+    invalidate_cached_user
 )
 from app.config import settings
-from app.utils.google_oauth import oauth
+from app.utils.google_oauth import get_oauth
+from app.utils.rate_limit import auth_throttle, throttle_ip
+from app.utils.tracing import TracedRoute
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 import urllib.parse
 
-router = APIRouter(prefix="/auth", tags=["Autenticação"])
+router = APIRouter(prefix="/auth", tags=["Autenticação"], route_class=TracedRoute)
+
+logger = logging.getLogger(__name__)
 
 
 class UpdateProfileRequest(BaseModel):
@@ -33,7 +45,10 @@ class ChangePasswordRequest(BaseModel):
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate):
+async def register(
+    user: UserCreate,
+    _throttle: None = Depends(throttle_ip("register", settings.REGISTER_IP_BURST, settings.REGISTER_IP_PER_MINUTE))
+):
     """Registra um novo usuário"""
     
     try:
@@ -50,10 +65,11 @@ async def register(user: UserCreate):
             )
 
         try:
-            hashed_password = get_password_hash(user.password)
-        except Exception as e:
-            print(f"Erro ao fazer hash da senha: {e}")
-            traceback.print_exc()
+            hashed_password = await get_password_hash_async(user.password)
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Erro ao fazer hash da senha")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Erro ao processar senha. Tente uma senha mais curta."
@@ -79,9 +95,8 @@ async def register(user: UserCreate):
                     detail="Erro ao recuperar usuário criado"
                 )
                 
-        except Exception as e:
-            print(f"Erro ao inserir no MongoDB: {e}")
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Erro ao inserir usuário no MongoDB")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Erro ao salvar usuário no banco de dados"
@@ -98,9 +113,8 @@ async def register(user: UserCreate):
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Erro inesperado no registro: {e}")
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Erro inesperado no registro")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Erro no servidor"
@@ -108,30 +122,32 @@ async def register(user: UserCreate):
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(
+    background_tasks: BackgroundTasks,
+    _throttle: None = Depends(throttle_ip("login")),
+    form_data: OAuth2PasswordRequestForm = Depends()
+):
     
-    print(f" Tentativa de login:")
-    print(f"   Username: {form_data.username}")
-    print(f"   Password length: {len(form_data.password)}")
+    logger.debug("Tentativa de login", extra={"email": form_data.username.lower()})
+
+    auth_throttle.check_account("login", form_data.username)
 
     user = users_collection.find_one({"email": form_data.username.lower()})
     
     if not user:
-        print(f"Usuário não encontrado: {form_data.username.lower()}")
+        logger.info("Login recusado: usuário não encontrado", extra={"email": form_data.username.lower()})
+        auth_throttle.record_failure(form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou senha incorretos",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    print(f"Usuário encontrado: {user['email']}")
-    print(f"   Hash armazenado: {user['hashed_password'][:20]}...")
-    
-    password_valid = verify_password(form_data.password, user["hashed_password"])
-    print(f"   Senha válida: {password_valid}")
+    password_valid = await verify_password_async(form_data.password, user["hashed_password"])
     
     if not password_valid:
-        print(f"Senha incorreta para: {form_data.username}")
+        logger.info("Login recusado: senha incorreta", extra={"email": user["email"]})
+        auth_throttle.record_failure(form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou senha incorretos",
@@ -144,22 +160,24 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             detail="Usuário inativo. Entre em contato com o suporte."
         )
 
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user["email"]},
-        expires_delta=access_token_expires
-    )
+    auth_throttle.record_success(form_data.username)
+
+    if password_needs_rehash(user["hashed_password"]):
+        background_tasks.add_task(
+            rehash_password, user["_id"], form_data.password, user["hashed_password"]
+        )
+
+    tokens = issue_tokens(user)
 
     users_collection.update_one(
         {"_id": user["_id"]},
         {"$set": {"last_login": datetime.utcnow()}}
     )
 
-    print(f"Login bem-sucedido: {user['email']}")
+    logger.info("Login bem-sucedido", extra={"user_id": str(user["_id"])})
 
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **tokens,
         "user": {
             "id": str(user["_id"]),
             "email": user["email"],
@@ -171,10 +189,30 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     }
 
 
+@router.post("/refresh", response_model=Token)
+async def refresh(data: RefreshTokenRequest):
+    """Troca um refresh token por um novo par de tokens (rotação)"""
+
+    if not settings.AUTH_STATELESS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Refresh tokens não estão habilitados"
+        )
+
+    return rotate_refresh_token(data.refresh_token)
+
+
 @router.get("/me", response_model=UserResponse)
 async def get_me(current_user: dict = Depends(get_current_active_user)):
     """Retorna dados do usuário logado"""
 
+    if "created_at" not in current_user:
+        # Token stateless traz só o essencial; o perfil completo vem do banco
+        current_user = users_collection.find_one(
+            {"_id": current_user["_id"]},
+            {"hashed_password": 0}
+        )
+
     return {
         "id": str(current_user["_id"]),
         "email": current_user["email"],
@@ -202,6 +240,8 @@ async def update_me(
         }
     )
 
+    invalidate_cached_user(current_user["email"])
+
     updated_user = users_collection.find_one({"_id": current_user["_id"]})
 
     return {
@@ -217,11 +257,17 @@ async def update_me(
 @router.post("/change-password")
 async def change_password(
     data: ChangePasswordRequest,
+    _throttle: None = Depends(throttle_ip("change_password")),
     current_user: dict = Depends(get_current_active_user)
 ):
     """Altera a senha do usuário"""
 
-    if not verify_password(data.current_password, current_user["hashed_password"]):
+    auth_throttle.check_account("change_password", current_user["email"])
+
+    stored = users_collection.find_one({"_id": current_user["_id"]}, {"hashed_password": 1})
+
+    if not await verify_password_async(data.current_password, stored.get("hashed_password")):
+        auth_throttle.record_failure(current_user["email"])
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Senha atual incorreta"
@@ -233,19 +279,63 @@ async def change_password(
             detail="A nova senha não pode ter mais de 72 caracteres"
         )
 
+    auth_throttle.record_success(current_user["email"])
+
+    hashed_password = await get_password_hash_async(data.new_password)
+
     users_collection.update_one(
         {"_id": current_user["_id"]},
         {
             "$set": {
-                "hashed_password": get_password_hash(data.new_password),
+                "hashed_password": hashed_password,
                 "updated_at": datetime.utcnow()
             }
         }
     )
 
+    revoke_user_tokens(current_user["_id"], current_user["email"])
+
     return {"message": "Senha alterada com sucesso"}
 
 
+@router.post("/users/{user_id}/deactivate", response_model=UserResponse)
+async def deactivate_user(
+    user_id: str,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Desativa a conta de um usuário (somente administradores)"""
+
+    if not ObjectId.is_valid(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de usuário inválido"
+        )
+
+    user = users_collection.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$set": {"is_active": False, "updated_at": datetime.utcnow()}},
+        projection={"hashed_password": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Usuário não encontrado"
+        )
+
+    revoke_user_tokens(user["_id"], user["email"])
+
+    return {
+        "id": str(user["_id"]),
+        "email": user["email"],
+        "full_name": user["full_name"],
+        "is_active": user["is_active"],
+        "is_verified": user.get("is_verified", False),
+        "created_at": user["created_at"]
+    }
+
+
 @router.get("/google/login")
 async def google_login(request: Request):
     """
@@ -253,7 +343,7 @@ async def google_login(request: Request):
     Redireciona o usuário para a página de login do Google
     """
     redirect_uri = request.url_for('google_callback')
-    return await oauth.google.authorize_redirect(request, redirect_uri)
+    return await get_oauth().google.authorize_redirect(request, redirect_uri)
 
 
 @router.get("/google/callback")
@@ -263,7 +353,7 @@ async def google_callback(request: Request):
     Recebe o código de autorização e troca por token de acesso
     """
     try:
-        token = await oauth.google.authorize_access_token(request)
+        token = await get_oauth().google.authorize_access_token(request)
         
         user_info = token.get('userinfo')
         if not user_info:
@@ -297,6 +387,7 @@ async def google_callback(request: Request):
                         }
                     }
                 )
+                invalidate_cached_user(email)
             
             user_data = existing_user
         else:
@@ -315,11 +406,7 @@ async def google_callback(request: Request):
             result = users_collection.insert_one(new_user)
             user_data = users_collection.find_one({"_id": result.inserted_id})
         
-        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": email},
-            expires_delta=access_token_expires
-        )
+        access_token = create_user_access_token(user_data)
         
         user_response = {
             "_id": str(user_data["_id"]),
@@ -341,7 +428,7 @@ async def google_callback(request: Request):
         return RedirectResponse(url=callback_url)
         
     except Exception as e:
-        print(f"Erro no Google OAuth callback: {str(e)}")
+        logger.exception("Erro no Google OAuth callback")
         frontend_url = settings.ALLOWED_ORIGINS.split(',')[0]
         error_url = f"{frontend_url}/auth/callback?error={urllib.parse.quote(str(e))}"
         return RedirectResponse(url=error_url)
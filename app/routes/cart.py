@@ -10,9 +10,12 @@ from app.models.cart import (
     CartItemResponse,
     ClearCartResponse
 )
+from app.utils import inventory
 from app.utils.auth import get_current_active_user
+from app.utils.images import thumbnail_url
+from app.utils.tracing import TracedRoute
 
-router = APIRouter(prefix="/cart", tags=["Carrinho"])
+router = APIRouter(prefix="/cart", tags=["Carrinho"], route_class=TracedRoute)
 
 def calculate_cart_total(items: List[dict]) -> tuple[int, float]:
     """Calcula total de itens e valor total do carrinho"""
@@ -41,6 +44,8 @@ def get_product_details(product_id: str) -> dict:
 def format_cart_items(items: List[dict]) -> List[dict]:
     """Formata os itens do carrinho com informações do produto"""
     formatted_items = []
+    # Estoque disponível inclui movimentações do ledger ainda não aplicadas
+    pending = inventory.pending_deltas([item["product_id"] for item in items])
     
     for item in items:
         product = products_collection.find_one({"_id": ObjectId(item["product_id"])})
@@ -48,13 +53,12 @@ def format_cart_items(items: List[dict]) -> List[dict]:
         if not product:
             continue
         
-        image_urls = product.get("image_urls", [])
-        product_image = image_urls[0] if image_urls and len(image_urls) > 0 else None
+        product_image = thumbnail_url(product)
         
         unit_price = product["price"]
         quantity = item["quantity"]
         subtotal = round(unit_price * quantity, 2)
-        stock = product.get("stock", 0)
+        stock = inventory.available_stock(product, pending)
         
         formatted_items.append({
             "product_id": str(product["_id"]),
@@ -79,10 +83,11 @@ async def add_to_cart(
     user_id = str(current_user["_id"])
     product = get_product_details(request.product_id)
 
-    if product["stock"] < request.quantity:
+    stock = inventory.available_stock(product)
+    if stock < request.quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Estoque insuficiente. Disponível: {product['stock']}"
+            detail=f"Estoque insuficiente. Disponível: {stock}"
         )
 
     cart = carts_collection.find_one({"user_id": user_id})
@@ -115,7 +120,8 @@ async def add_to_cart(
                 "$push": {
                     "items": {
                         "product_id": request.product_id,
-                        "quantity": request.quantity
+                        "quantity": request.quantity,
+                        "added_at": datetime.utcnow()
                     }
                 },
                 "$set": {"updated_at": datetime.utcnow()}
@@ -171,10 +177,11 @@ async def update_cart_item(
 
     product = get_product_details(product_id)
 
-    if product["stock"] < request.quantity:
+    stock = inventory.available_stock(product)
+    if stock < request.quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Estoque insuficiente. Disponível: {product['stock']}"
+            detail=f"Estoque insuficiente. Disponível: {stock}"
         )
 
     result = carts_collection.update_one(
@@ -1,20 +1,36 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
-from typing import List, Optional
-from pymongo import ReturnDocument
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Header, Response, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Literal
+from pymongo import ReturnDocument, UpdateOne
 from datetime import datetime, timedelta
 from bson import ObjectId
-from app.database import products_collection, orders_collection, carts_collection, get_db
+from app.database import (
+    products_collection,
+    orders_collection,
+    orders_archive_collection,
+    carts_collection,
+    get_db,
+    start_transaction
+)
 from app.models.order import (
     CreateOrderRequest,
     OrderResponse,
     UpdateOrderStatusRequest,
     OrderListResponse,
     OrderStatsResponse,
-    OrderStatus
+    OrderStatus,
+    BulkStatusReport
 )
-from app.utils.auth import get_current_active_user
+from app.utils.auth import get_current_active_user, get_current_admin_user
+from app.utils import outbox
+from app.utils.idempotency import run_idempotent, IDEMPOTENCY_HEADER
+from app.utils.archive import find_order, list_orders
+from app.utils import inventory
+from app.utils.bulk_status import detect_format, process_bulk_status
+from app.utils.export import build_filters, stream_csv, stream_ndjson
+from app.utils.tracing import TracedRoute
 
-router = APIRouter(prefix="/orders", tags=["Pedidos"])
+router = APIRouter(prefix="/orders", tags=["Pedidos"], route_class=TracedRoute)
 
 def get_counters_collection():
     return get_db()["counters"]
@@ -60,8 +76,19 @@ def estimate_delivery_date(state: str) -> datetime:
 @router.post("/", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_order(
     order_request: CreateOrderRequest,
-    current_user: dict = Depends(get_current_active_user)
+    response: Response,
+    current_user: dict = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
 ):
+    return await run_idempotent(
+        idempotency_key,
+        f"orders:{current_user['_id']}",
+        order_request,
+        lambda: place_order(order_request, current_user),
+        response
+    )
+
+async def place_order(order_request: CreateOrderRequest, current_user: dict) -> dict:
     user_id = str(current_user["_id"])
     
     cart = carts_collection.find_one({"user_id": user_id})
@@ -74,6 +101,7 @@ async def create_order(
     
     order_items = []
     subtotal = 0.0
+    pending = inventory.pending_deltas([item["product_id"] for item in cart["items"]])
     
     for cart_item in cart["items"]:
         product = products_collection.find_one({"_id": ObjectId(cart_item["product_id"])})
@@ -84,10 +112,11 @@ async def create_order(
                 detail=f"Produto {cart_item['product_id']} não encontrado"
             )
         
-        if product["stock"] < cart_item["quantity"]:
+        stock = inventory.available_stock(product, pending)
+        if stock < cart_item["quantity"]:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Estoque insuficiente para {product['name']}. Disponível: {product['stock']}"
+                detail=f"Estoque insuficiente para {product['name']}. Disponível: {stock}"
             )
         
         item_subtotal = product["price"] * cart_item["quantity"]
@@ -125,25 +154,114 @@ async def create_order(
         "tracking_code": None
     }
     
-    result = orders_collection.insert_one(order_dict)
+    with start_transaction() as session:
+        orders_collection.insert_one(order_dict, session=session)
+
+        inventory.record_movements(
+            [(item["product_id"], -item["quantity"]) for item in order_items],
+            inventory.REASON_ORDER,
+            reference=str(order_dict["_id"]),
+            session=session
+        )
+
+        outbox.enqueue_event(
+            "order.created",
+            {
+                "order_id": str(order_dict["_id"]),
+                "order_number": order_number,
+                "user_id": user_id,
+                # Linhas do carrinho como estavam no checkout
+                "cart_items": [
+                    {
+                        "product_id": item["product_id"],
+                        "quantity": item["quantity"],
+                        "added_at": item.get("added_at")
+                    }
+                    for item in cart["items"]
+                ]
+            },
+            session=session
+        )
+
+    return {
+        "id": str(order_dict["_id"]),
+        **{k: v for k, v in order_dict.items() if k != "_id"}
+    }
+
+@outbox.handler("order.created")
+def clear_cart_after_order(payload: dict) -> None:
+    """
+    Remove do carrinho apenas as linhas que entraram no pedido.
+    Linhas alteradas ou adicionadas de novo depois do checkout ficam no carrinho.
+    """
+    if "cart_items" in payload:
+        conditions = payload["cart_items"]
+    else:
+        # Eventos gravados antes do snapshot das linhas
+        conditions = [{"product_id": {"$in": payload["product_ids"]}}]
+    now = datetime.utcnow()
+    carts_collection.bulk_write(
+        [
+            UpdateOne(
+                {"user_id": payload["user_id"]},
+                {"$pull": {"items": condition}, "$set": {"updated_at": now}}
+            )
+            for condition in conditions
+        ],
+        ordered=False
+    )
+
+@router.post("/bulk-status", response_model=BulkStatusReport)
+async def bulk_update_order_status(
+    request: Request,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Atualiza status e código de rastreio em lote.
+    Corpo em CSV (text/csv, com cabeçalho) ou NDJSON (application/x-ndjson)
+    com as colunas order_number, status e tracking_code.
+    O relatório lista apenas as linhas que não foram aplicadas.
+    """
+    fmt = detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Envie text/csv ou application/x-ndjson"
+        )
     
-    for item in order_items:
-        products_collection.update_one(
-            {"_id": ObjectId(item["product_id"])},
-            {"$inc": {"stock": -item["quantity"]}}
+    return await process_bulk_status(request.stream(), fmt)
+
+@router.get("/export")
+async def export_orders(
+    start: datetime = Query(..., description="Início do período (inclusive)"),
+    end: datetime = Query(..., description="Fim do período (exclusivo)"),
+    order_status: Optional[OrderStatus] = Query(None, alias="status"),
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Exporta pedidos do período em streaming, para a contabilidade.
+    CSV traz uma linha por item do pedido.
+    """
+    if end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O fim do período deve ser posterior ao início"
         )
     
-    carts_collection.update_one(
-        {"user_id": user_id},
-        {"$set": {"items": [], "updated_at": datetime.utcnow()}}
-    )
+    filters = build_filters(start, end, order_status.value if order_status else None)
+    filename = f"pedidos_{start:%Y%m%d}_{end:%Y%m%d}.{format}"
     
-    created_order = orders_collection.find_one({"_id": result.inserted_id})
+    if format == "csv":
+        content, media_type = stream_csv(filters), "text/csv"
+    else:
+        content, media_type = stream_ndjson(filters), "application/x-ndjson"
     
-    return {
-        "id": str(created_order["_id"]),
-        **{k: v for k, v in created_order.items() if k != "_id"}
-    }
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @router.get("/my-orders", response_model=OrderListResponse)
 async def list_my_orders(
@@ -158,17 +276,9 @@ async def list_my_orders(
     if status:
         filters["status"] = status.value
     
-    total = orders_collection.count_documents(filters)
-    
     skip = (page - 1) * page_size
     
-    orders = list(
-        orders_collection
-        .find(filters)
-        .sort("created_at", -1)
-        .skip(skip)
-        .limit(page_size)
-    )
+    total, orders = list_orders(filters, skip, page_size)
     
     orders_response = [
         {
@@ -197,7 +307,7 @@ async def get_order(
             detail="ID de pedido inválido"
         )
     
-    order = orders_collection.find_one({"_id": ObjectId(order_id)})
+    order = find_order({"_id": ObjectId(order_id)})
     
     if not order:
         raise HTTPException(
@@ -228,7 +338,7 @@ async def cancel_order(
             detail="ID de pedido inválido"
         )
     
-    order = orders_collection.find_one({"_id": ObjectId(order_id)})
+    order = find_order({"_id": ObjectId(order_id)})
     
     if not order:
         raise HTTPException(
@@ -248,21 +358,28 @@ async def cancel_order(
             detail=f"Não é possível cancelar pedido com status '{order['status']}'"
         )
     
-    orders_collection.update_one(
-        {"_id": ObjectId(order_id)},
-        {
-            "$set": {
-                "status": OrderStatus.CANCELLED.value,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
-    
-    for item in order["items"]:
-        products_collection.update_one(
-            {"_id": ObjectId(item["product_id"])},
-            {"$inc": {"stock": item["quantity"]}}
+    with start_transaction() as session:
+        result = orders_collection.update_one(
+            {
+                "_id": ObjectId(order_id),
+                "status": {"$in": [OrderStatus.PENDING.value, OrderStatus.CONFIRMED.value]}
+            },
+            {
+                "$set": {
+                    "status": OrderStatus.CANCELLED.value,
+                    "updated_at": datetime.utcnow()
+                }
+            },
+            session=session
         )
+        
+        if result.modified_count:
+            inventory.record_movements(
+                [(item["product_id"], item["quantity"]) for item in order["items"]],
+                inventory.REASON_ORDER_CANCEL,
+                reference=order_id,
+                session=session
+            )
     
     updated_order = orders_collection.find_one({"_id": ObjectId(order_id)})
     
@@ -276,14 +393,24 @@ async def get_order_stats(current_user: dict = Depends(get_current_active_user))
     
     user_id = str(current_user["_id"])
     
-    orders = list(orders_collection.find({"user_id": user_id}))
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}, "spent": {"$sum": "$total"}}}
+    ]
+    
+    by_status = {}
+    for collection in (orders_collection, orders_archive_collection):
+        for row in collection.aggregate(pipeline):
+            current = by_status.setdefault(row["_id"], {"count": 0, "spent": 0.0})
+            current["count"] += row["count"]
+            current["spent"] += row["spent"]
     
-    total_orders = len(orders)
-    total_spent = sum(order["total"] for order in orders)
+    total_orders = sum(row["count"] for row in by_status.values())
+    total_spent = sum(row["spent"] for row in by_status.values())
     
-    pending_orders = sum(1 for order in orders if order["status"] == OrderStatus.PENDING.value)
-    completed_orders = sum(1 for order in orders if order["status"] == OrderStatus.DELIVERED.value)
-    cancelled_orders = sum(1 for order in orders if order["status"] == OrderStatus.CANCELLED.value)
+    pending_orders = by_status.get(OrderStatus.PENDING.value, {}).get("count", 0)
+    completed_orders = by_status.get(OrderStatus.DELIVERED.value, {}).get("count", 0)
+    cancelled_orders = by_status.get(OrderStatus.CANCELLED.value, {}).get("count", 0)
     
     return {
         "total_orders": total_orders,
@@ -1,18 +1,62 @@
-from fastapi import APIRouter
-from app.models.payment import CardPayment, PixPayment
-from app.demo.payments_demo import simulate_card_payment, simulate_pix_payment
-from app.config import settings
+from typing import List, Optional
+from fastapi import APIRouter, Header, Response, Depends, Query
+from app.models.payment import CardPayment, PixPayment, PaymentResponse, ReconciliationRun
+from app.utils.auth import get_current_active_user, get_current_admin_user
+from app.utils.idempotency import run_idempotent, IDEMPOTENCY_HEADER
+from app.utils.payments import load_payable_order, charge_order
+from app.utils.reconciliation import recent_runs
+from app.utils.tracing import TracedRoute
 
-router = APIRouter(prefix="/payments", tags=["Payments"])
+router = APIRouter(prefix="/payments", tags=["Payments"], route_class=TracedRoute)
 
-@router.post("/card")
-def pay_with_card(data: CardPayment):
-    if settings.DEMO_MODE:
-        return simulate_card_payment(data.amount)
-    return {"error": "Pagamento real não implementado"}
+async def process_card_payment(data: CardPayment, current_user: dict) -> dict:
+    order = load_payable_order(data.order_id, str(current_user["_id"]), data.amount)
+    card = {
+        "number": data.card_number,
+        "holder": data.card_holder,
+        "expiry": data.expiry_date,
+        "cvv": data.cvv
+    }
+    return await charge_order(order, "card", card=card, card_last4=data.card_number[-4:])
 
-@router.post("/pix")
-def pay_with_pix(data: PixPayment):
-    if settings.DEMO_MODE:
-        return simulate_pix_payment(data.amount)
-    return {"error": "Pagamento real não implementado"}
+@router.post("/card", response_model=PaymentResponse)
+async def pay_with_card(
+    data: CardPayment,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    current_user: dict = Depends(get_current_active_user)
+):
+    return await run_idempotent(
+        idempotency_key,
+        f"payments:card:{current_user['_id']}",
+        data,
+        lambda: process_card_payment(data, current_user),
+        response
+    )
+
+async def process_pix_payment(data: PixPayment, current_user: dict) -> dict:
+    order = load_payable_order(data.order_id, str(current_user["_id"]), data.amount)
+    return await charge_order(order, "pix")
+
+@router.post("/pix", response_model=PaymentResponse)
+async def pay_with_pix(
+    data: PixPayment,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    current_user: dict = Depends(get_current_active_user)
+):
+    return await run_idempotent(
+        idempotency_key,
+        f"payments:pix:{current_user['_id']}",
+        data,
+        lambda: process_pix_payment(data, current_user),
+        response
+    )
+
+@router.get("/reconciliation", response_model=List[ReconciliationRun])
+async def reconciliation_report(
+    limit: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Relatórios das últimas execuções da conciliação de pagamentos"""
+    return recent_runs(limit)
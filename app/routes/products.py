@@ -1,8 +1,10 @@
+import logging
 from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File
 from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
-from app.database import products_collection
+from pymongo import ReturnDocument
+from app.database import products_collection, start_transaction
 from app.models.product import (
     ProductCreate, 
     ProductUpdate, 
@@ -11,9 +13,14 @@ from app.models.product import (
     CategoryEnum
 )
 from app.utils.auth import get_current_active_user
-from app.utils.upload import save_multiple_files, delete_file
+from app.utils.upload import save_multiple_files, delete_file, path_from_url, remove_stored_files
+from app.utils import inventory, outbox
+from app.utils.images import build_variants, image_key, thumbnail_url
+from app.utils.tracing import TracedRoute
 
-router = APIRouter(prefix="/products", tags=["Produtos"])
+router = APIRouter(prefix="/products", tags=["Produtos"], route_class=TracedRoute)
+
+logger = logging.getLogger(__name__)
 
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
@@ -21,11 +28,6 @@ async def create_product(
     current_user: dict = Depends(get_current_active_user)
 ):
 
-    print(f"  Criando produto:")
-    print(f"   Nome: {product.name}")
-    print(f"   Preço: {product.price}")
-    print(f"   Estoque: {product.stock}")
-    
     product_dict = {
         **product.dict(),
         "image_urls": [],
@@ -35,8 +37,18 @@ async def create_product(
     }
     
     result = products_collection.insert_one(product_dict)
+    inventory.record_movements(
+        [(str(result.inserted_id), product.stock)],
+        inventory.REASON_INITIAL,
+        applied=True
+    )
     created_product = products_collection.find_one({"_id": result.inserted_id})
     
+    logger.info(
+        "Produto criado",
+        extra={"product_id": str(result.inserted_id), "price": product.price, "stock": product.stock}
+    )
+    
     return {
         "id": str(created_product["_id"]),
         **{k: v for k, v in created_product.items() if k != "_id"}
@@ -55,8 +67,7 @@ async def upload_product_images(
             detail="ID de produto inválido"
         )
     
-    product = products_collection.find_one({"_id": ObjectId(product_id)})
-    if not product:
+    if products_collection.count_documents({"_id": ObjectId(product_id)}, limit=1) == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Produto não encontrado"
@@ -64,26 +75,54 @@ async def upload_product_images(
     
     image_urls = await save_multiple_files(files)
     
-    current_images = product.get("image_urls", [])
-    updated_images = current_images + image_urls
-    
-    products_collection.update_one(
-        {"_id": ObjectId(product_id)},
-        {
-            "$set": {
-                "image_urls": updated_images,
-                "updated_at": datetime.utcnow()
-            }
-        }
-    )
-    
-    updated_product = products_collection.find_one({"_id": ObjectId(product_id)})
+    # Evento na mesma transação: as variantes não se perdem se o processo cair aqui
+    with start_transaction() as session:
+        updated_product = products_collection.find_one_and_update(
+            {"_id": ObjectId(product_id)},
+            {
+                "$push": {"image_urls": {"$each": image_urls}},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        if updated_product is not None:
+            outbox.enqueue_event(
+                "product.images_added",
+                {"product_id": product_id, "image_urls": image_urls},
+                session=session
+            )
+    
+    if updated_product is None:
+        # Produto removido enquanto os arquivos eram gravados
+        for url in image_urls:
+            delete_file(url)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Produto não encontrado"
+        )
     
     return {
         "id": str(updated_product["_id"]),
         **{k: v for k, v in updated_product.items() if k != "_id"}
     }
 
+@outbox.handler("product.images_added")
+async def generate_image_variants(payload: dict) -> None:
+    """Gera as variantes fora do request e registra o mapa no produto"""
+    for image_url in payload["image_urls"]:
+        variants = await build_variants(image_url)
+        if variants is None:
+            continue
+        result = products_collection.update_one(
+            {"_id": ObjectId(payload["product_id"]), "image_urls": image_url},
+            {"$set": {f"image_variants.{image_key(image_url)}": variants}}
+        )
+        source = path_from_url(image_url)
+        if result.matched_count == 0 and not source.exists():
+            # Blob liberado enquanto as variantes eram geradas
+            remove_stored_files(source)
+
 @router.get("/", response_model=ProductListResponse)
 async def list_products(
     page: int = Query(1, ge=1, description="Número da página"),
@@ -131,7 +170,8 @@ async def list_products(
     products_response = [
         {
             "id": str(p["_id"]),
-            **{k: v for k, v in p.items() if k != "_id"}
+            **{k: v for k, v in p.items() if k != "_id"},
+            "thumbnail_url": thumbnail_url(p)
         }
         for p in products
     ]
@@ -199,6 +239,16 @@ async def update_product(
     
     update_data["updated_at"] = datetime.utcnow()
     
+    new_stock = update_data.pop("stock", None)
+    if new_stock is not None:
+        current_stock = inventory.available_stock(existing_product)
+        inventory.record_movement(
+            product_id,
+            new_stock - current_stock,
+            inventory.REASON_ADJUSTMENT,
+            reference=str(current_user["_id"])
+        )
+    
     products_collection.update_one(
         {"_id": ObjectId(product_id)},
         {"$set": update_data}
@@ -208,7 +258,8 @@ async def update_product(
     
     return {
         "id": str(updated_product["_id"]),
-        **{k: v for k, v in updated_product.items() if k != "_id"}
+        **{k: v for k, v in updated_product.items() if k != "_id"},
+        "stock": inventory.available_stock(updated_product)
     }
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -230,13 +281,23 @@ async def delete_product(
             detail="Produto não encontrado"
         )
     
-    for image_url in product.get("image_urls", []):
-        delete_file(image_url)
-    
-    products_collection.delete_one({"_id": ObjectId(product_id)})
+    with start_transaction() as session:
+        products_collection.delete_one({"_id": ObjectId(product_id)}, session=session)
+        if product.get("image_urls"):
+            outbox.enqueue_event(
+                "product.deleted",
+                {"product_id": product_id, "image_urls": product["image_urls"]},
+                session=session
+            )
     
     return None
 
+@outbox.handler("product.deleted")
+def release_product_images(payload: dict) -> None:
+    """Libera as imagens fora do request; o que falhar fica para o coletor de órfãs"""
+    for image_url in payload["image_urls"]:
+        delete_file(image_url)
+
 @router.get("/categories/list")
 async def list_categories():
     return {
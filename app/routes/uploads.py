@@ -1,8 +1,9 @@
 from fastapi import APIRouter, UploadFile, File
 from typing import List
 from app.utils.upload import save_upload_file, save_multiple_files
+from app.utils.tracing import TracedRoute
 
-router = APIRouter(prefix="/upload", tags=["Upload"])
+router = APIRouter(prefix="/upload", tags=["Upload"], route_class=TracedRoute)
 
 @router.post("/single")
 async def upload_single_image(file: UploadFile = File(...)):
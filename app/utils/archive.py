@@ -0,0 +1,154 @@
+"""
+Arquivamento de pedidos antigos (hot/cold).
+
+Pedidos entregues ou cancelados há mais de ARCHIVE_AFTER_DAYS saem de
+`orders` e vão, em lotes e com documentos compactos, para `orders_archive`.
+As leituras de pedidos caem no arquivo de forma transparente.
+
+Execução manual: python -m app.utils.archive
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+from app.config import settings
+from app.database import get_db, orders_collection, orders_archive_collection
+from app.models.order import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = [OrderStatus.DELIVERED.value, OrderStatus.CANCELLED.value]
+
+# Campos que não fazem sentido em pedidos encerrados
+_DROPPED_FIELDS = {"estimated_delivery"}
+
+
+def ensure_indexes() -> None:
+    try:
+        get_db().create_collection(
+            orders_archive_collection.collection_name,
+            storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+        )
+    except CollectionInvalid:
+        pass
+
+    orders_collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+    orders_collection.create_index([("status", ASCENDING), ("updated_at", ASCENDING)])
+    orders_archive_collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+
+
+def compact_order(order: dict) -> dict:
+    """Remove campos nulos e dados deriváveis antes de arquivar"""
+    compact = {
+        k: v for k, v in order.items()
+        if v is not None and k not in _DROPPED_FIELDS
+    }
+    compact["items"] = [
+        {k: v for k, v in item.items() if k != "subtotal"}
+        for item in order.get("items", [])
+    ]
+    address = compact.get("shipping_address")
+    if address:
+        compact["shipping_address"] = {k: v for k, v in address.items() if v is not None}
+    compact["archived_at"] = datetime.utcnow()
+    return compact
+
+
+def expand_order(order: dict) -> dict:
+    """Reconstrói o formato completo de um pedido arquivado"""
+    expanded = {k: v for k, v in order.items() if k != "archived_at"}
+    expanded["items"] = [
+        {**item, "subtotal": round(item["product_price"] * item["quantity"], 2)}
+        for item in order.get("items", [])
+    ]
+    expanded.setdefault("tracking_code", None)
+    expanded.setdefault("estimated_delivery", None)
+    return expanded
+
+
+def archive_orders(
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None
+) -> dict:
+    """Move pedidos encerrados e antigos para o arquivo, em lotes"""
+    older_than_days = older_than_days or settings.ARCHIVE_AFTER_DAYS
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    filters = {"status": {"$in": TERMINAL_STATUSES}, "updated_at": {"$lt": cutoff}}
+    archived = 0
+    batches = 0
+
+    while True:
+        batch = list(orders_collection.find(filters).sort("updated_at", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+
+        try:
+            orders_archive_collection.insert_many(
+                [compact_order(order) for order in batch],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            # Reexecução após uma falha entre insert e delete: já arquivados
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+        ids = [order["_id"] for order in batch]
+        orders_collection.delete_many({"_id": {"$in": ids}, "status": {"$in": TERMINAL_STATUSES}})
+
+        archived += len(batch)
+        batches += 1
+
+    if archived:
+        logger.info("Pedidos arquivados", extra={"archived": archived, "batches": batches})
+
+    return {"archived": archived, "batches": batches, "cutoff": cutoff}
+
+
+def find_order(filters: dict) -> Optional[dict]:
+    """Busca um pedido na coleção principal e, se não achar, no arquivo"""
+    order = orders_collection.find_one(filters)
+    if order is not None:
+        return order
+    archived = orders_archive_collection.find_one(filters)
+    return expand_order(archived) if archived else None
+
+
+def list_orders(filters: dict, skip: int, limit: int) -> tuple[int, List[dict]]:
+    """
+    Pagina pedidos da coleção principal e continua no arquivo quando a
+    página ultrapassa os pedidos recentes.
+    """
+    hot_total = orders_collection.count_documents(filters)
+
+    # Durante o arquivamento um pedido já foi inserido no arquivo mas ainda
+    # não saiu da coleção principal: vale a cópia principal
+    in_transit = orders_collection.distinct(
+        "_id", {"$and": [filters, {"status": {"$in": TERMINAL_STATUSES}}]}
+    )
+    archive_filters = {"$and": [filters, {"_id": {"$nin": in_transit}}]} if in_transit else filters
+    archive_total = orders_archive_collection.count_documents(archive_filters)
+
+    orders = []
+    if skip < hot_total:
+        orders = list(
+            orders_collection
+            .find(filters)
+            .sort("created_at", DESCENDING)
+            .skip(skip)
+            .limit(limit)
+        )
+
+    remaining = limit - len(orders)
+    if remaining > 0 and archive_total:
+        archived = orders_archive_collection.find(archive_filters).sort("created_at", DESCENDING)
+        archived = archived.skip(max(skip - hot_total, 0)).limit(remaining)
+        orders.extend(expand_order(order) for order in archived)
+
+    return hot_total + archive_total, orders
+
+if __name__ == "__main__":
+    print(archive_orders())
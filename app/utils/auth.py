@@ -1,12 +1,18 @@
+import logging
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
+from bson import ObjectId
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.config import settings
-from app.database import users_collection
+from app.database import users_collection, refresh_tokens_collection
+from app.utils.password_pool import password_pool
+from app.utils.cache import TTLCache
+from app.utils.tracing import trace_phase
 
 pwd_context = CryptContext(
     schemes=["bcrypt"],
@@ -15,6 +21,46 @@ pwd_context = CryptContext(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+logger = logging.getLogger(__name__)
+
+# Projeção do usuário usada pelas dependências de autenticação; o hash da
+# senha fica fora do cache e é lido sob demanda por quem precisa dele.
+USER_CACHE_PROJECTION = {"hashed_password": 0}
+
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+
+# user_id -> token_version, para revogação barata no modo stateless
+token_version_cache = TTLCache(settings.USER_CACHE_SIZE, settings.TOKEN_VERSION_CACHE_TTL_SECONDS)
+
+
+def invalidate_cached_user(email: str) -> None:
+    """Remove o usuário do cache após qualquer alteração no documento"""
+    user_cache.invalidate(email.lower())
+
+
+def configure_bcrypt_rounds(rounds: int) -> None:
+    """
+    Define o custo do bcrypt para novos hashes. Só hashes abaixo de
+    BCRYPT_MIN_ROUNDS são refeitos no login: uma nova calibração com custo
+    vizinho não obriga todo mundo a trocar de hash.
+    """
+    # `rounds` vale também como mínimo e máximo no passlib; default_rounds não
+    pwd_context.update(
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=min(settings.BCRYPT_MIN_ROUNDS, rounds)
+    )
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except Exception:
+        return False
+
+
+if settings.BCRYPT_ROUNDS:
+    configure_bcrypt_rounds(settings.BCRYPT_ROUNDS)
+
 
 def get_password_hash(password: str) -> str:
     try:
@@ -22,12 +68,12 @@ def get_password_hash(password: str) -> str:
         
         if len(password_bytes) > 72:
             password = password_bytes[:72].decode('utf-8', errors='ignore')
-            print(f"Senha truncada de {len(password_bytes)} para 72 bytes")
+            logger.debug("Senha truncada para 72 bytes", extra={"original_bytes": len(password_bytes)})
         
         return pwd_context.hash(password)
         
     except Exception as e:
-        print(f"Erro ao fazer hash da senha: {str(e)}")
+        logger.exception("Erro ao fazer hash da senha")
         raise ValueError(f"Erro ao processar senha: {str(e)}")
 
 
@@ -41,10 +87,35 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return pwd_context.verify(plain_password, hashed_password)
         
     except Exception as e:
-        print(f"Erro ao verificar senha: {str(e)}")
+        logger.warning("Erro ao verificar senha: %s", e)
         return False
 
 
+async def get_password_hash_async(password: str) -> str:
+    """Gera o hash no pool de bcrypt, fora do event loop"""
+    return await password_pool.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifica a senha no pool de bcrypt, fora do event loop"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def rehash_password(user_id, plain_password: str, old_hash: str) -> None:
+    """
+    Refaz o hash com o custo atual, em segundo plano após o login.
+    Só grava se o hash não mudou nesse meio tempo.
+    """
+    try:
+        new_hash = await get_password_hash_async(plain_password)
+        users_collection.update_one(
+            {"_id": user_id, "hashed_password": old_hash},
+            {"$set": {"hashed_password": new_hash}}
+        )
+    except Exception:
+        logger.exception("Falha ao atualizar hash da senha")
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     
@@ -59,7 +130,130 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def create_user_access_token(user: dict) -> str:
+    """
+    Gera o access token do usuário.
+    No modo stateless inclui id, nome, status, perfil e versão do token,
+    para que as rotas autenticadas não precisem ler o banco.
+    """
+    data = {"sub": user["email"]}
+
+    if settings.AUTH_STATELESS:
+        data.update({
+            "uid": str(user["_id"]),
+            "name": user.get("full_name"),
+            "act": user.get("is_active", True),
+            "adm": user.get("is_admin", False),
+            "ver": user.get("token_version", 0),
+            "typ": "access"
+        })
+
+    return create_access_token(data)
+
+
+def create_refresh_token(user: dict, family: Optional[str] = None) -> str:
+    """Gera um refresh token de uso único; a família agrupa as rotações"""
+    jti = uuid.uuid4().hex
+    family = family or uuid.uuid4().hex
+    expires_at = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+
+    refresh_tokens_collection.insert_one({
+        "_id": jti,
+        "user_id": str(user["_id"]),
+        "family": family,
+        "used": False,
+        "created_at": datetime.utcnow(),
+        "expires_at": expires_at
+    })
+
+    return create_access_token(
+        {
+            "sub": str(user["_id"]),
+            "jti": jti,
+            "fam": family,
+            "ver": user.get("token_version", 0),
+            "typ": "refresh"
+        },
+        expires_delta=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+
+def issue_tokens(user: dict) -> dict:
+    tokens = {"access_token": create_user_access_token(user), "token_type": "bearer"}
+    if settings.AUTH_STATELESS:
+        tokens["refresh_token"] = create_refresh_token(user)
+    return tokens
+
+
+def rotate_refresh_token(refresh_token: str) -> dict:
+    """
+    Troca um refresh token por um novo par de tokens.
+    Reutilizar um token já trocado revoga a família inteira.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    try:
+        payload = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+
+    if payload.get("typ") != "refresh" or not ObjectId.is_valid(payload.get("sub", "")):
+        raise credentials_exception
+
+    record = refresh_tokens_collection.find_one_and_update(
+        {"_id": payload.get("jti"), "used": False},
+        {"$set": {"used": True, "used_at": datetime.utcnow()}}
+    )
+
+    if record is None:
+        refresh_tokens_collection.delete_many({"family": payload.get("fam")})
+        raise credentials_exception
+
+    user = users_collection.find_one({"_id": ObjectId(payload["sub"])}, USER_CACHE_PROJECTION)
+
+    if (
+        user is None
+        or not user.get("is_active", True)
+        or user.get("token_version", 0) != payload.get("ver", 0)
+    ):
+        raise credentials_exception
+
+    return {
+        "access_token": create_user_access_token(user),
+        "refresh_token": create_refresh_token(user, family=record["family"]),
+        "token_type": "bearer"
+    }
+
+
+def current_token_version(user_id: str) -> Optional[int]:
+    version = token_version_cache.get(user_id)
+    if version is None:
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, {"token_version": 1})
+        if user is None:
+            return None
+        version = user.get("token_version", 0)
+        token_version_cache.set(user_id, version)
+    return version
+
+
+def revoke_user_tokens(user_id, email: str) -> None:
+    """Invalida todos os tokens emitidos para o usuário"""
+    users_collection.update_one({"_id": ObjectId(str(user_id))}, {"$inc": {"token_version": 1}})
+    refresh_tokens_collection.delete_many({"user_id": str(user_id)})
+    token_version_cache.invalidate(str(user_id))
+    invalidate_cached_user(email)
+
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    with trace_phase("auth"):
+        return _authenticate(token)
+
+
+def _authenticate(token: str) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
@@ -76,12 +270,36 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
     
-    user = users_collection.find_one({"email": email})
+    if payload.get("typ") == "refresh":
+        raise credentials_exception
+    
+    if settings.AUTH_STATELESS and "uid" in payload:
+        if not ObjectId.is_valid(payload["uid"]):
+            raise credentials_exception
+        
+        if current_token_version(payload["uid"]) != payload.get("ver", 0):
+            raise credentials_exception
+        
+        return {
+            "_id": ObjectId(payload["uid"]),
+            "email": email,
+            "full_name": payload.get("name"),
+            "is_active": payload.get("act", True),
+            "is_admin": payload.get("adm", False),
+            "token_version": payload.get("ver", 0)
+        }
+    
+    user = user_cache.get(email.lower())
     
     if user is None:
-        raise credentials_exception
+        user = users_collection.find_one({"email": email}, USER_CACHE_PROJECTION)
+        
+        if user is None:
+            raise credentials_exception
+        
+        user_cache.set(email.lower(), user)
     
-    return user
+    return dict(user)
 
 
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):
@@ -92,4 +310,15 @@ async def get_current_active_user(current_user: dict = Depends(get_current_user)
             detail="Usuário inativo"
         )
     
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+async def get_current_admin_user(current_user: dict = Depends(get_current_active_user)):
+
+    if not current_user.get("is_admin", False):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acesso restrito a administradores"
+        )
+    
+    return current_user
@@ -0,0 +1,48 @@
+"""
+Calibração do custo do bcrypt para a máquina atual.
+
+Uso: python -m app.utils.bcrypt_tuning [alvo_ms]
+O valor sugerido vai em BCRYPT_ROUNDS.
+"""
+import sys
+import time
+from typing import Optional
+
+import bcrypt
+
+from app.config import settings
+
+
+def measure_hash_ms(rounds: int, samples: int = 3) -> float:
+    """Melhor tempo entre algumas amostras, para descontar ruído do host"""
+    salt = bcrypt.gensalt(rounds=rounds)
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", salt)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def calibrate_bcrypt_rounds(target_ms: Optional[float] = None) -> tuple[int, float]:
+    """
+    Maior custo cujo hash cabe no alvo de latência.
+    Cada round a mais dobra o tempo, então mede o mínimo e sobe enquanto couber.
+    """
+    target_ms = target_ms or settings.BCRYPT_TARGET_MS
+    rounds = settings.BCRYPT_MIN_ROUNDS
+    elapsed = measure_hash_ms(rounds)
+
+    while rounds < settings.BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+        candidate = measure_hash_ms(rounds + 1)
+        if candidate > target_ms:
+            break
+        rounds, elapsed = rounds + 1, candidate
+
+    return rounds, elapsed
+
+
+if __name__ == "__main__":
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    rounds, elapsed = calibrate_bcrypt_rounds(target)
+    print(f"BCRYPT_ROUNDS={rounds}  # {elapsed:.1f} ms por hash nesta máquina")
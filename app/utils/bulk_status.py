@@ -0,0 +1,162 @@
+import asyncio
+import csv
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from pymongo import UpdateOne
+
+from app.config import settings
+from app.database import orders_collection
+from app.models.order import BulkStatusRow
+
+CSV_CONTENT_TYPES = {"text/csv", "application/csv"}
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines"}
+# Registro CSV com aspas abertas que passa disso é tratado como inválido
+MAX_CSV_RECORD_LENGTH = 10_000
+
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in CSV_CONTENT_TYPES:
+        return "csv"
+    if media_type in NDJSON_CONTENT_TYPES:
+        return "ndjson"
+    return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Quebra o corpo da requisição em linhas sem carregá-lo inteiro na memória"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.rstrip(b"\r")
+    if buffer:
+        yield buffer.rstrip(b"\r")
+
+
+async def iter_rows(lines: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Produz (número da linha, dados, erro de parsing) para cada linha não vazia.
+    Cada linha é decodificada separadamente, então um trecho fora de UTF-8
+    invalida só a própria linha. No CSV, um campo entre aspas pode ter
+    quebras de linha: o registro continua até as aspas fecharem.
+    """
+    header = None
+    row_number = 0
+    record = None
+    async for raw in lines:
+        try:
+            line = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            if fmt == "csv" and header is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cabeçalho do CSV não está em UTF-8"
+                )
+            record = None
+            row_number += 1
+            yield row_number, None, "Linha inválida: texto não está em UTF-8"
+            continue
+
+        if record is not None:
+            line = f"{record}\n{line}"
+            record = None
+        elif not line.strip():
+            continue
+
+        # Número ímpar de aspas: há um campo aberto que segue na próxima linha
+        if fmt == "csv" and line.count('"') % 2:
+            if len(line) <= MAX_CSV_RECORD_LENGTH:
+                record = line
+                continue
+
+        if fmt == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+
+        row_number += 1
+        try:
+            if fmt == "csv":
+                values = next(csv.reader([line], strict=True))
+                yield row_number, dict(zip(header, (v.strip() for v in values))), None
+            else:
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise ValueError("cada linha deve ser um objeto JSON")
+                yield row_number, data, None
+        except (ValueError, csv.Error) as e:
+            yield row_number, None, f"Linha inválida: {e}"
+
+    if record is not None:
+        yield row_number + 1, None, "Linha inválida: aspas não fechadas"
+
+
+def apply_batch(batch: List[Tuple[int, BulkStatusRow]]) -> Tuple[int, List[dict]]:
+    """Aplica um lote com uma leitura e um bulk_write; retorna (atualizados, não encontrados)"""
+    numbers = list({row.order_number for _, row in batch})
+    existing = {
+        order["order_number"]
+        for order in orders_collection.find({"order_number": {"$in": numbers}}, {"order_number": 1})
+    }
+
+    now = datetime.utcnow()
+    operations = []
+    not_found = []
+    for row_number, row in batch:
+        if row.order_number not in existing:
+            not_found.append({"row": row_number, "order_number": row.order_number, "error": "Pedido não encontrado"})
+            continue
+        update_data = {"status": row.status.value, "updated_at": now}
+        if row.tracking_code:
+            update_data["tracking_code"] = row.tracking_code
+        operations.append(UpdateOne({"order_number": row.order_number}, {"$set": update_data}))
+
+    if operations:
+        orders_collection.bulk_write(operations, ordered=True)
+
+    return len(operations), not_found
+
+
+async def process_bulk_status(chunks: AsyncIterator[bytes], fmt: str) -> dict:
+    report = {"total_rows": 0, "updated": 0, "not_found": 0, "invalid": 0, "errors": []}
+    batch: List[Tuple[int, BulkStatusRow]] = []
+
+    async def flush():
+        updated, not_found = await asyncio.to_thread(apply_batch, batch)
+        report["updated"] += updated
+        report["not_found"] += len(not_found)
+        report["errors"].extend(not_found)
+        batch.clear()
+
+    async for row_number, data, error in iter_rows(iter_lines(chunks), fmt):
+        report["total_rows"] += 1
+
+        if error is None:
+            try:
+                batch.append((row_number, BulkStatusRow(**{k: v or None for k, v in data.items()})))
+            except ValidationError as e:
+                first = e.errors()[0]
+                field = ".".join(str(part) for part in first["loc"])
+                error = f"{field}: {first['msg']}"
+
+        if error is not None:
+            order_number = (data or {}).get("order_number")
+            report["invalid"] += 1
+            report["errors"].append({
+                "row": row_number,
+                "order_number": str(order_number) if order_number is not None else None,
+                "error": error
+            })
+
+        if len(batch) >= settings.BULK_STATUS_BATCH_SIZE:
+            await flush()
+
+    if batch:
+        await flush()
+
+    report["errors"].sort(key=lambda err: err["row"])
+    return report
@@ -0,0 +1,119 @@
+import csv
+import heapq
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+from bson import ObjectId
+
+from app.database import orders_collection, orders_archive_collection
+from app.utils.archive import expand_order
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FLUSH_ROWS = 500
+
+CSV_COLUMNS = [
+    "order_number", "created_at", "updated_at", "status", "user_id", "user_email",
+    "payment_method", "subtotal", "shipping_fee", "total",
+    "city", "state", "zip_code", "tracking_code",
+    "item_index", "product_id", "product_name", "product_price", "quantity", "item_subtotal",
+]
+
+_PROJECTION = {"user_name": 0}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def build_filters(start: datetime, end: datetime, status: Optional[str] = None) -> dict:
+    filters = {"created_at": {"$gte": start, "$lt": end}}
+    if status:
+        filters["status"] = status
+    return filters
+
+
+def iter_orders(filters: dict) -> Iterator[dict]:
+    """
+    Percorre pedidos recentes e arquivados em ordem de criação, com cursores
+    em lotes no servidor; nunca mantém mais de um lote por coleção na memória.
+    """
+    hot = (
+        orders_collection
+        .find(filters, _PROJECTION)
+        .sort("created_at", 1)
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    archived = (
+        orders_archive_collection
+        .find(filters, _PROJECTION)
+        .sort("created_at", 1)
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    cold = (expand_order(order) for order in archived)
+    try:
+        yield from heapq.merge(hot, cold, key=lambda order: order["created_at"])
+    finally:
+        hot.close()
+        archived.close()
+
+
+def stream_ndjson(filters: dict) -> Iterator[str]:
+    lines = []
+    for order in iter_orders(filters):
+        order["id"] = str(order.pop("_id"))
+        lines.append(json.dumps(order, default=_json_default, ensure_ascii=False))
+        if len(lines) >= EXPORT_FLUSH_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def stream_csv(filters: dict) -> Iterator[str]:
+    """Uma linha por item do pedido, com os dados do pedido repetidos"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+
+    for order in iter_orders(filters):
+        address = order.get("shipping_address") or {}
+        head = [
+            order["order_number"],
+            order["created_at"].isoformat(),
+            order["updated_at"].isoformat(),
+            order["status"],
+            order["user_id"],
+            order.get("user_email", ""),
+            order["payment_method"],
+            order["subtotal"],
+            order["shipping_fee"],
+            order["total"],
+            address.get("city", ""),
+            address.get("state", ""),
+            address.get("zip_code", ""),
+            order.get("tracking_code") or "",
+        ]
+        for index, item in enumerate(order.get("items", []), start=1):
+            writer.writerow(head + [
+                index,
+                item["product_id"],
+                item["product_name"],
+                item["product_price"],
+                item["quantity"],
+                item["subtotal"],
+            ])
+            rows += 1
+
+        if rows >= EXPORT_FLUSH_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            rows = 0
+
+    yield buffer.getvalue()
@@ -1,21 +1,37 @@
-from authlib.integrations.starlette_client import OAuth
+import logging
 from app.config import settings
 
-oauth = OAuth()
+logger = logging.getLogger(__name__)
 
+_oauth = None
 
-redirect_uri = settings.get_google_redirect_uri()
 
-print(f"🔍 Ambiente: {settings.ENVIRONMENT}")
-print(f"🔍 Google Redirect URI: {redirect_uri}")
+def get_oauth():
+    """
+    Cliente OAuth do Google, criado no primeiro uso.
+    O authlib (e o httpx que ele traz) pesa no cold start e só é usado no login social.
+    """
+    global _oauth
+    if _oauth is not None:
+        return _oauth
 
-oauth.register(
-    name='google',
-    client_id=settings.GOOGLE_CLIENT_ID,
-    client_secret=settings.GOOGLE_CLIENT_SECRET,
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-    client_kwargs={
-        'scope': 'openid email profile',
-        'redirect_uri': redirect_uri
-    }
-)
\ No newline at end of file
+    from authlib.integrations.starlette_client import OAuth
+
+    redirect_uri = settings.get_google_redirect_uri()
+    oauth = OAuth()
+    oauth.register(
+        name='google',
+        client_id=settings.GOOGLE_CLIENT_ID,
+        client_secret=settings.GOOGLE_CLIENT_SECRET,
+        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+        client_kwargs={
+            'scope': 'openid email profile',
+            'redirect_uri': redirect_uri
+        }
+    )
+    logger.info(
+        "Google OAuth configurado",
+        extra={"environment": settings.ENVIRONMENT, "redirect_uri": redirect_uri}
+    )
+    _oauth = oauth
+    return _oauth
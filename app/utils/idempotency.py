@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.database import idempotency_collection
+from app.utils.cache import TTLCache
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+_cache = TTLCache(settings.IDEMPOTENCY_CACHE_SIZE, settings.IDEMPOTENCY_TTL_SECONDS)
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def ensure_indexes() -> None:
+    idempotency_collection.create_index(
+        "created_at", expireAfterSeconds=settings.IDEMPOTENCY_TTL_SECONDS
+    )
+
+
+def fingerprint(payload: Any) -> str:
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def _check_fingerprint(record: dict, request_hash: str) -> None:
+    if record["request_hash"] != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key já utilizada com outro corpo de requisição"
+        )
+
+
+def _acquire(record_id: str, request_hash: str) -> Optional[dict]:
+    """
+    Reserva a chave no banco.
+    Retorna None quando a reserva foi feita, ou o documento existente.
+    """
+    now = datetime.utcnow()
+    try:
+        idempotency_collection.insert_one({
+            "_id": record_id,
+            "request_hash": request_hash,
+            "status": "in_progress",
+            "locked_until": now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+            "created_at": now,
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+
+    # Reserva abandonada por um processo que morreu no meio da requisição
+    taken = idempotency_collection.find_one_and_update(
+        {"_id": record_id, "status": "in_progress", "locked_until": {"$lte": now}},
+        {"$set": {
+            "request_hash": request_hash,
+            "locked_until": now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS),
+        }},
+    )
+    if taken is not None:
+        return None
+    return idempotency_collection.find_one({"_id": record_id})
+
+
+async def _wait_for_completion(record_id: str) -> Optional[dict]:
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+        record = await asyncio.to_thread(idempotency_collection.find_one, {"_id": record_id})
+        if record is None or record["status"] == "completed":
+            return record
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Requisição com esta Idempotency-Key ainda em processamento"
+    )
+
+
+def _replay(record: dict, response: Optional[Response]) -> Any:
+    if response is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+    return record["response"]
+
+
+async def run_idempotent(
+    key: Optional[str],
+    scope: str,
+    payload: Any,
+    func: Callable[[], Awaitable[Any]],
+    response: Optional[Response] = None,
+) -> Any:
+    """
+    Executa `func` uma única vez por (scope, key).
+    Repetições recebem a resposta armazenada; duplicatas concorrentes
+    aguardam a primeira execução terminar.
+    """
+    if not key:
+        return await func()
+
+    if len(key) > 255:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key deve ter no máximo 255 caracteres"
+        )
+
+    record_id = f"{scope}:{key}"
+    request_hash = fingerprint(payload)
+
+    cached = _cache.get(record_id)
+    if cached is not None:
+        _check_fingerprint(cached, request_hash)
+        return _replay(cached, response)
+
+    pending = _inflight.get(record_id)
+    if pending is not None:
+        record = await asyncio.shield(pending)
+        if record is not None:
+            _check_fingerprint(record, request_hash)
+            return _replay(record, response)
+        return await run_idempotent(key, scope, payload, func, response)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[record_id] = future
+    try:
+        existing = await asyncio.to_thread(_acquire, record_id, request_hash)
+        if existing is not None:
+            _check_fingerprint(existing, request_hash)
+            if existing["status"] != "completed":
+                existing = await _wait_for_completion(record_id)
+            if existing is not None:
+                _cache.set(record_id, existing)
+                future.set_result(existing)
+                return _replay(existing, response)
+            # A primeira execução falhou e liberou a chave: recomputa
+            existing = await asyncio.to_thread(_acquire, record_id, request_hash)
+            if existing is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Requisição com esta Idempotency-Key ainda em processamento"
+                )
+
+        try:
+            result = await func()
+        except BaseException:
+            await asyncio.to_thread(
+                idempotency_collection.delete_one,
+                {"_id": record_id, "status": "in_progress"}
+            )
+            raise
+
+        record = {
+            "request_hash": request_hash,
+            "status": "completed",
+            "response": jsonable_encoder(result),
+        }
+        await asyncio.to_thread(
+            idempotency_collection.update_one,
+            {"_id": record_id},
+            {"$set": {**record, "completed_at": datetime.utcnow()}, "$unset": {"locked_until": ""}}
+        )
+        _cache.set(record_id, record)
+        future.set_result(record)
+        return result
+    finally:
+        if not future.done():
+            future.set_result(None)
+        _inflight.pop(record_id, None)
@@ -0,0 +1,126 @@
+"""
+Coleta de imagens órfãs.
+
+Compara o diretório de uploads com as `image_urls` dos produtos e remove,
+em lotes, arquivos sem referência mais velhos que IMAGE_GC_GRACE_SECONDS
+(uploads avulsos nunca vinculados, sobras de deletes que falharam e
+arquivos temporários abandonados).
+
+Execução manual: python -m app.utils.image_gc [--dry-run]
+"""
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Set
+
+from app.config import settings
+from app.database import products_collection, image_blobs_collection
+from app.utils.images import VARIANT_SIZES
+from app.utils.upload import UPLOAD_DIR, TEMP_DIR, path_from_url
+
+logger = logging.getLogger(__name__)
+
+_VARIANT_SUFFIXES = tuple(f"_{name}" for name in VARIANT_SIZES)
+
+
+def _image_key(relative_path: str) -> str:
+    """Caminho sem extensão e sem sufixo de variante: variantes seguem o original"""
+    key = os.path.splitext(relative_path)[0]
+    for suffix in _VARIANT_SUFFIXES:
+        if key.endswith(suffix):
+            return key[: -len(suffix)]
+    return key
+
+
+def referenced_keys() -> Set[str]:
+    """Chaves de todas as imagens usadas por produtos, lendo o cursor em lotes"""
+    keys = set()
+    cursor = products_collection.find({}, {"image_urls": 1}).batch_size(1000)
+    for product in cursor:
+        for url in product.get("image_urls") or []:
+            keys.add(_image_key(path_from_url(url).relative_to(UPLOAD_DIR).as_posix()))
+    return keys
+
+
+def _iter_files(root: Path):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            yield Path(dirpath) / filename
+
+
+def _remove_batch(batch: List[Path], cutoff: float, dry_run: bool) -> int:
+    removed_bytes = 0
+    removed_paths = []
+    for path in batch:
+        try:
+            stat = path.stat()
+            # Reupload deduplicado renova o mtime: o blob voltou a ser usado
+            if stat.st_mtime >= cutoff:
+                continue
+            if not dry_run:
+                path.unlink()
+        except FileNotFoundError:
+            continue
+        removed_bytes += stat.st_size
+        removed_paths.append(path.relative_to(UPLOAD_DIR).as_posix())
+
+    if removed_paths and not dry_run:
+        image_blobs_collection.delete_many({"path": {"$in": removed_paths}})
+    return removed_bytes
+
+
+def collect_orphans(
+    grace_seconds: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    dry_run: bool = False
+) -> dict:
+    """Remove arquivos de upload que nenhum produto referencia"""
+    grace_seconds = grace_seconds if grace_seconds is not None else settings.IMAGE_GC_GRACE_SECONDS
+    batch_size = batch_size or settings.IMAGE_GC_BATCH_SIZE
+    cutoff = time.time() - grace_seconds
+
+    referenced = referenced_keys()
+    scanned = 0
+    orphans = 0
+    removed_bytes = 0
+    batch: List[Path] = []
+
+    for path in _iter_files(UPLOAD_DIR):
+        scanned += 1
+        relative = path.relative_to(UPLOAD_DIR).as_posix()
+        if path.parent != TEMP_DIR and _image_key(relative) in referenced:
+            continue
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+
+        orphans += 1
+        batch.append(path)
+        if len(batch) >= batch_size:
+            removed_bytes += _remove_batch(batch, cutoff, dry_run)
+            batch = []
+
+    if batch:
+        removed_bytes += _remove_batch(batch, cutoff, dry_run)
+
+    if orphans:
+        logger.info(
+            "Imagens órfãs coletadas",
+            extra={"orphans": orphans, "removed_bytes": removed_bytes, "dry_run": dry_run}
+        )
+
+    return {
+        "scanned": scanned,
+        "referenced": len(referenced),
+        "orphans": orphans,
+        "removed_bytes": removed_bytes,
+        "dry_run": dry_run,
+    }
+
+
+if __name__ == "__main__":
+    print(collect_orphans(dry_run="--dry-run" in sys.argv))
@@ -0,0 +1,118 @@
+"""
+Variantes redimensionadas (WebP e JPEG) das imagens de produto.
+
+A geração é disparada pela outbox depois do upload e roda num
+ProcessPoolExecutor, então decodificar e redimensionar nunca ocupa o
+event loop nem disputa o GIL com as requisições.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.config import settings
+from app.utils.upload import path_from_url
+
+logger = logging.getLogger(__name__)
+
+# Lado maior, em pixels, de cada variante
+VARIANT_SIZES = {"thumb": 200, "medium": 800}
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+THUMBNAIL_VARIANT = "thumb"
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def image_key(image_url: str) -> str:
+    """Chave da imagem no mapa `image_variants` (nome do arquivo sem extensão)"""
+    return Path(image_url).stem
+
+
+def generate_variants(source: str, quality: int) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    Executa no processo worker. Grava as variantes ao lado do original e
+    devolve {variante: {formato: nome_do_arquivo}}; None se não houver imagem válida.
+    """
+    from PIL import Image, ImageOps
+
+    source_path = Path(source)
+    # Arquivo ausente, formato desconhecido, truncado ou bomba de descompressão:
+    # falhas permanentes, não adianta a outbox tentar de novo
+    try:
+        image = Image.open(source_path)
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+    with image:
+        try:
+            image.load()
+        except (OSError, Image.DecompressionBombError):
+            return None
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        variants = {}
+        for name, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size))
+            variants[name] = {}
+            for ext, fmt in VARIANT_FORMATS.items():
+                output = resized.convert("RGB") if fmt == "JPEG" else resized
+                filename = f"{source_path.stem}_{name}.{ext}"
+                temp_path = source_path.with_name(f".{filename}.part")
+                output.save(temp_path, fmt, quality=quality)
+                os.replace(temp_path, source_path.with_name(filename))
+                variants[name][ext] = filename
+    return variants
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: o processo pai já tem threads (logging, pools), fork não é seguro
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+async def build_variants(image_url: str) -> Optional[Dict[str, Dict[str, str]]]:
+    """Gera as variantes de uma imagem enviada e devolve o mapa com as URLs"""
+    source = path_from_url(image_url)
+    loop = asyncio.get_running_loop()
+    filenames = await loop.run_in_executor(
+        _get_pool(), generate_variants, str(source), settings.IMAGE_QUALITY
+    )
+    if filenames is None:
+        logger.warning("Imagem sem variantes: arquivo ausente ou inválido", extra={"image_url": image_url})
+        return None
+
+    base_url = image_url.rsplit("/", 1)[0]
+    return {
+        name: {ext: f"{base_url}/{filename}" for ext, filename in formats.items()}
+        for name, formats in filenames.items()
+    }
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def thumbnail_url(product: dict) -> Optional[str]:
+    """Menor variante da primeira imagem; o original enquanto ela não existir"""
+    image_urls = product.get("image_urls") or []
+    if not image_urls:
+        return None
+    variants = product.get("image_variants", {}).get(image_key(image_urls[0]), {})
+    return variants.get(THUMBNAIL_VARIANT, {}).get("webp") or image_urls[0]
+
@@ -0,0 +1,241 @@
+"""
+Ledger de estoque.
+
+Toda movimentação de estoque é gravada como um lançamento imutável em
+`inventory_ledger`. O campo `stock` dos produtos é uma projeção, aplicada
+periodicamente em lotes agrupados por produto.
+
+Reconciliação: python -m app.utils.inventory reconcile [--dry-run]
+"""
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from app.config import settings
+from app.database import inventory_ledger_collection, products_collection, start_transaction
+
+REASON_INITIAL = "initial"
+REASON_ORDER = "order"
+REASON_ORDER_CANCEL = "order_cancel"
+REASON_ADJUSTMENT = "adjustment"
+REASON_OPENING_BALANCE = "opening_balance"
+REASON_PAYMENT_EXPIRED = "payment_expired"
+
+# Reserva de lote abandonada (processo caiu no meio) volta a ficar livre
+CLAIM_TIMEOUT_SECONDS = 300
+
+
+def ensure_indexes() -> None:
+    inventory_ledger_collection.create_index([("applied", ASCENDING), ("product_id", ASCENDING)])
+    inventory_ledger_collection.create_index([("product_id", ASCENDING), ("created_at", ASCENDING)])
+    inventory_ledger_collection.create_index([("claimed_by", ASCENDING)], sparse=True)
+
+
+def _entry(product_id: str, delta: int, reason: str, reference: Optional[str], applied: bool) -> dict:
+    now = datetime.utcnow()
+    return {
+        "product_id": product_id,
+        "delta": delta,
+        "reason": reason,
+        "reference": reference,
+        "applied": applied,
+        "applied_at": now if applied else None,
+        "created_at": now,
+    }
+
+
+def record_movements(
+    movements: Iterable[tuple[str, int]],
+    reason: str,
+    reference: Optional[str] = None,
+    session=None,
+    applied: bool = False
+) -> int:
+    """
+    Grava movimentações (product_id, delta) no ledger.
+    `applied=True` é usado quando o documento do produto já reflete o valor,
+    como no cadastro do produto.
+    """
+    entries = [
+        _entry(product_id, delta, reason, reference, applied)
+        for product_id, delta in movements
+        if delta
+    ]
+    if entries:
+        inventory_ledger_collection.insert_many(entries, session=session)
+    return len(entries)
+
+
+def release_orders(orders: Iterable[dict], reason: str, session=None) -> int:
+    """Devolve ao estoque os itens de vários pedidos com um único insert"""
+    entries = [
+        _entry(item["product_id"], item["quantity"], reason, str(order["_id"]), False)
+        for order in orders
+        for item in order["items"]
+        if item["quantity"]
+    ]
+    if entries:
+        inventory_ledger_collection.insert_many(entries, session=session)
+    return len(entries)
+
+
+def record_movement(product_id: str, delta: int, reason: str, reference: Optional[str] = None, session=None) -> int:
+    return record_movements([(product_id, delta)], reason, reference, session=session)
+
+
+def pending_deltas(product_ids: List[str]) -> Dict[str, int]:
+    """Soma das movimentações ainda não projetadas, por produto"""
+    if not product_ids:
+        return {}
+    rows = inventory_ledger_collection.aggregate([
+        {"$match": {"applied": False, "product_id": {"$in": product_ids}}},
+        {"$group": {"_id": "$product_id", "delta": {"$sum": "$delta"}}},
+    ])
+    return {row["_id"]: row["delta"] for row in rows}
+
+
+def available_stock(product: dict, pending: Optional[Dict[str, int]] = None) -> int:
+    """Estoque projetado mais as movimentações pendentes"""
+    product_id = str(product["_id"])
+    if pending is None:
+        pending = pending_deltas([product_id])
+    return product.get("stock", 0) + pending.get(product_id, 0)
+
+
+def _claim_batch(batch_size: int) -> Optional[ObjectId]:
+    """
+    Reserva um lote de lançamentos pendentes para esta execução.
+    O update filtra por `claimed_by` livre, então duas execuções
+    simultâneas nunca ficam com o mesmo lançamento.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+    claimable = {
+        "applied": False,
+        "$or": [{"claimed_by": None}, {"claimed_at": {"$lt": stale}}],
+    }
+    candidates = [
+        entry["_id"]
+        for entry in inventory_ledger_collection
+        .find(claimable, {"_id": 1})
+        .sort("_id", ASCENDING)
+        .limit(batch_size)
+    ]
+    if not candidates:
+        return None
+
+    claim = ObjectId()
+    inventory_ledger_collection.update_many(
+        {"_id": {"$in": candidates}, **claimable},
+        {"$set": {"claimed_by": claim, "claimed_at": now}}
+    )
+    return claim
+
+
+def apply_pending(batch_size: Optional[int] = None) -> dict:
+    """Aplica os lançamentos pendentes em `products`, um $inc por produto e por lote"""
+    batch_size = batch_size or settings.INVENTORY_BATCH_SIZE
+    entries_applied = 0
+    products_updated = 0
+
+    while True:
+        claim = _claim_batch(batch_size)
+        if claim is None:
+            break
+
+        # Só o que esta execução reservou; outra pode ter levado parte do lote
+        entries = list(
+            inventory_ledger_collection.find(
+                {"claimed_by": claim, "applied": False},
+                {"product_id": 1, "delta": 1}
+            )
+        )
+
+        totals: Dict[str, int] = defaultdict(int)
+        for entry in entries:
+            totals[entry["product_id"]] += entry["delta"]
+
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne({"_id": ObjectId(product_id)}, {"$inc": {"stock": delta}})
+            for product_id, delta in totals.items()
+            if delta and ObjectId.is_valid(product_id)
+        ]
+
+        with start_transaction() as session:
+            if operations:
+                products_collection.bulk_write(operations, ordered=False, session=session)
+            inventory_ledger_collection.update_many(
+                {"_id": {"$in": [entry["_id"] for entry in entries]}, "claimed_by": claim},
+                {"$set": {"applied": True, "applied_at": now}},
+                session=session
+            )
+
+        entries_applied += len(entries)
+        products_updated += len(operations)
+
+        if len(entries) < batch_size:
+            break
+
+    return {"entries": entries_applied, "products": products_updated}
+
+
+def reconcile(dry_run: bool = False) -> dict:
+    """
+    Reconstrói o estoque de todos os produtos a partir do ledger.
+    Produtos sem saldo inicial no ledger (cadastrados antes dele) recebem um
+    saldo de abertura: o estoque atual menos o que já foi aplicado.
+    """
+    apply_pending()
+
+    # Só lançamentos aplicados: os pendentes ainda não estão em `stock`
+    totals = {
+        row["_id"]: row
+        for row in inventory_ledger_collection.aggregate([
+            {"$group": {
+                "_id": "$product_id",
+                "stock": {"$sum": {"$cond": ["$applied", "$delta", 0]}},
+                "has_base": {"$max": {"$in": ["$reason", [REASON_INITIAL, REASON_OPENING_BALANCE]]}},
+            }}
+        ])
+    }
+
+    opening = []
+    operations = []
+    drift = []
+    for product in products_collection.find({}, {"stock": 1}):
+        product_id = str(product["_id"])
+        current = product.get("stock", 0)
+        row = totals.get(product_id)
+        if row is None or not row["has_base"]:
+            applied = row["stock"] if row else 0
+            opening.append(_entry(product_id, current - applied, REASON_OPENING_BALANCE, None, True))
+            continue
+        expected = row["stock"]
+        if expected != current:
+            drift.append({"product_id": product_id, "stock": current, "ledger": expected})
+            operations.append(UpdateOne({"_id": product["_id"]}, {"$set": {"stock": expected}}))
+
+    if not dry_run:
+        # Grava o saldo mesmo quando é zero: marca o produto como já migrado
+        if opening:
+            inventory_ledger_collection.insert_many(opening)
+        if operations:
+            products_collection.bulk_write(operations, ordered=False)
+
+    return {
+        "dry_run": dry_run,
+        "opening_balances": len(opening),
+        "corrected": len(drift),
+        "drift": drift,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "reconcile":
+        print(reconcile(dry_run="--dry-run" in sys.argv))
+    else:
+        print(apply_pending())
@@ -0,0 +1,203 @@
+"""
+Logging estruturado e não bloqueante.
+
+Os registros saem em JSON (uma linha por evento) por um QueueHandler; a
+escrita no stdout acontece numa thread do QueueListener, fora do event loop.
+Cada requisição recebe um request id e uma decisão de amostragem, aplicadas
+a todos os logs emitidos durante ela.
+"""
+import copy
+import json
+import logging
+import queue
+import random
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_route_level_var: ContextVar[Optional[int]] = ContextVar("route_level", default=None)
+_sampled_var: ContextVar[bool] = ContextVar("sampled", default=True)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Atributos padrão do LogRecord; o resto veio de `extra=` e vai para o JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+
+def _parse_route_map(raw: str) -> Dict[str, str]:
+    routes = {}
+    for part in raw.split(","):
+        if "=" in part:
+            prefix, value = part.split("=", 1)
+            routes[prefix.strip()] = value.strip()
+    return routes
+
+
+_route_levels = {
+    prefix: logging.getLevelName(level.upper())
+    for prefix, level in _parse_route_map(settings.LOG_ROUTE_LEVELS).items()
+}
+_route_sampling = {
+    prefix: float(rate)
+    for prefix, rate in _parse_route_map(settings.LOG_ROUTE_SAMPLING).items()
+}
+
+
+def _match(routes: dict, path: str):
+    best = None
+    for prefix in routes:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return routes[best] if best is not None else None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            data["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+class _QueueHandler(QueueHandler):
+    """Mantém os campos extras e o traceback separados da mensagem"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Roda no thread que emite o log: anexa o request id e aplica o nível
+    por rota e a amostragem. WARNING ou acima nunca é descartado.
+    """
+
+    def __init__(self, level: int):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if record.levelno >= logging.WARNING:
+            return True
+        route_level = _route_level_var.get()
+        if record.levelno < (route_level if route_level is not None else self.level):
+            return False
+        return _sampled_var.get()
+
+
+def setup_logging() -> None:
+    """Configura o logger `app` com fila e listener em segundo plano"""
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(logging.getLevelName(settings.LOG_LEVEL.upper())))
+
+    logger = logging.getLogger("app")
+    logger.handlers = [queue_handler]
+    logger.setLevel(min([logging.getLevelName(settings.LOG_LEVEL.upper()), *_route_levels.values()]))
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def begin_request(path: str, request_id: Optional[str]) -> Tuple[str, tuple]:
+    """Define o contexto de log da requisição; retorna o id e os tokens para reset"""
+    request_id = request_id or uuid.uuid4().hex
+    rate = _match(_route_sampling, path)
+    tokens = (
+        request_id_var.set(request_id),
+        _route_level_var.set(_match(_route_levels, path)),
+        _sampled_var.set(rate is None or random.random() < rate),
+    )
+    return request_id, tokens
+
+
+def end_request(tokens: tuple) -> None:
+    request_token, level_token, sampled_token = tokens
+    request_id_var.reset(request_token)
+    _route_level_var.reset(level_token)
+    _sampled_var.reset(sampled_token)
+
+
+class RequestContextMiddleware:
+    """Middleware ASGI que propaga/gera o X-Request-ID e o contexto de log"""
+
+    def __init__(self, app):
+        self.app = app
+        self._header = REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", []):
+            if name == self._header:
+                incoming = value.decode("latin-1")[:128]
+                break
+
+        request_id, tokens = begin_request(scope.get("path", ""), incoming)
+        header_value = request_id.encode("latin-1")
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(self._header, header_value)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            end_request(tokens)
@@ -0,0 +1,165 @@
+"""
+Métricas no formato Prometheus, expostas em /metrics.
+
+- HTTP: histograma de latência e contagem por rota (template, não o path
+  concreto, para não explodir a cardinalidade), método e status;
+- MongoDB: contagem e latência por coleção e comando, gauges do pool;
+- register_stats(): ponto de extensão para caches e workers publicarem
+  os números do próprio `stats()`, lidos só na hora da coleta.
+"""
+import logging
+import time
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+
+from app.database import register_event_listener
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+http_requests = Counter(
+    "http_requests_total", "Requisições HTTP", ["method", "route", "status"]
+)
+http_latency = Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP", ["method", "route"],
+    buckets=_LATENCY_BUCKETS
+)
+mongo_commands = Counter(
+    "mongo_commands_total", "Comandos enviados ao MongoDB", ["command", "collection", "outcome"]
+)
+mongo_latency = Histogram(
+    "mongo_command_duration_seconds", "Latência dos comandos do MongoDB", ["command", "collection"],
+    buckets=_MONGO_BUCKETS
+)
+mongo_pool_connections = Gauge(
+    "mongo_pool_connections", "Conexões do pool do MongoDB", ["state"]
+)
+mongo_pool_checkout_failures = Counter(
+    "mongo_pool_checkout_failures_total", "Falhas ao obter conexão do pool"
+)
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+class _StatsCollector:
+    """Converte os valores numéricos de um `stats()` em gauges `<prefixo>_<campo>`"""
+
+    def __init__(self, prefix: str, stats_fn: Callable[[], Dict], documentation: str):
+        self.prefix = prefix
+        self.stats_fn = stats_fn
+        self.documentation = documentation
+
+    def collect(self):
+        try:
+            stats = self.stats_fn()
+        except Exception:
+            logger.exception("Falha ao coletar métricas", extra={"prefix": self.prefix})
+            return
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield GaugeMetricFamily(f"{self.prefix}_{key}", self.documentation or key, value=value)
+
+
+def register_stats(prefix: str, stats_fn: Callable[[], Dict], documentation: str = "") -> None:
+    """Publica os números de `stats_fn()` como gauges, lidos a cada coleta"""
+    REGISTRY.register(_StatsCollector(prefix, stats_fn, documentation))
+
+
+class _CommandListener(monitoring.CommandListener):
+    """Latência por comando e coleção; o nome da coleção só vem no evento de início"""
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def _key(self, event) -> tuple:
+        return (event.request_id, event.connection_id)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[self._key(event)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(self._key(event), "")
+        mongo_commands.labels(event.command_name, collection, "ok").inc()
+        mongo_latency.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collections.pop(self._key(event), "")
+        mongo_commands.labels(event.command_name, collection, "error").inc()
+        mongo_latency.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+
+class _PoolListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._open = mongo_pool_connections.labels("open")
+        self._in_use = mongo_pool_connections.labels("in_use")
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def connection_created(self, event):
+        self._open.inc()
+
+    def connection_closed(self, event):
+        self._open.dec()
+
+    def connection_checked_out(self, event):
+        self._in_use.inc()
+
+    def connection_checked_in(self, event):
+        self._in_use.dec()
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures.inc()
+
+
+register_event_listener(_CommandListener())
+register_event_listener(_PoolListener())
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: latência e status por rota"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # O router preenche scope["route"] ao casar a rota; mounts
+            # (arquivos estáticos) só deixam o endpoint e o root_path
+            route = scope.get("route")
+            if route is not None:
+                route_path = route.path
+            elif scope.get("endpoint") is not None and scope.get("root_path"):
+                route_path = scope["root_path"]
+            else:
+                route_path = "unmatched"
+            method = scope["method"]
+            http_latency.labels(method, route_path).observe(time.perf_counter() - started)
+            http_requests.labels(method, route_path, str(status_code)).inc()
@@ -0,0 +1,188 @@
+import asyncio
+import inspect
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from pymongo import ASCENDING, ReturnDocument
+
+from app.config import settings
+from app.database import outbox_collection, outbox_dead_letter_collection
+
+logger = logging.getLogger(__name__)
+
+_handlers: Dict[str, List[Callable]] = {}
+
+
+def handler(event_type: str):
+    """Registra uma função para processar eventos do tipo informado"""
+    def decorator(func: Callable) -> Callable:
+        _handlers.setdefault(event_type, []).append(func)
+        return func
+    return decorator
+
+
+def enqueue_event(event_type: str, payload: dict, session=None):
+    """
+    Grava um evento na outbox.
+    Deve receber a mesma sessão da escrita principal para que o evento
+    só exista se o pedido também existir.
+    """
+    now = datetime.utcnow()
+    return outbox_collection.insert_one(
+        {
+            "type": event_type,
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "available_at": now,
+            "locked_until": None,
+            "last_error": None,
+            "created_at": now,
+        },
+        session=session,
+    ).inserted_id
+
+
+def ensure_indexes() -> None:
+    outbox_collection.create_index([("status", ASCENDING), ("available_at", ASCENDING)])
+    outbox_collection.create_index([("status", ASCENDING), ("locked_until", ASCENDING)])
+
+
+def backoff_delay(attempts: int) -> float:
+    """Backoff exponencial com jitter, limitado por OUTBOX_BACKOFF_MAX"""
+    delay = settings.OUTBOX_BACKOFF_BASE * (2 ** max(attempts - 1, 0))
+    delay = min(delay, settings.OUTBOX_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxWorker:
+    """Pool de tarefas asyncio que consome a outbox dentro do processo"""
+
+    def __init__(self, concurrency: int = 2):
+        self.concurrency = concurrency
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+        self.processed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping.clear()
+        try:
+            await asyncio.to_thread(ensure_indexes)
+        except Exception:
+            logger.exception("Não foi possível criar índices da outbox")
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"outbox-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info("Outbox iniciada", extra={"workers": self.concurrency})
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return outbox_collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "pending", "available_at": {"$lte": now}},
+                    {"status": "processing", "locked_until": {"$lte": now}},
+                ]
+            },
+            {
+                "$set": {
+                    "status": "processing",
+                    "locked_until": now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _dispatch(self, event: dict) -> None:
+        for func in _handlers.get(event["type"], []):
+            if inspect.iscoroutinefunction(func):
+                await func(event["payload"])
+            else:
+                await asyncio.to_thread(func, event["payload"])
+
+    def _complete(self, event: dict) -> None:
+        outbox_collection.delete_one({"_id": event["_id"]})
+        self.processed += 1
+
+    def _fail(self, event: dict, error: Exception) -> None:
+        if event["attempts"] >= settings.OUTBOX_MAX_ATTEMPTS:
+            outbox_dead_letter_collection.insert_one({
+                **event,
+                "status": "dead",
+                "last_error": str(error),
+                "dead_at": datetime.utcnow(),
+            })
+            outbox_collection.delete_one({"_id": event["_id"]})
+            self.dead_lettered += 1
+            logger.error(
+                "Evento da outbox enviado para dead letter",
+                extra={"event_id": str(event["_id"]), "event_type": event["type"], "error": str(error)}
+            )
+            return
+
+        outbox_collection.update_one(
+            {"_id": event["_id"]},
+            {
+                "$set": {
+                    "status": "pending",
+                    "available_at": datetime.utcnow() + timedelta(seconds=backoff_delay(event["attempts"])),
+                    "locked_until": None,
+                    "last_error": str(error),
+                }
+            },
+        )
+        self.retried += 1
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                event = await asyncio.to_thread(self._claim)
+            except Exception:
+                logger.exception("Outbox: erro ao buscar eventos")
+                event = None
+
+            if event is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=settings.OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._dispatch(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self._fail, event, e)
+            else:
+                await asyncio.to_thread(self._complete, event)
+
+    def stats(self) -> dict:
+        """Métricas da fila: profundidade, dead letters e contadores do processo"""
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": outbox_collection.count_documents({"status": "pending"}),
+            "in_flight": outbox_collection.count_documents({"status": "processing"}),
+            "dead_letter": outbox_dead_letter_collection.estimated_document_count(),
+            "processed": self.processed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+outbox_worker = OutboxWorker(concurrency=settings.OUTBOX_WORKERS)
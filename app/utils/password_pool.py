@@ -0,0 +1,83 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+
+def _percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class PasswordHasherPool:
+    """
+    Pool limitado de threads para bcrypt.
+    O bcrypt libera o GIL, então as threads rodam em paralelo sem travar o
+    event loop. Acima do limite de fila a requisição é recusada com 503.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_ms = deque(maxlen=1024)
+        self._run_ms = deque(maxlen=1024)
+
+    def _timed(self, submitted: float, func: Callable, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            finished = time.perf_counter()
+            self._wait_ms.append((started - submitted) * 1000)
+            self._run_ms.append((finished - started) * 1000)
+
+    async def run(self, func: Callable, *args):
+        if self._pending >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado. Tente novamente em instantes.",
+                headers={"Retry-After": "1"}
+            )
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._executor, self._timed, time.perf_counter(), func, *args
+            )
+            self.completed += 1
+            return result
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        wait_ms = list(self._wait_ms)
+        run_ms = list(self._run_ms)
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms_p50": round(_percentile(wait_ms, 0.50), 2),
+            "wait_ms_p99": round(_percentile(wait_ms, 0.99), 2),
+            "hash_ms_p50": round(_percentile(run_ms, 0.50), 2),
+            "hash_ms_p99": round(_percentile(run_ms, 0.99), 2),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordHasherPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_LIMIT)
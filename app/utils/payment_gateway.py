@@ -0,0 +1,262 @@
+"""
+Cliente do gateway de pagamento.
+
+Um único httpx.AsyncClient com pool de conexões, timeouts e retentativas
+limitadas por um orçamento (no máximo PAYMENT_GATEWAY_RETRY_BUDGET das
+requisições viram retentativa), para que um gateway lento não multiplique
+a própria carga. Toda cobrança leva um Idempotency-Key, então repetir é seguro.
+
+Com PAYMENT_GATEWAY=simulator as requisições não saem do processo: um
+transporte local responde com latência e taxas de falha configuráveis,
+exercitando o mesmo caminho de timeout e retentativa. O httpx ignora
+`limits` quando recebe um transporte próprio, então o simulador limita as
+requisições simultâneas do mesmo jeito (PoolTimeout ao esgotar a espera).
+"""
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+
+
+class GatewayError(Exception):
+    """Gateway indisponível ou sem resposta válida depois das retentativas"""
+
+
+class GatewayTimeout(GatewayError):
+    """
+    Alguma tentativa ficou sem resposta depois de enviada: o gateway pode
+    ter processado a requisição, então o resultado fica para a conciliação
+    """
+
+
+class RetryBudget:
+    """
+    Cada requisição deposita `ratio` fichas; cada retentativa gasta uma.
+    `min_per_second` garante algumas retentativas com tráfego baixo.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float = 1.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self) -> None:
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class GatewaySimulator:
+    """Gateway falso em memória, usado como transporte do httpx"""
+
+    PIX_CODE = "00020126360014BR.COM.PIX0114+5511999999995204000053039865406100.005802BR5913Loja Demo6009Sao Paulo62070503***6304ABCD"
+
+    def __init__(self):
+        self.charges: dict = {}
+        self._by_idempotency_key: dict = {}
+
+    async def _latency(self) -> None:
+        latency = settings.PAYMENT_SIMULATOR_LATENCY_MS + random.uniform(0, settings.PAYMENT_SIMULATOR_JITTER_MS)
+        latency /= 1000
+        if latency > settings.PAYMENT_GATEWAY_TIMEOUT:
+            await asyncio.sleep(settings.PAYMENT_GATEWAY_TIMEOUT)
+            raise httpx.ReadTimeout("Simulador: tempo de resposta excedido")
+        await asyncio.sleep(latency)
+
+    def _refresh(self, charge: dict) -> dict:
+        # PIX pendente é confirmado pelo "banco" depois de alguns segundos
+        if charge["status"] == "pending" and datetime.utcnow() >= charge["confirm_at"]:
+            charge["status"] = "approved"
+        return {k: v for k, v in charge.items() if k != "confirm_at"}
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await self._latency()
+        if random.random() < settings.PAYMENT_SIMULATOR_FAILURE_RATE:
+            return httpx.Response(503, json={"error": "unavailable"})
+
+        if request.method == "GET" and request.url.path == "/charges":
+            charge_id = self._by_idempotency_key.get(request.url.params.get("idempotency_key"))
+            if charge_id is None:
+                return httpx.Response(404, json={"error": "not_found"})
+            return httpx.Response(200, json=self._refresh(self.charges[charge_id]))
+
+        if request.method == "GET" and request.url.path.startswith("/charges/"):
+            charge = self.charges.get(request.url.path.rsplit("/", 1)[1])
+            if charge is None:
+                return httpx.Response(404, json={"error": "not_found"})
+            return httpx.Response(200, json=self._refresh(charge))
+
+        if request.method == "POST" and request.url.path == "/charges":
+            key = request.headers.get("Idempotency-Key")
+            if key in self._by_idempotency_key:
+                return httpx.Response(200, json=self._refresh(self.charges[self._by_idempotency_key[key]]))
+
+            body = json.loads(request.content)
+            charge = {
+                "id": f"sim_{uuid.uuid4().hex}",
+                "reference": body["reference"],
+                "method": body["method"],
+                "amount": body["amount"],
+                "created_at": datetime.utcnow().isoformat(),
+                "confirm_at": datetime.utcnow() + timedelta(seconds=settings.PAYMENT_SIMULATOR_PIX_CONFIRM_SECONDS),
+            }
+            if body["method"] == "pix":
+                charge.update(status="pending", pix_code=self.PIX_CODE)
+            elif random.random() < settings.PAYMENT_SIMULATOR_DECLINE_RATE:
+                charge["status"] = "declined"
+            else:
+                charge["status"] = "approved"
+            self.charges[charge["id"]] = charge
+            if key:
+                self._by_idempotency_key[key] = charge["id"]
+            return httpx.Response(200, json=self._refresh(charge))
+
+        return httpx.Response(404, json={"error": "not_found"})
+
+
+class LimitedTransport(httpx.AsyncBaseTransport):
+    """Transporte com no máximo `max_connections` requisições em andamento"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_connections: int, pool_timeout: float):
+        self._transport = transport
+        self._slots = asyncio.Semaphore(max_connections)
+        self._pool_timeout = pool_timeout
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._pool_timeout)
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout("Nenhuma conexão livre no pool", request=request)
+        try:
+            return await self._transport.handle_async_request(request)
+        finally:
+            self._slots.release()
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class PaymentGateway:
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.simulator: Optional[GatewaySimulator] = None
+        self.retry_budget = RetryBudget(settings.PAYMENT_GATEWAY_RETRY_BUDGET)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            if settings.PAYMENT_GATEWAY == "simulator":
+                self.simulator = GatewaySimulator()
+                transport = LimitedTransport(
+                    httpx.MockTransport(self.simulator.handle),
+                    settings.PAYMENT_GATEWAY_MAX_CONNECTIONS,
+                    settings.PAYMENT_GATEWAY_TIMEOUT
+                )
+                base_url = "http://gateway.simulator"
+            else:
+                transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(
+                    max_connections=settings.PAYMENT_GATEWAY_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.PAYMENT_GATEWAY_MAX_CONNECTIONS,
+                ))
+                base_url = settings.PAYMENT_GATEWAY_URL
+            self._client = httpx.AsyncClient(
+                base_url=base_url,
+                headers={"Authorization": f"Bearer {settings.PAYMENT_GATEWAY_API_KEY}"},
+                timeout=httpx.Timeout(settings.PAYMENT_GATEWAY_TIMEOUT, connect=min(settings.PAYMENT_GATEWAY_TIMEOUT, 3.0)),
+                transport=transport
+            )
+        return self._client
+
+    async def _request(self, method: str, url: str, **kwargs) -> dict:
+        client = self._get_client()
+        self.requests += 1
+        self.retry_budget.deposit()
+        attempt = 0
+        unanswered = False
+        while True:
+            try:
+                response = await client.request(method, url, **kwargs)
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = f"{type(e).__name__}: {e}"
+                # Timeout de conexão ou de pool: a requisição nem saiu
+                unanswered = unanswered or isinstance(e, (httpx.ReadTimeout, httpx.WriteTimeout))
+            except httpx.HTTPStatusError as e:
+                self.failures += 1
+                raise GatewayError(f"Gateway recusou a requisição: HTTP {e.response.status_code}") from e
+
+            attempt += 1
+            if attempt > settings.PAYMENT_GATEWAY_MAX_RETRIES or not self.retry_budget.withdraw():
+                self.failures += 1
+                raise (GatewayTimeout if unanswered else GatewayError)(error)
+            self.retries += 1
+            await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0) * random.uniform(0.5, 1.0))
+
+    async def create_charge(
+        self,
+        method: str,
+        amount: float,
+        reference: str,
+        idempotency_key: str,
+        card: Optional[dict] = None
+    ) -> dict:
+        payload = {"method": method, "amount": amount, "reference": reference}
+        if card is not None:
+            payload["card"] = card
+        return await self._request(
+            "POST", "/charges", json=payload, headers={"Idempotency-Key": idempotency_key}
+        )
+
+    async def get_charge(self, charge_id: str) -> dict:
+        return await self._request("GET", f"/charges/{charge_id}")
+
+    async def find_charge(self, idempotency_key: str) -> Optional[dict]:
+        """Cobrança criada com a chave informada; None se o gateway não a recebeu"""
+        try:
+            return await self._request("GET", "/charges", params={"idempotency_key": idempotency_key})
+        except GatewayError as e:
+            if isinstance(e.__cause__, httpx.HTTPStatusError) and e.__cause__.response.status_code == 404:
+                return None
+            raise
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": settings.PAYMENT_GATEWAY,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "retry_tokens": round(self.retry_budget.tokens, 2),
+        }
+
+
+payment_gateway = PaymentGateway()
@@ -0,0 +1,194 @@
+"""
+Pagamentos de pedidos.
+
+Cada tentativa vira um documento em `payments` (o id dele é o
+Idempotency-Key enviado ao gateway). Só pode haver um pagamento ativo por
+pedido, garantido por índice único parcial em `active`. A confirmação
+muda o pagamento e o status do pedido na mesma transação.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from app.database import orders_collection, payments_collection, start_transaction
+from app.models.order import OrderStatus
+from app.utils.payment_gateway import payment_gateway, GatewayError, GatewayTimeout
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_PROCESSING = "processing"
+PAYMENT_PENDING = "pending"
+PAYMENT_APPROVED = "approved"
+PAYMENT_DECLINED = "declined"
+PAYMENT_ERROR = "error"
+PAYMENT_EXPIRED = "expired"
+
+# Status que ainda seguram o pedido (índice único parcial em `active`)
+ACTIVE_STATUSES = {PAYMENT_PROCESSING, PAYMENT_PENDING, PAYMENT_APPROVED}
+
+_MESSAGES = {
+    PAYMENT_APPROVED: "Pagamento aprovado",
+    PAYMENT_DECLINED: "Pagamento recusado",
+    PAYMENT_PENDING: "Aguardando pagamento PIX",
+    PAYMENT_PROCESSING: "Pagamento em processamento, aguarde a confirmação",
+}
+
+
+def load_payable_order(order_id: str, user_id: str, amount: Optional[float] = None) -> dict:
+    if not ObjectId.is_valid(order_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de pedido inválido"
+        )
+
+    order = orders_collection.find_one({"_id": ObjectId(order_id)})
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Pedido não encontrado"
+        )
+    if order["user_id"] != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Você não tem permissão para pagar este pedido"
+        )
+    if order["status"] != OrderStatus.PENDING.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Pedido com status '{order['status']}' não aguarda pagamento"
+        )
+    if amount is not None and round(amount, 2) != round(order["total"], 2):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Valor não confere com o total do pedido"
+        )
+    return order
+
+
+def _charge_status(charge: dict) -> str:
+    return charge["status"] if charge.get("status") in _MESSAGES else PAYMENT_ERROR
+
+
+def _record_failure(payment: dict, error: str, keep_active: bool = False) -> None:
+    """
+    Guarda o erro no pagamento que ainda está em processamento. Sem
+    keep_active, ele deixa de segurar o pedido; a conciliação continua
+    consultando o gateway nos dois casos.
+    """
+    update = {"last_error": error, "updated_at": datetime.utcnow()}
+    if not keep_active:
+        update.update(status=PAYMENT_ERROR, active=False)
+    payments_collection.update_one(
+        {"_id": payment["_id"], "status": PAYMENT_PROCESSING},
+        {"$set": update}
+    )
+
+
+def apply_charge(payment: dict, charge: dict) -> str:
+    """
+    Registra o resultado do gateway no pagamento e, se aprovado, confirma o
+    pedido na mesma transação. Devolve o status atual do pedido.
+    """
+    payment_status = _charge_status(charge)
+    now = datetime.utcnow()
+    payment_update = {
+        "status": payment_status,
+        "active": payment_status in ACTIVE_STATUSES,
+        "transaction_id": charge.get("id"),
+        "updated_at": now,
+    }
+
+    with start_transaction() as session:
+        if payment_status == PAYMENT_APPROVED:
+            result = orders_collection.update_one(
+                {"_id": ObjectId(payment["order_id"]), "status": OrderStatus.PENDING.value},
+                {
+                    "$set": {
+                        "status": OrderStatus.CONFIRMED.value,
+                        "payment_id": str(payment["_id"]),
+                        "paid_at": now,
+                        "updated_at": now,
+                    }
+                },
+                session=session
+            )
+            # Pedido cancelado enquanto o gateway respondia: estorno pendente
+            if result.modified_count == 0:
+                payment_update["needs_refund"] = True
+
+        payments_collection.update_one(
+            {"_id": payment["_id"]},
+            {"$set": payment_update},
+            session=session
+        )
+
+    order = orders_collection.find_one({"_id": ObjectId(payment["order_id"])}, {"status": 1})
+    return order["status"] if order else OrderStatus.CANCELLED.value
+
+
+def _payment_result(payment: dict, payment_status: str, order_status: str, charge: dict) -> dict:
+    return {
+        "payment_id": str(payment["_id"]),
+        "order_id": payment["order_id"],
+        "status": payment_status,
+        "order_status": order_status,
+        "transaction_id": charge.get("id"),
+        "pix_code": charge.get("pix_code"),
+        "message": _MESSAGES.get(payment_status, "Falha no pagamento"),
+        "created_at": payment["created_at"],
+    }
+
+
+async def charge_order(
+    order: dict,
+    method: str,
+    card: Optional[dict] = None,
+    card_last4: Optional[str] = None
+) -> dict:
+    now = datetime.utcnow()
+    payment = {
+        "order_id": str(order["_id"]),
+        "user_id": order["user_id"],
+        "method": method,
+        "amount": order["total"],
+        "status": PAYMENT_PROCESSING,
+        "active": True,
+        "transaction_id": None,
+        "card_last4": card_last4,
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        payments_collection.insert_one(payment)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Já existe um pagamento em andamento ou aprovado para este pedido"
+        )
+
+    try:
+        charge = await payment_gateway.create_charge(
+            method,
+            order["total"],
+            reference=payment["order_id"],
+            idempotency_key=str(payment["_id"]),
+            card=card
+        )
+        order_status = apply_charge(payment, charge)
+    except GatewayTimeout as e:
+        # A cobrança pode existir no gateway: o pagamento segue ativo até a conciliação
+        _record_failure(payment, str(e), keep_active=True)
+        return _payment_result(payment, PAYMENT_PROCESSING, order["status"], {})
+    except Exception as e:
+        if not isinstance(e, GatewayError):
+            logger.exception("Erro ao processar pagamento", extra={"payment_id": str(payment["_id"])})
+        _record_failure(payment, f"{type(e).__name__}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Gateway de pagamento indisponível. Tente novamente."
+        )
+
+    return _payment_result(payment, _charge_status(charge), order_status, charge)
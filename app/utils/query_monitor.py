@@ -0,0 +1,350 @@
+"""
+Monitoramento dos comandos enviados ao MongoDB.
+
+Um CommandListener do pymongo (registrado no cliente em app/database.py)
+agrupa os comandos por formato de filtro (valores trocados por "?"), mede
+latência e conta as queries de cada requisição. Comandos acima de
+SLOW_QUERY_MS vão para o log com o formato, nunca com os valores.
+
+Com QUERY_EXPLAIN_ENABLED, uma amostra dos formatos lentos passa por
+explain() num job em segundo plano (nunca dentro do listener), marcando os
+que o servidor resolve com COLLSCAN.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Handshake, sessões e o próprio explain não contam como query da aplicação
+_IGNORED = {
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "saslStart", "saslContinue",
+    "endSessions", "commitTransaction", "abortTransaction", "explain",
+}
+# Campos do comando que não podem ir para o explain
+_EXPLAIN_SKIP = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+_EXPLAIN_TTL_SECONDS = 3600
+_MAX_PENDING_EXPLAINS = 20
+_MAX_COMMAND_SPANS = 200
+
+
+class RequestQueries:
+    """Queries feitas durante uma requisição"""
+
+    __slots__ = ("count", "duration_ms", "shapes", "commands")
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        # Repetições de cada formato, para detectar N+1
+        self.shapes: Dict[str, int] = {}
+        # (comando, coleção, fim em ns, duração em ns), só quando o trace é exportado
+        self.commands: Optional[list] = None
+
+
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def current_request_queries() -> Optional[RequestQueries]:
+    return _request_queries.get()
+
+
+def filter_shape(value):
+    """Estrutura do filtro sem os valores: {"status": "?", "total": {"$gt": "?"}}"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        # $and/$or/$nor têm subfiltros; $in/$nin, só valores
+        if value and all(isinstance(item, dict) for item in value):
+            return [filter_shape(item) for item in value]
+        return ["?"] if value else []
+    return "?"
+
+
+def command_shape(command_name: str, command: dict) -> Optional[dict]:
+    """Filtro, ordenação e estágios que definem o plano do comando"""
+    if command_name == "find":
+        shape = {"filter": filter_shape(command.get("filter") or {})}
+    elif command_name in ("count", "distinct", "findAndModify"):
+        shape = {"filter": filter_shape(command.get("query") or {})}
+    elif command_name in ("update", "delete"):
+        statements = command.get(f"{command_name}s") or [{}]
+        shape = {"filter": filter_shape(statements[0].get("q") or {})}
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        shape = {"pipeline": [next(iter(stage), "") for stage in pipeline]}
+        if pipeline and "$match" in pipeline[0]:
+            shape["filter"] = filter_shape(pipeline[0]["$match"])
+    else:
+        return None
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    return shape
+
+
+def _explain_command(command_name: str, command: dict) -> dict:
+    explained = {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in _EXPLAIN_SKIP
+    }
+    # explain aceita só uma instrução de update/delete
+    field = f"{command_name}s"
+    if command_name in ("update", "delete") and explained.get(field):
+        explained[field] = explained[field][:1]
+    return explained
+
+
+def _find_values(document, key: str):
+    if isinstance(document, dict):
+        for name, value in document.items():
+            if name == key:
+                yield value
+            else:
+                yield from _find_values(value, key)
+    elif isinstance(document, list):
+        for item in document:
+            yield from _find_values(item, key)
+
+
+def plan_summary(explain_result: dict) -> dict:
+    """Estágios do plano vencedor; collscan=True se algum deles varre a coleção"""
+    stages = []
+    indexes = []
+    for plan in _find_values(explain_result, "winningPlan"):
+        stages.extend(_find_values(plan, "stage"))
+        indexes.extend(_find_values(plan, "indexName"))
+    return {
+        "collscan": "COLLSCAN" in stages,
+        "stages": list(dict.fromkeys(stages)),
+        "indexes": list(dict.fromkeys(indexes)),
+    }
+
+
+class QueryMonitor(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, tuple] = {}
+        self._shapes: Dict[str, dict] = {}
+        self._routes: Dict[str, dict] = {}
+        self._pending_explains: Dict[str, tuple] = {}
+        self.slow_queries = 0
+        self.dropped_shapes = 0
+
+    # --- listener (roda na thread que executou o comando) ---
+
+    def started(self, event):
+        if event.command_name in _IGNORED:
+            return
+        shape = command_shape(event.command_name, event.command)
+        key = None
+        if shape is not None:
+            collection = event.command.get(event.command_name)
+            key = f"{event.command_name} {collection} {json.dumps(shape, default=str)}"
+        self._inflight[(event.request_id, event.connection_id)] = (
+            key, event.command, event.database_name, _request_queries.get()
+        )
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        entry = self._inflight.pop((event.request_id, event.connection_id), None)
+        if entry is None:
+            return
+        key, command, database_name, request = entry
+        duration_ms = event.duration_micros / 1000
+
+        if request is not None:
+            request.count += 1
+            request.duration_ms += duration_ms
+            if key is not None:
+                request.shapes[key] = request.shapes.get(key, 0) + 1
+            if request.commands is not None and len(request.commands) < _MAX_COMMAND_SPANS:
+                request.commands.append((
+                    event.command_name, command.get(event.command_name), time.time_ns(), event.duration_micros * 1000
+                ))
+        if key is None:
+            return
+
+        slow = duration_ms >= settings.SLOW_QUERY_MS
+        with self._lock:
+            stats = self._shapes.get(key)
+            if stats is None:
+                if len(self._shapes) >= settings.QUERY_MONITOR_MAX_SHAPES:
+                    self.dropped_shapes += 1
+                    stats = None
+                else:
+                    stats = self._shapes[key] = {
+                        "command": event.command_name,
+                        "collection": command.get(event.command_name),
+                        "shape": key.split(" ", 2)[2],
+                        "count": 0,
+                        "slow_count": 0,
+                        "total_ms": 0.0,
+                        "max_ms": 0.0,
+                        "last_slow_at": None,
+                        "plan": None,
+                        "explained_at": 0.0,
+                    }
+            if stats is not None:
+                stats["count"] += 1
+                stats["total_ms"] += duration_ms
+                stats["max_ms"] = max(stats["max_ms"], duration_ms)
+                if slow:
+                    stats["slow_count"] += 1
+                    stats["last_slow_at"] = datetime.utcnow()
+                    self._maybe_queue_explain(key, stats, event.command_name, command, database_name)
+            if slow:
+                self.slow_queries += 1
+
+        if slow:
+            logger.warning(
+                "Query lenta no MongoDB",
+                extra={
+                    "command": event.command_name,
+                    "collection": command.get(event.command_name),
+                    "duration_ms": round(duration_ms, 1),
+                    "shape": key.split(" ", 2)[2],
+                }
+            )
+
+    def _maybe_queue_explain(self, key, stats, command_name, command, database_name) -> None:
+        if not settings.QUERY_EXPLAIN_ENABLED or key in self._pending_explains:
+            return
+        if time.monotonic() - stats["explained_at"] < _EXPLAIN_TTL_SECONDS and stats["plan"] is not None:
+            return
+        if len(self._pending_explains) >= _MAX_PENDING_EXPLAINS:
+            return
+        if random.random() < settings.QUERY_EXPLAIN_SAMPLE_RATE:
+            self._pending_explains[key] = (database_name, _explain_command(command_name, command))
+
+    # --- requisições ---
+
+    def record_request(self, route: str, request: RequestQueries) -> None:
+        with self._lock:
+            stats = self._routes.setdefault(
+                route, {"requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0}
+            )
+            stats["requests"] += 1
+            stats["queries"] += request.count
+            stats["max_queries"] = max(stats["max_queries"], request.count)
+            stats["db_ms"] += request.duration_ms
+
+    # --- explain em segundo plano ---
+
+    def explain_pending(self) -> int:
+        """Roda explain() nos formatos lentos amostrados; devolve quantos foram analisados"""
+        from app.database import get_client
+
+        with self._lock:
+            pending, self._pending_explains = self._pending_explains, {}
+        if not pending:
+            return 0
+
+        cli, _ = get_client()
+        if cli is None:
+            return 0
+
+        explained = 0
+        for key, (database_name, command) in pending.items():
+            try:
+                result = cli[database_name].command({"explain": command, "verbosity": "queryPlanner"})
+            except Exception as e:
+                logger.debug("explain() falhou", extra={"shape": key, "error": str(e)})
+                continue
+            summary = plan_summary(result)
+            with self._lock:
+                stats = self._shapes.get(key)
+                if stats is not None:
+                    stats["plan"] = summary
+                    stats["explained_at"] = time.monotonic()
+            explained += 1
+            if summary["collscan"]:
+                logger.warning(
+                    "Query lenta sem índice (COLLSCAN)",
+                    extra={"shape": key, "stages": summary["stages"]}
+                )
+        return explained
+
+    # --- consulta ---
+
+    def top_offenders(self, limit: int = 20) -> List[dict]:
+        """Formatos com mais tempo acumulado no banco"""
+        with self._lock:
+            shapes = [dict(stats) for stats in self._shapes.values()]
+        shapes.sort(key=lambda s: s["total_ms"], reverse=True)
+        offenders = []
+        for stats in shapes[:limit]:
+            stats.pop("explained_at")
+            stats["avg_ms"] = round(stats["total_ms"] / stats["count"], 2)
+            stats["total_ms"] = round(stats["total_ms"], 1)
+            stats["max_ms"] = round(stats["max_ms"], 1)
+            stats["collscan"] = stats["plan"]["collscan"] if stats["plan"] else None
+            offenders.append(stats)
+        return offenders
+
+    def route_stats(self) -> List[dict]:
+        """Queries por requisição em cada rota, das mais pesadas para as mais leves"""
+        with self._lock:
+            routes = {route: dict(stats) for route, stats in self._routes.items()}
+        result = [
+            {
+                "route": route,
+                "requests": stats["requests"],
+                "avg_queries": round(stats["queries"] / stats["requests"], 2),
+                "max_queries": stats["max_queries"],
+                "avg_db_ms": round(stats["db_ms"] / stats["requests"], 2),
+            }
+            for route, stats in routes.items()
+        ]
+        result.sort(key=lambda r: r["avg_queries"], reverse=True)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "shapes": len(self._shapes),
+                "slow_queries": self.slow_queries,
+                "collscan_shapes": sum(
+                    1 for s in self._shapes.values() if s["plan"] and s["plan"]["collscan"]
+                ),
+                "dropped_shapes": self.dropped_shapes,
+                "pending_explains": len(self._pending_explains),
+            }
+
+
+query_monitor = QueryMonitor()
+
+
+class QueryCountMiddleware:
+    """Middleware ASGI: conta as queries de cada requisição, agrupando por rota"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestQueries()
+        token = _request_queries.set(request)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                query_monitor.record_request(route.path, request)
@@ -0,0 +1,164 @@
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, Request, status
+
+from app.config import settings
+
+
+class RateLimitStore(ABC):
+    """
+    Armazenamento dos buckets e bloqueios.
+    Uma implementação compartilhada (ex.: Redis) precisa fazer `take`
+    de forma atômica para valer entre instâncias.
+    """
+
+    @abstractmethod
+    def take(self, key: str, capacity: int, refill_per_second: float, cost: int = 1) -> float:
+        """Consome fichas; retorna 0 se permitido ou os segundos até haver saldo"""
+
+    @abstractmethod
+    def add_failure(self, key: str, window_seconds: float) -> int:
+        """Soma uma falha consecutiva e retorna o total"""
+
+    @abstractmethod
+    def clear_failures(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def lock(self, key: str, seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    def lock_remaining(self, key: str) -> float:
+        ...
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Store local ao processo, limitado a `max_keys` chaves (LRU)"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._failures: "OrderedDict[str, list]" = OrderedDict()
+        self._locks: "OrderedDict[str, float]" = OrderedDict()
+
+    def _touch(self, table: OrderedDict, key: str, value) -> None:
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_keys:
+            table.popitem(last=False)
+
+    def take(self, key: str, capacity: int, refill_per_second: float, cost: int = 1) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+
+        if tokens >= cost:
+            self._touch(self._buckets, key, (tokens - cost, now))
+            return 0.0
+
+        self._touch(self._buckets, key, (tokens, now))
+        return (cost - tokens) / refill_per_second
+
+    def add_failure(self, key: str, window_seconds: float) -> int:
+        now = time.monotonic()
+        count, last = self._failures.get(key, (0, now))
+        if now - last > window_seconds:
+            count = 0
+        count += 1
+        self._touch(self._failures, key, (count, now))
+        return count
+
+    def clear_failures(self, key: str) -> None:
+        self._failures.pop(key, None)
+
+    def lock(self, key: str, seconds: float) -> None:
+        self._touch(self._locks, key, time.monotonic() + seconds)
+
+    def lock_remaining(self, key: str) -> float:
+        until = self._locks.get(key)
+        if until is None:
+            return 0.0
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            self._locks.pop(key, None)
+            return 0.0
+        return remaining
+
+
+def _too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Muitas tentativas. Tente novamente mais tarde.",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class AuthThrottle:
+    """Limites por IP e por conta para as rotas de autenticação"""
+
+    def __init__(self, store: RateLimitStore):
+        self.store = store
+        self.rejected = 0
+
+    def client_ip(self, request: Request) -> str:
+        if settings.RATE_LIMIT_TRUST_PROXY:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    def _take(self, key: str, burst: int, per_minute: float) -> None:
+        wait = self.store.take(key, burst, per_minute / 60)
+        if wait:
+            self.rejected += 1
+            raise _too_many_requests(wait)
+
+    def check_ip(self, request: Request, action: str, burst: int, per_minute: float) -> None:
+        if settings.RATE_LIMIT_ENABLED:
+            self._take(f"{action}:ip:{self.client_ip(request)}", burst, per_minute)
+
+    def check_account(self, action: str, account: str) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        account = account.lower()
+        remaining = self.store.lock_remaining(f"lock:{account}")
+        if remaining:
+            self.rejected += 1
+            raise _too_many_requests(remaining)
+        self._take(
+            f"{action}:account:{account}",
+            settings.LOGIN_ACCOUNT_BURST,
+            settings.LOGIN_ACCOUNT_PER_MINUTE
+        )
+
+    def record_failure(self, account: str) -> None:
+        """Após LOCKOUT_THRESHOLD falhas seguidas, bloqueia com tempo dobrando a cada nova falha"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        account = account.lower()
+        failures = self.store.add_failure(f"fail:{account}", settings.LOCKOUT_MAX_SECONDS)
+        if failures >= settings.LOCKOUT_THRESHOLD:
+            seconds = settings.LOCKOUT_BASE_SECONDS * 2 ** (failures - settings.LOCKOUT_THRESHOLD)
+            self.store.lock(f"lock:{account}", min(seconds, settings.LOCKOUT_MAX_SECONDS))
+
+    def record_success(self, account: str) -> None:
+        self.store.clear_failures(f"fail:{account.lower()}")
+
+
+auth_throttle = AuthThrottle(InMemoryRateLimitStore())
+
+
+def throttle_ip(action: str, burst: Optional[int] = None, per_minute: Optional[float] = None):
+    """Dependência que aplica o limite por IP antes de qualquer outra dependência"""
+    def dependency(request: Request) -> None:
+        auth_throttle.check_ip(
+            request,
+            action,
+            burst or settings.LOGIN_IP_BURST,
+            per_minute or settings.LOGIN_IP_PER_MINUTE
+        )
+    return dependency
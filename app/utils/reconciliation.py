@@ -0,0 +1,314 @@
+"""
+Conciliação de pagamentos e pedidos.
+
+Percorre os pedidos pendentes em lotes (paginação por _id), junta cada lote
+com os pagamentos dele em memória (um $in por lote), consulta no gateway os
+pagamentos em aberto e grava o resultado em bulk numa transação por lote:
+
+- pagamento aprovado: pedido confirmado;
+- sem pagamento aprovado após PAYMENT_EXPIRATION_MINUTES: pedido cancelado
+  e estoque devolvido pelo ledger.
+
+Cada execução grava um relatório em `reconciliation_runs`.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from app.config import settings
+from app.database import (
+    orders_collection,
+    payments_collection,
+    reconciliation_runs_collection,
+    start_transaction
+)
+from app.models.order import OrderStatus
+from app.utils import inventory
+from app.utils.payment_gateway import payment_gateway, GatewayError
+from app.utils.payments import (
+    PAYMENT_PROCESSING,
+    PAYMENT_PENDING,
+    PAYMENT_APPROVED,
+    PAYMENT_DECLINED,
+    PAYMENT_ERROR,
+    PAYMENT_EXPIRED,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pagamentos cujo resultado final ainda pode mudar no gateway
+OPEN_STATUSES = [PAYMENT_PROCESSING, PAYMENT_PENDING, PAYMENT_ERROR]
+IN_FLIGHT_STATUSES = {PAYMENT_PROCESSING, PAYMENT_PENDING}
+
+_ORDER_PROJECTION = {"created_at": 1, "items.product_id": 1, "items.quantity": 1}
+
+
+def ensure_indexes() -> None:
+    orders_collection.create_index([("status", ASCENDING), ("_id", ASCENDING)])
+
+
+def _next_batch(after: Optional[ObjectId], batch_size: int) -> List[dict]:
+    filters = {"status": OrderStatus.PENDING.value}
+    if after is not None:
+        filters["_id"] = {"$gt": after}
+    return list(
+        orders_collection.find(filters, _ORDER_PROJECTION)
+        .sort("_id", ASCENDING)
+        .limit(batch_size)
+    )
+
+
+def _load_payments(order_ids: List[str]) -> Dict[str, List[dict]]:
+    payments_by_order = defaultdict(list)
+    for payment in payments_collection.find({"order_id": {"$in": order_ids}}):
+        payments_by_order[payment["order_id"]].append(payment)
+    return payments_by_order
+
+
+async def _fetch_charges(payments: List[dict], report: dict) -> Tuple[Dict[ObjectId, dict], Set[ObjectId]]:
+    """
+    Estado atual no gateway dos pagamentos em aberto, com concorrência limitada.
+    Retorna também os pagamentos cuja consulta falhou: o estado deles é desconhecido.
+    """
+    semaphore = asyncio.Semaphore(settings.RECONCILIATION_CONCURRENCY)
+    charges = {}
+    unknown = set()
+
+    async def fetch(payment: dict) -> None:
+        async with semaphore:
+            try:
+                if payment.get("transaction_id"):
+                    charge = await payment_gateway.get_charge(payment["transaction_id"])
+                else:
+                    charge = await payment_gateway.find_charge(str(payment["_id"]))
+            except GatewayError:
+                report["gateway_errors"] += 1
+                unknown.add(payment["_id"])
+                return
+            if charge is not None:
+                charges[payment["_id"]] = charge
+
+    await asyncio.gather(*(fetch(p) for p in payments if p["status"] in OPEN_STATUSES))
+    return charges, unknown
+
+
+def _plan_batch(
+    orders: List[dict],
+    payments_by_order: Dict[str, List[dict]],
+    charges: Dict[ObjectId, dict],
+    unknown: Set[ObjectId],
+    cutoff: datetime
+) -> dict:
+    """Decide, em memória, o que acontece com cada pedido e pagamento do lote"""
+    now = datetime.utcnow()
+    payment_ops = []
+    confirmations = {}
+    expirations = []
+    declined = 0
+
+    for order in orders:
+        order_id = str(order["_id"])
+        payments = payments_by_order.get(order_id, [])
+        effective = {}
+        for payment in payments:
+            charge = charges.get(payment["_id"])
+            effective[payment["_id"]] = charge["status"] if charge else payment["status"]
+
+        approved = [p for p in payments if effective[p["_id"]] == PAYMENT_APPROVED]
+
+        chosen = approved[0] if approved else None
+        # Gateway indisponível para algum pagamento em aberto: pode ter sido
+        # aprovado, então o pedido fica para a próxima execução
+        expire = (
+            chosen is None
+            and order["created_at"] < cutoff
+            and not any(p["_id"] in unknown for p in payments)
+        )
+
+        # Desativa primeiro e ativa depois: o bulk é ordenado e o índice
+        # único parcial nunca vê dois pagamentos ativos para o pedido
+        activate = []
+        for payment in payments:
+            status = effective[payment["_id"]]
+            update = {}
+            if payment is chosen:
+                update = {"status": PAYMENT_APPROVED, "active": True}
+            elif status == PAYMENT_APPROVED:
+                update = {"status": PAYMENT_APPROVED, "active": False, "needs_refund": True}
+            elif chosen is not None and status in IN_FLIGHT_STATUSES:
+                update = {"status": PAYMENT_EXPIRED, "active": False}
+            elif expire and status in IN_FLIGHT_STATUSES:
+                update = {"status": PAYMENT_EXPIRED, "active": False}
+            elif status != payment["status"]:
+                update = {"status": status, "active": status in IN_FLIGHT_STATUSES}
+                if status == PAYMENT_DECLINED:
+                    declined += 1
+
+            if not update:
+                continue
+            charge = charges.get(payment["_id"])
+            if charge is not None:
+                update["transaction_id"] = charge.get("id")
+            update["updated_at"] = now
+            operation = UpdateOne({"_id": payment["_id"]}, {"$set": update})
+            (activate if update["active"] else payment_ops).append(operation)
+        payment_ops.extend(activate)
+
+        if chosen is not None:
+            confirmations[order["_id"]] = chosen["_id"]
+        elif expire:
+            # Inclui PIX ainda aberto além do prazo; se aprovar depois, vira estorno
+            expirations.append(order)
+
+    return {
+        "payment_ops": payment_ops,
+        "confirmations": confirmations,
+        "expirations": expirations,
+        "declined": declined,
+    }
+
+
+def _apply_batch(plan: dict, run_id: ObjectId) -> dict:
+    now = datetime.utcnow()
+    confirmations = plan["confirmations"]
+    expirations = plan["expirations"]
+    result = {"confirmed": 0, "expired": 0, "stock_released": 0, "refunds_flagged": 0}
+
+    with start_transaction() as session:
+        if plan["payment_ops"]:
+            payments_collection.bulk_write(plan["payment_ops"], ordered=True, session=session)
+
+        if confirmations:
+            orders_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": order_id, "status": OrderStatus.PENDING.value},
+                        {"$set": {
+                            "status": OrderStatus.CONFIRMED.value,
+                            "payment_id": str(payment_id),
+                            "paid_at": now,
+                            "updated_at": now,
+                        }}
+                    )
+                    for order_id, payment_id in confirmations.items()
+                ],
+                ordered=False,
+                session=session
+            )
+            confirmed = {
+                order["_id"]
+                for order in orders_collection.find(
+                    {
+                        "_id": {"$in": list(confirmations)},
+                        "payment_id": {"$in": [str(p) for p in confirmations.values()]}
+                    },
+                    {"_id": 1},
+                    session=session
+                )
+            }
+            result["confirmed"] = len(confirmed)
+            # Pedido mudou de status entre a leitura e a escrita: estorno pendente
+            missed = [payment_id for order_id, payment_id in confirmations.items() if order_id not in confirmed]
+            if missed:
+                payments_collection.update_many(
+                    {"_id": {"$in": missed}},
+                    {"$set": {"active": False, "needs_refund": True, "updated_at": now}},
+                    session=session
+                )
+                result["refunds_flagged"] = len(missed)
+
+        if expirations:
+            orders_collection.update_many(
+                {"_id": {"$in": [o["_id"] for o in expirations]}, "status": OrderStatus.PENDING.value},
+                {"$set": {
+                    "status": OrderStatus.CANCELLED.value,
+                    "cancel_reason": "payment_expired",
+                    "expired_by": run_id,
+                    "updated_at": now,
+                }},
+                session=session
+            )
+            # Só devolve estoque dos pedidos que esta execução de fato cancelou
+            expired_ids = {
+                order["_id"]
+                for order in orders_collection.find(
+                    {"_id": {"$in": [o["_id"] for o in expirations]}, "expired_by": run_id},
+                    {"_id": 1},
+                    session=session
+                )
+            }
+            result["expired"] = len(expired_ids)
+            result["stock_released"] = inventory.release_orders(
+                [o for o in expirations if o["_id"] in expired_ids],
+                inventory.REASON_PAYMENT_EXPIRED,
+                session=session
+            )
+
+    return result
+
+
+async def reconcile_payments(
+    batch_size: Optional[int] = None,
+    expire_after_minutes: Optional[int] = None
+) -> dict:
+    """Concilia pagamentos com pedidos pendentes e expira os abandonados"""
+    batch_size = batch_size or settings.RECONCILIATION_BATCH_SIZE
+    expire_after_minutes = expire_after_minutes or settings.PAYMENT_EXPIRATION_MINUTES
+    run_id = ObjectId()
+    started = time.perf_counter()
+    cutoff = datetime.utcnow() - timedelta(minutes=expire_after_minutes)
+
+    report = {
+        "_id": run_id,
+        "started_at": datetime.utcnow(),
+        "orders_scanned": 0,
+        "payments_checked": 0,
+        "confirmed": 0,
+        "declined": 0,
+        "expired": 0,
+        "stock_released": 0,
+        "refunds_flagged": 0,
+        "gateway_errors": 0,
+        "batches": 0,
+    }
+
+    last_id = None
+    while True:
+        orders = await asyncio.to_thread(_next_batch, last_id, batch_size)
+        if not orders:
+            break
+        last_id = orders[-1]["_id"]
+
+        payments_by_order = await asyncio.to_thread(_load_payments, [str(o["_id"]) for o in orders])
+        open_payments = [p for payments in payments_by_order.values() for p in payments]
+        charges, unknown = await _fetch_charges(open_payments, report)
+        plan = _plan_batch(orders, payments_by_order, charges, unknown, cutoff)
+        applied = await asyncio.to_thread(_apply_batch, plan, run_id)
+
+        report["orders_scanned"] += len(orders)
+        report["payments_checked"] += len(charges)
+        report["declined"] += plan["declined"]
+        report["batches"] += 1
+        for key, value in applied.items():
+            report[key] += value
+
+    report["finished_at"] = datetime.utcnow()
+    report["duration_seconds"] = round(time.perf_counter() - started, 3)
+    await asyncio.to_thread(reconciliation_runs_collection.insert_one, report)
+
+    if report["confirmed"] or report["expired"] or report["refunds_flagged"]:
+        logger.info(
+            "Conciliação de pagamentos concluída",
+            extra={k: v for k, v in report.items() if k not in ("_id", "started_at", "finished_at")}
+        )
+    return report
+
+
+def recent_runs(limit: int = 10) -> List[dict]:
+    runs = reconciliation_runs_collection.find().sort("started_at", -1).limit(limit)
+    return [{"id": str(run.pop("_id")), **run} for run in runs]
@@ -0,0 +1,79 @@
+import asyncio
+import inspect
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Executa uma tarefa em intervalo fixo em segundo plano, dentro do processo"""
+
+    def __init__(self, name: str, interval: float, func: Callable, initial_delay: float = 0.0):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.initial_delay = initial_delay
+        self.runs = 0
+        self.failures = 0
+        self.last_result = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        if inspect.iscoroutinefunction(self.func):
+            result = await self.func()
+        else:
+            result = await asyncio.to_thread(self.func)
+        self.runs += 1
+        self.last_result = result
+        return result
+
+    async def _loop(self) -> None:
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failures += 1
+                logger.exception("Job falhou", extra={"job": self.name})
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name=f"job-{self.name}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+jobs: List[PeriodicJob] = []
+
+
+def register_job(name: str, interval: float, func: Callable, initial_delay: float = 0.0) -> PeriodicJob:
+    job = PeriodicJob(name, interval, func, initial_delay)
+    jobs.append(job)
+    return job
+
+
+def stats() -> dict:
+    """Execuções e falhas por job, com nomes válidos como métrica"""
+    result = {}
+    for job in jobs:
+        name = job.name.replace("-", "_")
+        result[f"{name}_runs"] = job.runs
+        result[f"{name}_failures"] = job.failures
+    return result
+
+
+async def start_jobs() -> None:
+    for job in jobs:
+        job.start()
+
+
+async def stop_jobs() -> None:
+    await asyncio.gather(*(job.stop() for job in jobs))
@@ -0,0 +1,127 @@
+"""
+Métricas e aquecimento do cold start.
+
+Registra quanto tempo o processo levou para importar, ficar pronto e
+responder a primeira requisição (time-to-first-response), a partir do
+início do processo.
+
+Relatório de imports: python -m app.utils.startup [top]
+"""
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_imported_at = time.time()
+
+
+def process_started_at() -> float:
+    """Início do processo pelo /proc (Linux); fora dele, o import deste módulo"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return _imported_at
+
+
+class StartupTimer:
+    def __init__(self):
+        self.process_started = process_started_at()
+        self.startup_began: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.first_response_at: Optional[float] = None
+
+    def _since_start(self, moment: Optional[float]) -> Optional[float]:
+        return round(moment - self.process_started, 3) if moment else None
+
+    def mark_startup(self) -> None:
+        self.startup_began = time.time()
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.time()
+
+    def mark_first_response(self) -> None:
+        self.first_response_at = time.time()
+        logger.info(
+            "Primeira resposta enviada",
+            extra={"time_to_first_response_s": self._since_start(self.first_response_at)}
+        )
+
+    def stats(self) -> dict:
+        return {
+            "import_seconds": self._since_start(self.startup_began),
+            "warmup_seconds": self.warmup_seconds,
+            "ready_seconds": self._since_start(self.ready_at),
+            "time_to_first_response_seconds": self._since_start(self.first_response_at),
+        }
+
+
+startup_timer = StartupTimer()
+
+
+def warm_up(app) -> float:
+    """
+    Faz antes do primeiro request o trabalho que seria pago por ele.
+    Os validadores do pydantic v2 já são compilados no import dos models;
+    o que sobra é o schema OpenAPI, o backend do bcrypt e o cliente OAuth.
+    """
+    from app.utils.auth import pwd_context
+    from app.utils.google_oauth import get_oauth
+
+    started = time.perf_counter()
+    app.openapi()
+    pwd_context.handler("bcrypt").get_backend()
+    get_oauth()
+    startup_timer.warmup_seconds = round(time.perf_counter() - started, 3)
+    return startup_timer.warmup_seconds
+
+
+class FirstResponseMiddleware:
+    """Middleware ASGI que marca o envio da primeira resposta HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or startup_timer.first_response_at is not None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_and_mark(message):
+            await send(message)
+            if message["type"] == "http.response.start" and startup_timer.first_response_at is None:
+                startup_timer.mark_first_response()
+
+        await self.app(scope, receive, send_and_mark)
+
+
+def import_time_report(module: str = "app.main", top: int = 20) -> list[tuple[int, int, str]]:
+    """Roda `python -X importtime` num subprocesso e devolve os imports mais caros"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative_us), int(self_us), name.rstrip()))
+    entries.sort(reverse=True)
+    return entries[:top]
+
+
+if __name__ == "__main__":
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'acumulado ms':>13} {'próprio ms':>11}  módulo")
+    for cumulative_us, self_us, name in import_time_report(top=top):
+        print(f"{cumulative_us / 1000:13.1f} {self_us / 1000:11.1f}  {name}")
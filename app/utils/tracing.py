@@ -0,0 +1,300 @@
+"""
+Tracing por requisição.
+
+Divide o tempo de cada requisição em fases (auth, db, handler e
+serialização) e devolve o resultado no header Server-Timing. O tempo de
+banco vem do monitor de queries; auth e handler são exclusivos, sem o
+tempo gasto no MongoDB dentro deles. A serialização vai do retorno do
+endpoint até o início da resposta (validação do response_model + JSON).
+
+Com TRACE_EXPORT_PATH, os traces são gravados em JSON lines no formato
+OTLP/JSON (um ExportTraceServiceRequest por linha), legível pelo receiver
+`otlpjsonfile` do OpenTelemetry Collector ou por qualquer script.
+
+Em desenvolvimento, avisa quando uma requisição repete o mesmo formato de
+query N_PLUS_ONE_THRESHOLD vezes ou mais (o padrão N+1).
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from fastapi.routing import APIRoute
+
+from app.config import settings
+from app.utils.query_monitor import RequestQueries, current_request_queries
+
+logger = logging.getLogger(__name__)
+
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_SPAN_KIND_CLIENT = 3
+
+
+class Trace:
+    """Fases e spans de uma requisição"""
+
+    def __init__(self, queries: Optional[RequestQueries], trace_id: Optional[str] = None, parent_span_id: str = ""):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.queries = queries or RequestQueries()
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter()
+        self.end_ns = 0
+        self.phases = {}
+        self.spans: List[dict] = []
+        self.handler_end: Optional[float] = None
+        self.response_start: Optional[float] = None
+
+    def _db_ms(self) -> float:
+        return self.queries.duration_ms
+
+    @contextmanager
+    def phase(self, name: str):
+        start_ns = time.time_ns()
+        started = time.perf_counter()
+        db_before = self._db_ms()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            db_ms = self._db_ms() - db_before
+            self.phases[name] = self.phases.get(name, 0.0) + max(elapsed_ms - db_ms, 0.0)
+            self.spans.append({"name": name, "start_ns": start_ns, "end_ns": time.time_ns()})
+            if name == "handler":
+                self.handler_end = time.perf_counter()
+
+    def mark_response_start(self) -> None:
+        self.response_start = time.perf_counter()
+        if self.handler_end is not None:
+            serialize_ms = (self.response_start - self.handler_end) * 1000
+            self.phases["serialize"] = serialize_ms
+            end_ns = time.time_ns()
+            self.spans.append({"name": "serialize", "start_ns": end_ns - int(serialize_ms * 1e6), "end_ns": end_ns})
+
+    def server_timing(self) -> str:
+        entries = [
+            f"{name};dur={self.phases[name]:.2f}"
+            for name in ("auth", "handler", "serialize")
+            if name in self.phases
+        ]
+        entries.append(f'db;dur={self._db_ms():.2f};desc="{self.queries.count} queries"')
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_phase(name: str):
+    """Atribui o bloco a uma fase do trace atual; sem trace, não faz nada"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.phase(name):
+        yield
+
+
+def _traced_call(call):
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def traced(*args, **kwargs):
+            with trace_phase("handler"):
+                return await call(*args, **kwargs)
+    else:
+        @functools.wraps(call)
+        def traced(*args, **kwargs):
+            with trace_phase("handler"):
+                return call(*args, **kwargs)
+    return traced
+
+
+class TracedRoute(APIRoute):
+    """APIRoute que mede o endpoint como fase "handler" do trace"""
+
+    def get_route_handler(self):
+        # A dependência já foi analisada com o endpoint original; só a chamada muda
+        self.dependant.call = _traced_call(self.dependant.call)
+        return super().get_route_handler()
+
+
+def _parse_traceparent(value: str):
+    """Header W3C traceparent: 00-<trace id>-<span id>-<flags>"""
+    parts = value.split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, ""
+
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _span(trace: Trace, name: str, start_ns: int, end_ns: int, kind: int, parent: str, attributes: dict) -> dict:
+    return {
+        "traceId": trace.trace_id,
+        "spanId": trace.span_id if kind == _SPAN_KIND_SERVER else os.urandom(8).hex(),
+        "parentSpanId": parent,
+        "name": name,
+        "kind": kind,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [_attribute(k, v) for k, v in attributes.items()],
+    }
+
+
+def to_otlp(trace: Trace, method: str, route: str, status_code: int) -> dict:
+    """Trace como ExportTraceServiceRequest (OTLP/JSON)"""
+    spans = [
+        _span(
+            trace, f"{method} {route}", trace.start_ns, trace.end_ns, _SPAN_KIND_SERVER, trace.parent_span_id,
+            {
+                "http.request.method": method,
+                "http.route": route,
+                "http.response.status_code": status_code,
+                "db.query_count": trace.queries.count,
+                "db.duration_ms": round(trace.queries.duration_ms, 3),
+            }
+        )
+    ]
+    for span in trace.spans:
+        spans.append(_span(trace, span["name"], span["start_ns"], span["end_ns"], _SPAN_KIND_INTERNAL, trace.span_id, {}))
+    for command_name, collection, end_ns, duration_ns in trace.queries.commands or []:
+        spans.append(_span(
+            trace, f"mongodb {command_name} {collection}", end_ns - duration_ns, end_ns, _SPAN_KIND_CLIENT, trace.span_id,
+            {"db.system": "mongodb", "db.operation.name": command_name, "db.collection.name": collection}
+        ))
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                _attribute("service.name", settings.APP_NAME),
+                _attribute("service.version", settings.VERSION),
+                _attribute("deployment.environment", settings.ENVIRONMENT),
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+class OtlpFileExporter:
+    """Grava os traces numa thread própria, fora do event loop"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, payload: dict) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        self._queue.put(payload)
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as output:
+            while True:
+                payload = self._queue.get()
+                if payload is None:
+                    break
+                output.write(json.dumps(payload, separators=(",", ":")) + "\n")
+                if self._queue.empty():
+                    output.flush()
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+exporter = OtlpFileExporter(settings.TRACE_EXPORT_PATH) if settings.TRACE_EXPORT_PATH else None
+
+
+def shutdown() -> None:
+    if exporter is not None:
+        exporter.shutdown()
+
+
+def _warn_n_plus_one(method: str, route: str, queries: RequestQueries) -> None:
+    for shape, count in queries.shapes.items():
+        if count >= settings.N_PLUS_ONE_THRESHOLD:
+            logger.warning(
+                "Possível N+1: mesma query repetida na requisição",
+                extra={"route": f"{method} {route}", "shape": shape, "count": count}
+            )
+
+
+class TracingMiddleware:
+    """Middleware ASGI: trace da requisição, Server-Timing e alerta de N+1"""
+
+    def __init__(self, app):
+        self.app = app
+        self._traceparent = b"traceparent"
+        self._server_timing = b"server-timing"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_span_id = None, ""
+        for name, value in scope.get("headers", []):
+            if name == self._traceparent:
+                trace_id, parent_span_id = _parse_traceparent(value.decode("latin-1"))
+                break
+
+        queries = current_request_queries()
+        export = exporter is not None and random.random() < settings.TRACE_SAMPLE_RATE
+        if export and queries is not None:
+            queries.commands = []
+        trace = Trace(queries, trace_id, parent_span_id)
+        token = _current_trace.set(trace)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                trace.mark_response_start()
+                if settings.server_timing_enabled():
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (self._server_timing, trace.server_timing().encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_trace.reset(token)
+            trace.end_ns = time.time_ns()
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            if settings.ENVIRONMENT == "development":
+                _warn_n_plus_one(scope["method"], route_path, trace.queries)
+            if export:
+                exporter.export(to_otlp(trace, scope["method"], route_path, status_code))
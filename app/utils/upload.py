@@ -1,16 +1,39 @@
 import os
+import asyncio
+import hashlib
+import logging
+import time
 import uuid
-from typing import List
+from datetime import datetime, timedelta
+from typing import BinaryIO, List
 from fastapi import UploadFile, HTTPException, status
+from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.database import image_blobs_collection
 
 UPLOAD_DIR = Path("uploads/products")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_URL_PREFIX = "/uploads/products/"
+
+# Arquivos em escrita ficam aqui até o hash do conteúdo ser conhecido
+TEMP_DIR = UPLOAD_DIR / ".tmp"
+TEMP_DIR.mkdir(exist_ok=True)
 
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
 
 MAX_FILE_SIZE = 5 * 1024 * 1024
 
+# Um blob marcado para remoção fica bloqueado até o delete terminar; uma
+# marcação mais antiga que isso é de um processo que caiu no meio
+BLOB_DELETE_TIMEOUT_SECONDS = 60
+BLOB_DELETE_RETRIES = 10
+
+logger = logging.getLogger(__name__)
+
 def validate_image(file: UploadFile) -> None:
     
     file_ext = Path(file.filename).suffix.lower()
@@ -26,26 +49,99 @@ def validate_image(file: UploadFile) -> None:
             detail="O arquivo deve ser uma imagem"
         )
 
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Arquivo muito grande. Máximo: 5MB"
+    )
+
+def blob_relative_path(digest: str, ext: str) -> str:
+    """Caminho do blob dividido por prefixo do hash: ab/cd/abcd...ext"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+def path_from_url(file_url: str) -> Path:
+    """Caminho em disco de uma URL de upload (sharded ou no formato antigo, plano)"""
+    relative = file_url[len(UPLOAD_URL_PREFIX):] if file_url.startswith(UPLOAD_URL_PREFIX) else Path(file_url).name
+    return UPLOAD_DIR / relative
+
+def _add_blob_reference(sha: str, ext: str, size: int) -> dict:
+    """
+    Soma uma referência ao blob, criando o registro se preciso. Um blob
+    marcado por delete_file não é reaproveitado: o upsert cai na chave
+    duplicada e tenta de novo depois que o delete remove o registro.
+    """
+    for attempt in range(BLOB_DELETE_RETRIES):
+        stale = datetime.utcnow() - timedelta(seconds=BLOB_DELETE_TIMEOUT_SECONDS)
+        try:
+            return image_blobs_collection.find_one_and_update(
+                {"_id": sha, "$or": [{"deleting_at": None}, {"deleting_at": {"$lt": stale}}]},
+                {
+                    "$inc": {"refs": 1},
+                    "$unset": {"deleting_at": ""},
+                    "$setOnInsert": {
+                        "path": blob_relative_path(sha, ext),
+                        "size": size,
+                        "created_at": datetime.utcnow()
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            time.sleep(0.05 * (attempt + 1))
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Imagem sendo removida, tente novamente"
+    )
+
+def _stream_to_disk(source: BinaryIO, ext: str) -> str:
+    """
+    Copia em blocos para um arquivo temporário calculando o SHA-256 no
+    caminho, interrompendo assim que o limite de tamanho é ultrapassado.
+    O arquivo só vai para o caminho final (pelo hash) com os.replace, então
+    nunca existe um blob parcial. Conteúdo já armazenado não é gravado de novo,
+    só ganha mais uma referência. Devolve a URL do blob.
+    """
+    temp_path = TEMP_DIR / f"{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(temp_path, "wb") as out:
+            while chunk := source.read(settings.UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > MAX_FILE_SIZE:
+                    raise _file_too_large()
+                digest.update(chunk)
+                out.write(chunk)
+
+        sha = digest.hexdigest()
+        blob = _add_blob_reference(sha, ext, written)
+        destination = UPLOAD_DIR / blob["path"]
+        # Sem o arquivo (registro novo ou delete interrompido), grava o conteúdo
+        if destination.exists():
+            temp_path.unlink()
+            # Renova o mtime para o coletor de órfãs não remover um blob reusado
+            os.utime(destination)
+        else:
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temp_path, destination)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return f"{UPLOAD_URL_PREFIX}{blob['path']}"
+
 async def save_upload_file(file: UploadFile) -> str:
     
     validate_image(file)
     
-    file_ext = Path(file.filename).suffix.lower()
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = UPLOAD_DIR / unique_filename
-    
-    contents = await file.read()
+    # Tamanho informado pelo parser multipart: rejeita sem ler o conteúdo
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise _file_too_large()
     
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Arquivo muito grande. Máximo: 5MB"
-        )
-    
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    file_ext = Path(file.filename).suffix.lower()
     
-    return f"/uploads/products/{unique_filename}"
+    await file.seek(0)
+    return await asyncio.to_thread(_stream_to_disk, file.file, file_ext)
 
 async def save_multiple_files(files: List[UploadFile]) -> List[str]:
     
@@ -55,19 +151,74 @@ async def save_multiple_files(files: List[UploadFile]) -> List[str]:
             detail="Máximo de 5 imagens por produto"
         )
     
-    urls = []
+    # Valida tudo antes de gravar qualquer arquivo
     for file in files:
-        url = await save_upload_file(file)
-        urls.append(url)
+        validate_image(file)
+    
+    semaphore = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+    
+    async def save(file: UploadFile) -> str:
+        async with semaphore:
+            return await save_upload_file(file)
+    
+    results = await asyncio.gather(*(save(file) for file in files), return_exceptions=True)
     
-    return urls
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        # Falha parcial: remove o que já foi gravado
+        for url in results:
+            if isinstance(url, str):
+                delete_file(url)
+        raise errors[0]
+    
+    return results
+
+def remove_stored_files(file_path: Path) -> None:
+    """Remove o arquivo e as variantes geradas a partir dele"""
+    for variant in file_path.parent.glob(f"{file_path.stem}_*"):
+        variant.unlink(missing_ok=True)
+    file_path.unlink(missing_ok=True)
 
 def delete_file(file_url: str) -> None:
+    """
+    Libera uma referência ao arquivo. Blobs compartilhados só saem do disco
+    quando a última referência é removida; URLs antigas (sem blob) saem direto.
+    """
     try:
-        filename = Path(file_url).name
-        file_path = UPLOAD_DIR / filename
-        
-        if file_path.exists():
-            file_path.unlink()
-    except Exception as e:
-        print(f"Erro ao deletar arquivo: {e}")
\ No newline at end of file
+        file_path = path_from_url(file_url)
+        blob = image_blobs_collection.find_one_and_update(
+            {"path": file_url[len(UPLOAD_URL_PREFIX):]},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is not None:
+            if blob["refs"] > 0:
+                return
+            # Marca o blob antes de tirar o arquivo do disco: um upload do mesmo
+            # conteúdo espera o registro sumir em vez de reusar um arquivo removido
+            claimed = image_blobs_collection.update_one(
+                {"_id": blob["_id"], "refs": {"$lte": 0}, "deleting_at": None},
+                {"$set": {"deleting_at": datetime.utcnow()}}
+            )
+            if claimed.modified_count == 0:
+                return
+        remove_stored_files(file_path)
+        if blob is not None:
+            image_blobs_collection.delete_one({"_id": blob["_id"], "deleting_at": {"$ne": None}})
+    except Exception:
+        logger.exception("Erro ao deletar arquivo", extra={"file_url": file_url})
+
+def ensure_indexes() -> None:
+    image_blobs_collection.create_index("path", unique=True)
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Serve uploads com cache longo: o nome do arquivo é o hash (ou um uuid,
+    no formato antigo) e o conteúdo de uma URL nunca muda.
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
\ No newline at end of file
@@ -0,0 +1,19 @@
+"""
+Benchmarks da API.
+
+Os valores abaixo valem só quando não vierem do ambiente: rodam sem os jobs
+periódicos e sem rate limit, para que o resultado meça as rotas.
+"""
+import os
+
+for _name, _value in {
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "SECRET_KEY": "benchmark-secret-key",
+    "ENVIRONMENT": "benchmark",
+    "LOG_LEVEL": "WARNING",
+    "RATE_LIMIT_ENABLED": "false",
+    "ARCHIVE_ENABLED": "false",
+    "RECONCILIATION_ENABLED": "false",
+    "IMAGE_GC_ENABLED": "false",
+}.items():
+    os.environ.setdefault(_name, _value)
@@ -0,0 +1,307 @@
+"""
+Benchmark de carga ponta a ponta.
+
+Popula um MongoDB local (benchmarks.seed), sobe o app ASGI no próprio
+processo e executa cenários concorrentes de navegação, busca, carrinho e
+checkout por um tempo fixo. O relatório JSON traz, por endpoint e por
+cenário, throughput, latência p50/p95/p99 e queries por requisição (lidas
+do header Server-Timing).
+
+Uso:
+    python -m benchmarks.load --duration 30 --concurrency 20 --output bench.json
+    python -m benchmarks.load --save-baseline benchmarks/baseline.json
+    python -m benchmarks.load --baseline benchmarks/baseline.json
+
+Com --baseline, o processo sai com código 1 se algum endpoint piorar além
+de --tolerance (p95, throughput) ou passar a fazer mais queries.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks import seed as seeding
+
+CHECKOUT_ADDRESS = {
+    "street": "Rua das Flores",
+    "number": "123",
+    "neighborhood": "Centro",
+    "city": "São Paulo",
+    "state": "SP",
+    "zip_code": "01234-567",
+}
+DEFAULT_MIX = "browse=50,search=20,cart=20,checkout=10"
+
+_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil pelo método nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.queries: Dict[str, List[int]] = defaultdict(list)
+        self.scenarios: Dict[str, List[float]] = defaultdict(list)
+        self.enabled = True
+
+    def request(self, name: str, elapsed_ms: float, response: Optional[httpx.Response]) -> None:
+        if not self.enabled:
+            return
+        self.latencies[name].append(elapsed_ms)
+        if response is None or response.status_code >= 400:
+            self.errors[name] += 1
+            return
+        match = _QUERIES.search(response.headers.get("server-timing", ""))
+        if match:
+            self.queries[name].append(int(match.group(1)))
+
+    def scenario(self, name: str, elapsed_ms: float) -> None:
+        if self.enabled:
+            self.scenarios[name].append(elapsed_ms)
+
+
+def _summary(values: List[float], seconds: float) -> dict:
+    ordered = sorted(values)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 2),
+        "p95_ms": round(percentile(ordered, 95), 2),
+        "p99_ms": round(percentile(ordered, 99), 2),
+        "mean_ms": round(sum(ordered) / len(ordered), 2) if ordered else 0.0,
+        "max_ms": round(ordered[-1], 2) if ordered else 0.0,
+    }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, headers: dict, data: dict, rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.headers = headers
+        self.data = data
+        self.rng = rng
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        finally:
+            self.recorder.request(name, (time.perf_counter() - started) * 1000, response)
+        return response
+
+    async def browse(self) -> None:
+        params = {"page": self.rng.randint(1, 5), "page_size": 20}
+        if self.rng.random() < 0.7:
+            params["category"] = self.rng.choice(self.data["categories"])
+        await self.call("GET /products/", "GET", "/products/", params=params)
+        await self.call("GET /products/{product_id}", "GET", f"/products/{self.rng.choice(self.data['product_ids'])}")
+
+    async def search(self) -> None:
+        params = {"search": self.rng.choice(seeding.SEARCH_TERMS), "page_size": 20}
+        await self.call("GET /products/?search", "GET", "/products/", params=params)
+
+    async def cart(self) -> None:
+        product_id = self.rng.choice(self.data["product_ids"])
+        await self.call("POST /cart/add", "POST", "/cart/add", json={"product_id": product_id, "quantity": 1})
+        await self.call("GET /cart/", "GET", "/cart/")
+        await self.call("DELETE /cart/items/{product_id}", "DELETE", f"/cart/items/{product_id}")
+
+    async def checkout(self) -> None:
+        for product_id in self.rng.sample(self.data["product_ids"], self.rng.randint(1, 3)):
+            await self.call("POST /cart/add", "POST", "/cart/add", json={"product_id": product_id, "quantity": 1})
+        await self.call(
+            "POST /orders/", "POST", "/orders/",
+            json={"payment_method": "PIX", "shipping_address": CHECKOUT_ADDRESS}
+        )
+        # O carrinho é limpo pela outbox; limpar aqui mantém o tamanho estável
+        await self.call("DELETE /cart/clear", "DELETE", "/cart/clear")
+
+    async def run(self, scenarios: List[str], weights: List[float], deadline: float) -> None:
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(scenarios, weights)[0]
+            started = time.perf_counter()
+            await getattr(self, name)()
+            self.recorder.scenario(name, (time.perf_counter() - started) * 1000)
+
+
+def parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("browse", "search", "cart", "checkout"):
+            raise SystemExit(f"Cenário desconhecido: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _load_data(users: int) -> dict:
+    from app.database import products_collection, users_collection
+    from app.models.product import CategoryEnum
+    from app.utils.auth import create_user_access_token
+
+    product_ids = [str(p["_id"]) for p in products_collection.find({}, {"_id": 1}).limit(5000)]
+    accounts = list(users_collection.find({"email": {"$regex": "^bench"}}).limit(users))
+    if not product_ids or not accounts:
+        raise SystemExit("Banco de benchmark vazio: rode sem --no-seed")
+    return {
+        "product_ids": product_ids,
+        "categories": [c.value for c in CategoryEnum],
+        # Tokens emitidos direto: o login (bcrypt) não entra na medição
+        "tokens": [create_user_access_token(user) for user in accounts],
+    }
+
+
+async def run_load(duration: float, concurrency: int, warmup: float, mix: Dict[str, float], random_seed: int) -> dict:
+    from app.config import settings
+    from app.main import app
+
+    # As queries por requisição vêm do Server-Timing, desligado fora de desenvolvimento
+    settings.TRACE_SERVER_TIMING = True
+
+    recorder = Recorder()
+    scenarios, weights = list(mix), list(mix.values())
+
+    async with app.router.lifespan_context(app):
+        data = await asyncio.to_thread(_load_data, concurrency)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            users = [
+                VirtualUser(
+                    client, recorder,
+                    {"Authorization": f"Bearer {data['tokens'][i % len(data['tokens'])]}"},
+                    data, random.Random(random_seed + i)
+                )
+                for i in range(concurrency)
+            ]
+
+            if warmup > 0:
+                recorder.enabled = False
+                deadline = time.perf_counter() + warmup
+                await asyncio.gather(*(u.run(scenarios, weights, deadline) for u in users))
+                recorder.enabled = True
+
+            started = time.perf_counter()
+            deadline = started + duration
+            await asyncio.gather(*(u.run(scenarios, weights, deadline) for u in users))
+            elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name in sorted(recorder.latencies):
+        summary = _summary(recorder.latencies[name], elapsed)
+        summary["errors"] = recorder.errors.get(name, 0)
+        queries = recorder.queries.get(name)
+        summary["queries_per_request"] = round(sum(queries) / len(queries), 2) if queries else None
+        endpoints[name] = summary
+
+    total_requests = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "seconds": round(elapsed, 2),
+        "totals": {
+            "requests": total_requests,
+            "errors": sum(recorder.errors.values()),
+            "throughput_rps": round(total_requests / elapsed, 2),
+        },
+        "endpoints": endpoints,
+        "scenarios": {name: _summary(values, elapsed) for name, values in sorted(recorder.scenarios.items())},
+    }
+
+
+def _change(current: float, previous: float) -> Optional[float]:
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 1)
+
+
+def compare_reports(baseline: dict, report: dict, tolerance: float) -> dict:
+    """Variação percentual por endpoint e quais pioraram além da tolerância"""
+    comparison = {}
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        p95_change = _change(current["p95_ms"], previous["p95_ms"])
+        throughput_change = _change(current["throughput_rps"], previous["throughput_rps"])
+        reasons = []
+        if p95_change is not None and p95_change > tolerance:
+            reasons.append(f"p95 +{p95_change}%")
+        if throughput_change is not None and throughput_change < -tolerance:
+            reasons.append(f"throughput {throughput_change}%")
+        if (current.get("queries_per_request") or 0) > (previous.get("queries_per_request") or 0):
+            reasons.append(
+                f"queries {previous.get('queries_per_request')} -> {current.get('queries_per_request')}"
+            )
+        comparison[name] = {
+            "p95_change_pct": p95_change,
+            "throughput_change_pct": throughput_change,
+            "regressions": reasons,
+        }
+    return comparison
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de carga da API")
+    seeding.add_arguments(parser)
+    parser.add_argument("--no-seed", action="store_true", help="Reaproveita os dados já gravados")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Peso de cada cenário (padrão: {DEFAULT_MIX})")
+    parser.add_argument("--output", help="Grava o relatório JSON neste arquivo")
+    parser.add_argument("--baseline", help="Compara com um relatório anterior")
+    parser.add_argument("--save-baseline", help="Grava o relatório como nova baseline")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Piora aceita em %% (padrão: 10)")
+    args = parser.parse_args(argv)
+
+    seeding.connect(args.uri, args.db_name)
+    dataset = None
+    if not args.no_seed:
+        dataset = seeding.seed(args.products, args.users, args.orders, args.cart_ratio, args.random_seed)
+
+    mix = parse_mix(args.mix)
+    report = {
+        "started_at": datetime.utcnow().isoformat(),
+        "config": {
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "random_seed": args.random_seed,
+        },
+        "dataset": dataset,
+        **asyncio.run(run_load(args.duration, args.concurrency, args.warmup, mix, args.random_seed)),
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare_reports(json.load(f), report, args.tolerance)
+        if any(entry["regressions"] for entry in report["comparison"].values()):
+            exit_code = 1
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Micro-benchmarks dos trechos de CPU das rotas, sem banco de dados.
+
+Mede tempo por operação (mediana de várias rodadas) e memória alocada
+(pico por chamada e o que fica retido) com tracemalloc:
+
+- conversão de documentos em ProductResponse, OrderResponse e CartResponse,
+  do jeito que o FastAPI faz (validação + dump em JSON);
+- format_cart_items (com a coleção de produtos em memória) e
+  calculate_cart_total;
+- validação de senha do UserCreate;
+- emissão e validação de JWT em app/utils/auth.py.
+
+Uso:
+    python -m benchmarks.micro
+    python -m benchmarks.micro --save-baseline benchmarks/micro_baseline.json
+    python -m benchmarks.micro --baseline benchmarks/micro_baseline.json -k cart
+
+Com --baseline, o processo sai com código 1 se algum caso ficar mais lento
+que --tolerance ou alocar mais que --alloc-tolerance.
+"""
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from benchmarks import seed as seeding
+
+
+class InMemoryProducts:
+    """Substitui products_collection nas funções que fazem lookup por _id"""
+
+    def __init__(self, documents: List[dict]):
+        self._by_id = {doc["_id"]: doc for doc in documents}
+
+    def find_one(self, filters: dict, *args, **kwargs) -> Optional[dict]:
+        return self._by_id.get(filters.get("_id"))
+
+    def find(self, filters: dict, *args, **kwargs) -> List[dict]:
+        ids = filters.get("_id", {}).get("$in", [])
+        return [self._by_id[i] for i in ids if i in self._by_id]
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    from jose import jwt
+    from pydantic import ValidationError
+
+    from app.config import settings
+    from app.models.cart import CartResponse
+    from app.models.order import OrderResponse
+    from app.models.product import ProductListResponse, ProductResponse
+    from app.models.user import UserCreate
+    from app.routes import cart as cart_routes
+    from app.utils import auth, inventory
+    from app.utils.images import thumbnail_url
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    user = seeding._users(rng, 1, "hash", now)[0]
+    products = seeding._products(rng, 20, str(user["_id"]), now)
+    for product in products[:10]:
+        key = f"{product['_id']}"
+        product["image_urls"] = [f"/uploads/products/ab/cd/{key}.jpg"]
+        product["image_variants"] = {
+            key: {
+                size: {fmt: f"/uploads/products/ab/cd/{key}_{size}.{fmt}" for fmt in ("webp", "jpeg")}
+                for size in ("thumb", "medium")
+            }
+        }
+    order_items = seeding._order_items(rng, products)
+    order = {
+        "_id": products[0]["_id"],
+        "order_number": "ORD-20240101-ABCDEF",
+        "user_id": str(user["_id"]),
+        "user_name": user["full_name"],
+        "user_email": user["email"],
+        "items": order_items,
+        "subtotal": round(sum(i["subtotal"] for i in order_items), 2),
+        "shipping_fee": 15.0,
+        "total": round(sum(i["subtotal"] for i in order_items) + 15.0, 2),
+        "payment_method": "PIX",
+        "shipping_address": seeding._address(rng),
+        "status": "Pendente",
+        "created_at": now,
+        "updated_at": now,
+        "estimated_delivery": now,
+        "tracking_code": None,
+    }
+    cart_items = [{"product_id": str(p["_id"]), "quantity": 2} for p in products[:4]]
+
+    cart_routes.products_collection = InMemoryProducts(products)
+    # Sem ledger pendente: o caso mede só a formatação
+    inventory.pending_deltas = lambda product_ids: {}
+    formatted = cart_routes.format_cart_items(cart_items)
+    many_formatted = formatted * 5
+
+    def product_doc(p: dict) -> dict:
+        return {"id": str(p["_id"]), **{k: v for k, v in p.items() if k != "_id"}, "thumbnail_url": thumbnail_url(p)}
+
+    product_page = {"total": 1000, "page": 1, "page_size": 20, "products": [product_doc(p) for p in products]}
+    order_doc = {"id": str(order["_id"]), **{k: v for k, v in order.items() if k != "_id"}}
+    cart_doc = {"user_id": str(user["_id"]), "items": formatted, "total_items": 8, "subtotal": 100.0, "updated_at": now}
+
+    def render(model, document):
+        # O que o FastAPI faz com o retorno do endpoint: valida e gera JSON
+        return json.dumps(model.model_validate(document).model_dump(mode="json"))
+
+    valid_user = {
+        "email": "cliente@example.com",
+        "password": "Senha@Forte123",
+        "password_confirm": "Senha@Forte123",
+        "full_name": "Cliente Exemplo",
+    }
+    weak_user = {**valid_user, "password": "senhafraca1", "password_confirm": "senhafraca1"}
+
+    def validate_weak_user():
+        try:
+            UserCreate.model_validate(weak_user)
+        except ValidationError:
+            pass
+
+    token = auth.create_user_access_token(user)
+    auth.user_cache.set(user["email"].lower(), user)
+
+    return {
+        "product_response": lambda: render(ProductResponse, product_page["products"][0]),
+        "product_list_20": lambda: render(ProductListResponse, product_page),
+        "order_response": lambda: render(OrderResponse, order_doc),
+        "cart_response": lambda: render(CartResponse, cart_doc),
+        "format_cart_items_4": lambda: cart_routes.format_cart_items(cart_items),
+        "calculate_cart_total_20": lambda: cart_routes.calculate_cart_total(many_formatted),
+        "user_create_valid": lambda: UserCreate.model_validate(valid_user),
+        "user_create_weak_password": validate_weak_user,
+        "jwt_encode": lambda: auth.create_user_access_token(user),
+        "jwt_decode": lambda: jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]),
+        "authenticate_cached_user": lambda: auth._authenticate(token),
+    }
+
+
+def _loops_for(func: Callable, min_time: float) -> int:
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= min_time:
+            return loops
+        loops *= 2
+
+
+def measure(func: Callable, min_time: float = 0.05, repeat: int = 7) -> dict:
+    func()
+    loops = _loops_for(func, min_time)
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter_ns()
+            for _ in range(loops):
+                func()
+            timings.append((time.perf_counter_ns() - started) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    # Alocações medidas à parte: o tracemalloc deixa tudo bem mais lento
+    alloc_loops = min(loops, 100)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        for _ in range(alloc_loops - 1):
+            func()
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "ns_per_op": round(median),
+        "min_ns_per_op": round(min(timings)),
+        "ops_per_sec": round(1e9 / median) if median else None,
+        "peak_bytes_per_op": peak - before,
+        "retained_bytes_per_op": round(max(after - before, 0) / alloc_loops),
+        "loops": loops,
+    }
+
+
+def run(selected: Optional[str] = None, min_time: float = 0.05, repeat: int = 7) -> dict:
+    import pydantic
+
+    results = {}
+    for name, func in build_cases().items():
+        if selected and selected not in name:
+            continue
+        results[name] = measure(func, min_time, repeat)
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "pydantic": pydantic.VERSION,
+        "cases": results,
+    }
+
+
+def _change(current: float, previous: float) -> Optional[float]:
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 1)
+
+
+def compare(baseline: dict, report: dict, tolerance: float, alloc_tolerance: float) -> dict:
+    comparison = {}
+    for name, current in report["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if previous is None:
+            continue
+        time_change = _change(current["ns_per_op"], previous["ns_per_op"])
+        alloc_change = _change(current["peak_bytes_per_op"], previous["peak_bytes_per_op"])
+        regressions = []
+        if time_change is not None and time_change > tolerance:
+            regressions.append(f"tempo +{time_change}%")
+        if alloc_change is not None and alloc_change > alloc_tolerance:
+            regressions.append(f"alocação +{alloc_change}%")
+        comparison[name] = {
+            "time_change_pct": time_change,
+            "alloc_change_pct": alloc_change,
+            "regressions": regressions,
+        }
+    return comparison
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks de serialização e validação")
+    parser.add_argument("-k", dest="selected", help="Roda só os casos cujo nome contém o texto")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Segundos por rodada")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", help="Grava o relatório JSON neste arquivo")
+    parser.add_argument("--baseline", help="Compara com um relatório anterior")
+    parser.add_argument("--save-baseline", help="Grava o relatório como nova baseline")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="Piora de tempo aceita em %% (padrão: 15)")
+    parser.add_argument("--alloc-tolerance", type=float, default=10.0, help="Piora de alocação aceita em %% (padrão: 10)")
+    args = parser.parse_args(argv)
+
+    report = run(args.selected, args.min_time, args.repeat)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), report, args.tolerance, args.alloc_tolerance)
+        if any(entry["regressions"] for entry in report["comparison"].values()):
+            exit_code = 1
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Gerador de dados sintéticos para os benchmarks.
+
+Popula um MongoDB local com produtos, usuários, carrinhos e pedidos usando
+insert_many em lotes. O banco é apagado antes, por isso só são aceitos
+nomes que contenham "bench".
+
+Uso: python -m benchmarks.seed --products 5000 --users 1000 --orders 20000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+
+from app import database
+from app.models.order import OrderStatus, PaymentMethod
+from app.models.product import CategoryEnum
+from app.utils import inventory
+
+DEFAULT_URI = "mongodb://localhost:27017"
+DEFAULT_DB = "ecommerce_bench"
+BENCH_PASSWORD = "Bench@1234"
+BATCH_SIZE = 1000
+
+PRODUCT_TYPES = ["Camiseta", "Vestido", "Calça", "Blusa", "Saia", "Jaqueta", "Bermuda", "Pijama", "Body", "Bolsa"]
+MATERIALS = ["Algodão", "Linho", "Jeans", "Seda", "Malha", "Viscose", "Couro", "Moletom"]
+COLORS = ["Azul", "Preto", "Branco", "Vermelho", "Verde", "Rosa", "Bege", "Cinza"]
+BRANDS = ["Aurora", "Brisa", "Catavento", "Dália", "Estrela", "Flor de Lis"]
+STATES = ["SP", "RJ", "MG", "RS", "PR", "BA", "PE", "SC"]
+FIRST_NAMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Hugo", "Isabel", "João"]
+LAST_NAMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Costa", "Almeida"]
+
+SEARCH_TERMS = [t.lower() for t in PRODUCT_TYPES + MATERIALS + COLORS]
+
+
+def connect(uri: str = DEFAULT_URI, db_name: str = DEFAULT_DB) -> None:
+    if "bench" not in db_name:
+        raise SystemExit(f"Recusando usar o banco '{db_name}': o nome precisa conter 'bench'")
+    database.connect_local(uri, db_name)
+
+
+def _insert(collection, documents: List[dict]) -> None:
+    for start in range(0, len(documents), BATCH_SIZE):
+        collection.insert_many(documents[start:start + BATCH_SIZE], ordered=False)
+
+
+def _address(rng: random.Random) -> dict:
+    return {
+        "street": f"Rua {rng.choice(LAST_NAMES)}",
+        "number": str(rng.randint(1, 2000)),
+        "complement": None,
+        "neighborhood": "Centro",
+        "city": "São Paulo",
+        "state": rng.choice(STATES),
+        "zip_code": f"{rng.randint(10000, 99999)}-{rng.randint(100, 999)}",
+    }
+
+
+def _products(rng: random.Random, count: int, created_by: str, now: datetime) -> List[dict]:
+    categories = [c.value for c in CategoryEnum]
+    products = []
+    for i in range(count):
+        name = f"{rng.choice(PRODUCT_TYPES)} {rng.choice(MATERIALS)} {rng.choice(COLORS)} {i}"
+        created_at = now - timedelta(minutes=rng.randint(0, 525600))
+        products.append({
+            "_id": ObjectId(),
+            "name": name,
+            "description": f"{name}: peça confortável, tecido de qualidade e acabamento cuidadoso.",
+            "price": round(rng.uniform(19.9, 499.9), 2),
+            # Estoque alto: o checkout do benchmark não deve esgotar produtos
+            "stock": 1_000_000,
+            "category": rng.choice(categories),
+            "brand": rng.choice(BRANDS),
+            "image_urls": [],
+            "created_at": created_at,
+            "updated_at": created_at,
+            "created_by": created_by,
+        })
+    return products
+
+
+def _users(rng: random.Random, count: int, hashed_password: str, now: datetime) -> List[dict]:
+    return [
+        {
+            "_id": ObjectId(),
+            "email": f"bench{i}@example.com",
+            "full_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "hashed_password": hashed_password,
+            "is_active": True,
+            "is_verified": True,
+            "is_admin": i == 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def _order_items(rng: random.Random, products: List[dict]) -> List[dict]:
+    items = []
+    for product in rng.sample(products, rng.randint(1, min(4, len(products)))):
+        quantity = rng.randint(1, 3)
+        items.append({
+            "product_id": str(product["_id"]),
+            "product_name": product["name"],
+            "product_price": product["price"],
+            "quantity": quantity,
+            "subtotal": round(product["price"] * quantity, 2),
+        })
+    return items
+
+
+def _orders(rng: random.Random, count: int, users: List[dict], products: List[dict], now: datetime) -> List[dict]:
+    statuses = [s.value for s in OrderStatus]
+    methods = [m.value for m in PaymentMethod]
+    orders = []
+    for i in range(count):
+        user = rng.choice(users)
+        items = _order_items(rng, products)
+        subtotal = round(sum(item["subtotal"] for item in items), 2)
+        created_at = now - timedelta(minutes=rng.randint(0, 525600))
+        orders.append({
+            "order_number": f"BENCH{i:010d}",
+            "user_id": str(user["_id"]),
+            "user_name": user["full_name"],
+            "user_email": user["email"],
+            "items": items,
+            "subtotal": subtotal,
+            "shipping_fee": 15.0,
+            "total": round(subtotal + 15.0, 2),
+            "payment_method": rng.choice(methods),
+            "shipping_address": _address(rng),
+            "status": rng.choice(statuses),
+            "created_at": created_at,
+            "updated_at": created_at,
+            "estimated_delivery": created_at + timedelta(days=7),
+            "tracking_code": None,
+        })
+    return orders
+
+
+def _carts(rng: random.Random, users: List[dict], products: List[dict], ratio: float, now: datetime) -> List[dict]:
+    return [
+        {
+            "user_id": str(user["_id"]),
+            "items": [
+                {"product_id": str(p["_id"]), "quantity": rng.randint(1, 2)}
+                for p in rng.sample(products, rng.randint(1, min(4, len(products))))
+            ],
+            "created_at": now,
+            "updated_at": now,
+        }
+        for user in users
+        if rng.random() < ratio
+    ]
+
+
+def seed(
+    products: int = 2000,
+    users: int = 200,
+    orders: int = 5000,
+    cart_ratio: float = 0.3,
+    random_seed: int = 42
+) -> Dict:
+    """Apaga e popula o banco de benchmark; devolve contagens e tempo gasto"""
+    from app.utils.auth import get_password_hash
+
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    db = database.get_db()
+    database.client.drop_database(db.name)
+
+    # Um único hash para todos: bcrypt por usuário dominaria o tempo do seed
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    user_docs = _users(rng, max(users, 1), hashed_password, now)
+    admin_id = str(user_docs[0]["_id"])
+    product_docs = _products(rng, max(products, 1), admin_id, now)
+
+    _insert(database.users_collection, user_docs)
+    _insert(database.products_collection, product_docs)
+    inventory.record_movements(
+        [(str(p["_id"]), p["stock"]) for p in product_docs],
+        inventory.REASON_INITIAL,
+        applied=True
+    )
+    cart_docs = _carts(rng, user_docs, product_docs, cart_ratio, now)
+    if cart_docs:
+        _insert(database.carts_collection, cart_docs)
+    order_docs = _orders(rng, orders, user_docs, product_docs, now)
+    if order_docs:
+        _insert(database.orders_collection, order_docs)
+
+    return {
+        "products": len(product_docs),
+        "users": len(user_docs),
+        "carts": len(cart_docs),
+        "orders": len(order_docs),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--uri", default=DEFAULT_URI)
+    parser.add_argument("--db-name", default=DEFAULT_DB)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--cart-ratio", type=float, default=0.3)
+    parser.add_argument("--random-seed", type=int, default=42)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Popula o MongoDB local com dados sintéticos")
+    add_arguments(parser)
+    args = parser.parse_args()
+    connect(args.uri, args.db_name)
+    report = seed(args.products, args.users, args.orders, args.cart_ratio, args.random_seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
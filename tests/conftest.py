@@ -0,0 +1,19 @@
+import pytest
+
+from app import database
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """Banco em memória (mongomock) no lugar do MongoDB, sem transações"""
+    mongomock = pytest.importorskip("mongomock")
+    client = mongomock.MongoClient()
+    db = client["ecommerce_test"]
+    monkeypatch.setattr(database, "client", client)
+    monkeypatch.setattr(database, "db", db)
+    monkeypatch.setattr(database, "get_client", lambda: (client, db))
+    monkeypatch.setattr(database, "supports_transactions", lambda: False)
+    for wrapper in vars(database).values():
+        if isinstance(wrapper, database.CollectionWrapper):
+            monkeypatch.setattr(wrapper, "_collection", None)
+    return db
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app import database
+from app.utils import archive
+
+
+def _order(status, days_ago, number):
+    when = datetime.utcnow() - timedelta(days=days_ago)
+    return {
+        "_id": ObjectId(),
+        "order_number": number,
+        "user_id": "user-1",
+        "status": status,
+        "items": [{"product_id": "p1", "product_price": 19.9, "quantity": 3, "subtotal": 59.7}],
+        "tracking_code": None,
+        "estimated_delivery": when,
+        "created_at": when,
+        "updated_at": when,
+    }
+
+
+def test_archive_moves_only_old_terminal_orders(mongo):
+    old_delivered = _order("Entregue", 400, "ORD-1")
+    old_pending = _order("Pendente", 400, "ORD-2")
+    recent_delivered = _order("Entregue", 1, "ORD-3")
+    database.orders_collection.insert_many([old_delivered, old_pending, recent_delivered])
+
+    result = archive.archive_orders(older_than_days=180, batch_size=10)
+
+    assert result["archived"] == 1
+    assert database.orders_collection.count_documents({}) == 2
+    stored = database.orders_archive_collection.find_one({"order_number": "ORD-1"})
+    assert "subtotal" not in stored["items"][0]
+    assert "tracking_code" not in stored
+
+    found = archive.find_order({"order_number": "ORD-1"})
+    assert found["items"][0]["subtotal"] == 59.7
+    assert found["tracking_code"] is None
+
+
+def test_archive_rerun_after_partial_failure(mongo):
+    order = _order("Cancelado", 400, "ORD-1")
+    database.orders_collection.insert_one(order)
+    # Falha anterior: arquivou mas não apagou da coleção principal
+    database.orders_archive_collection.insert_one(archive.compact_order(order))
+
+    result = archive.archive_orders(older_than_days=180, batch_size=10)
+
+    assert result["archived"] == 1
+    assert database.orders_collection.count_documents({}) == 0
+    assert database.orders_archive_collection.count_documents({}) == 1
+
+
+def test_list_orders_continues_into_archive(mongo):
+    hot = [_order("Pendente", days, f"HOT-{days}") for days in (1, 2)]
+    cold = [_order("Entregue", days, f"COLD-{days}") for days in (300, 400)]
+    database.orders_collection.insert_many(hot)
+    database.orders_archive_collection.insert_many([archive.compact_order(o) for o in cold])
+
+    total, page = archive.list_orders({"user_id": "user-1"}, skip=1, limit=2)
+
+    assert total == 4
+    assert [o["order_number"] for o in page] == ["HOT-2", "COLD-300"]
+
+
+def test_list_orders_counts_order_being_archived_once(mongo):
+    hot = _order("Pendente", 1, "HOT-1")
+    moving = _order("Entregue", 200, "MOVING")
+    cold = _order("Entregue", 400, "COLD-1")
+    database.orders_collection.insert_many([hot, moving])
+    # Entre o insert no arquivo e o delete da coleção principal
+    database.orders_archive_collection.insert_many([archive.compact_order(moving), archive.compact_order(cold)])
+
+    total, first = archive.list_orders({"user_id": "user-1"}, skip=0, limit=2)
+    _, second = archive.list_orders({"user_id": "user-1"}, skip=2, limit=2)
+
+    assert total == 3
+    assert [o["order_number"] for o in first + second] == ["HOT-1", "MOVING", "COLD-1"]
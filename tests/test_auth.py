@@ -0,0 +1,101 @@
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app import database
+from app.config import settings
+from app.utils import auth
+
+
+@pytest.fixture
+def pwd_context(monkeypatch):
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    monkeypatch.setattr(auth, "pwd_context", context)
+    monkeypatch.setattr(settings, "BCRYPT_MIN_ROUNDS", 5)
+    return context
+
+
+def _hash(context, rounds):
+    return context.hash("Senha@Forte123", rounds=rounds)
+
+
+def test_password_needs_rehash_only_below_the_floor(pwd_context):
+    auth.configure_bcrypt_rounds(6)
+
+    assert auth.password_needs_rehash(_hash(pwd_context, 4))
+    assert not auth.password_needs_rehash(_hash(pwd_context, 5))
+    assert not auth.password_needs_rehash(_hash(pwd_context, 7))
+    assert auth.get_password_hash("Senha@Forte123").startswith("$2b$06$")
+
+
+def test_recalibration_keeps_existing_hashes(pwd_context):
+    auth.configure_bcrypt_rounds(6)
+    existing = auth.get_password_hash("Senha@Forte123")
+
+    auth.configure_bcrypt_rounds(7)
+
+    assert not auth.password_needs_rehash(existing)
+
+
+def test_rounds_below_the_floor_are_accepted(pwd_context):
+    auth.configure_bcrypt_rounds(4)
+
+    assert not auth.password_needs_rehash(_hash(pwd_context, 4))
+
+
+@pytest.fixture
+def user(mongo):
+    user = {"_id": ObjectId(), "email": "cliente@example.com", "full_name": "Cliente", "is_active": True}
+    database.users_collection.insert_one(user)
+    return user
+
+
+def test_refresh_token_rotates_within_family(user):
+    first = auth.create_refresh_token(user)
+
+    tokens = auth.rotate_refresh_token(first)
+
+    assert tokens["refresh_token"] != first
+    families = database.refresh_tokens_collection.distinct("family")
+    assert len(families) == 1
+    assert database.refresh_tokens_collection.count_documents({"used": False}) == 1
+    assert auth.rotate_refresh_token(tokens["refresh_token"])["access_token"]
+
+
+def test_reused_refresh_token_revokes_family(user):
+    first = auth.create_refresh_token(user)
+    second = auth.rotate_refresh_token(first)["refresh_token"]
+
+    with pytest.raises(HTTPException) as exc:
+        auth.rotate_refresh_token(first)
+
+    assert exc.value.status_code == 401
+    assert database.refresh_tokens_collection.count_documents({}) == 0
+    with pytest.raises(HTTPException):
+        auth.rotate_refresh_token(second)
+
+
+def test_refresh_token_rejected_after_revocation(user):
+    token = auth.create_refresh_token(user)
+
+    auth.revoke_user_tokens(user["_id"], user["email"])
+
+    with pytest.raises(HTTPException):
+        auth.rotate_refresh_token(token)
+
+
+def test_authenticated_user_is_cached_until_invalidated(user, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_STATELESS", False)
+    auth.user_cache.clear()
+    token = auth.create_user_access_token(user)
+
+    assert auth._authenticate(token)["full_name"] == "Cliente"
+    database.users_collection.update_one({"_id": user["_id"]}, {"$set": {"full_name": "Novo Nome"}})
+    cached = auth._authenticate(token)
+    assert cached["full_name"] == "Cliente"
+    assert "hashed_password" not in cached
+
+    auth.invalidate_cached_user(user["email"])
+    assert auth._authenticate(token)["full_name"] == "Novo Nome"
+    auth.user_cache.clear()
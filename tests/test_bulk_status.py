@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.bulk_status import iter_lines, iter_rows, process_bulk_status
+
+
+def _rows(body: bytes, fmt: str, chunk_size: int = 7):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    async def collect():
+        return [row async for row in iter_rows(iter_lines(chunks()), fmt)]
+
+    return asyncio.run(collect())
+
+
+def test_csv_quoted_field_with_newline_is_one_row():
+    body = (
+        b"order_number,status,tracking_code\r\n"
+        b'ORD-1,Enviado,"BR123\r\n\r\nBR456"\r\n'
+        b"ORD-2,Entregue,\r\n"
+    )
+
+    rows = _rows(body, "csv")
+
+    assert rows == [
+        (1, {"order_number": "ORD-1", "status": "Enviado", "tracking_code": "BR123\n\nBR456"}, None),
+        (2, {"order_number": "ORD-2", "status": "Entregue", "tracking_code": ""}, None),
+    ]
+
+
+def test_unclosed_quote_is_reported():
+    rows = _rows(b'order_number,status\nORD-1,"Enviado\n', "csv")
+
+    assert rows == [(1, None, "Linha inválida: aspas não fechadas")]
+
+
+def test_invalid_utf8_only_affects_its_row():
+    body = b'{"order_number": "ORD-1"}\n{"order_number": "ORD-\xe9"}\n{"order_number": "ORD-3"}\n'
+
+    rows = _rows(body, "ndjson")
+
+    assert rows[0] == (1, {"order_number": "ORD-1"}, None)
+    assert rows[1] == (2, None, "Linha inválida: texto não está em UTF-8")
+    assert rows[2] == (3, {"order_number": "ORD-3"}, None)
+
+
+def test_csv_header_must_be_utf8():
+    with pytest.raises(HTTPException) as exc:
+        _rows(b"order_number,st\xe1tus\nORD-1,Enviado\n", "csv")
+
+    assert exc.value.status_code == 400
+
+
+def test_cancellation_is_rejected_before_touching_orders(mongo):
+    body = b"order_number,status\nORD-1,Cancelado\n"
+
+    async def chunks():
+        yield body
+
+    report = asyncio.run(process_bulk_status(chunks(), "csv"))
+
+    assert (report["updated"], report["invalid"]) == (0, 1)
+    assert "cancelamento" in report["errors"][0]["error"]
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from app.utils import export
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self.closed = False
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.cursor = FakeCursor(documents)
+
+    def find(self, *args):
+        return self.cursor
+
+
+def test_iter_orders_closes_both_cursors(monkeypatch):
+    hot = FakeCollection([{"_id": 1, "created_at": datetime(2024, 1, 2)}])
+    cold = FakeCollection([{"_id": 2, "created_at": datetime(2024, 1, 1), "items": []}])
+    monkeypatch.setattr(export, "orders_collection", hot)
+    monkeypatch.setattr(export, "orders_archive_collection", cold)
+    monkeypatch.setattr(export, "expand_order", lambda order: order)
+
+    orders = export.iter_orders({})
+    assert next(orders)["_id"] == 2
+    orders.close()
+
+    assert hot.cursor.closed
+    assert cold.cursor.closed
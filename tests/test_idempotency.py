@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.utils import idempotency
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(mongo):
+    idempotency._cache.clear()
+    yield
+    idempotency._cache.clear()
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return {"call": self.calls}
+
+
+def _run(key, scope, payload, func, response=None):
+    return asyncio.run(idempotency.run_idempotent(key, scope, payload, func, response))
+
+
+def test_replay_returns_stored_response(mongo):
+    func = Counter()
+    first = _run("k1", "payments:card:user-1", {"order_id": "1"}, func)
+
+    idempotency._cache.clear()
+    response = Response()
+    second = _run("k1", "payments:card:user-1", {"order_id": "1"}, func, response)
+
+    assert first == second == {"call": 1}
+    assert func.calls == 1
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_same_key_with_other_body_is_rejected(mongo):
+    func = Counter()
+    _run("k1", "payments:card:user-1", {"order_id": "1"}, func)
+
+    with pytest.raises(HTTPException) as exc:
+        _run("k1", "payments:card:user-1", {"order_id": "2"}, func)
+
+    assert exc.value.status_code == 422
+    assert func.calls == 1
+
+
+def test_key_is_scoped_per_user(mongo):
+    func = Counter()
+    _run("k1", "payments:card:user-1", {"order_id": "1"}, func)
+    other = _run("k1", "payments:card:user-2", {"order_id": "1"}, func)
+
+    assert other == {"call": 2}
+
+
+def test_failed_execution_releases_key(mongo):
+    async def fail():
+        raise HTTPException(status_code=409, detail="conflito")
+
+    with pytest.raises(HTTPException):
+        _run("k1", "payments:pix:user-1", {"order_id": "1"}, fail)
+
+    assert _run("k1", "payments:pix:user-1", {"order_id": "1"}, Counter()) == {"call": 1}
@@ -0,0 +1,34 @@
+import io
+
+import pytest
+
+from app.utils.images import generate_variants
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _save(tmp_path, image, name="foto.png"):
+    path = tmp_path / name
+    image.save(path)
+    return path
+
+
+def test_truncated_image_has_no_variants(tmp_path):
+    buffer = io.BytesIO()
+    Image.new("RGB", (400, 400), "red").save(buffer, "PNG")
+    path = tmp_path / "truncada.png"
+    path.write_bytes(buffer.getvalue()[:200])
+
+    assert generate_variants(str(path), 80) is None
+
+
+def test_grayscale_with_alpha_keeps_transparency(tmp_path):
+    path = _save(tmp_path, Image.new("LA", (400, 300), (128, 0)))
+
+    variants = generate_variants(str(path), 80)
+
+    with Image.open(tmp_path / variants["thumb"]["webp"]) as thumb:
+        assert thumb.mode == "RGBA"
+        assert thumb.size == (200, 150)
+    with Image.open(tmp_path / variants["thumb"]["jpeg"]) as thumb:
+        assert thumb.mode == "RGB"
@@ -0,0 +1,69 @@
+from bson import ObjectId
+
+from app import database
+from app.utils import inventory
+
+
+def test_concurrent_apply_pending_applies_each_entry_once(mongo, monkeypatch):
+    product_id = ObjectId()
+    database.products_collection.insert_one({"_id": product_id, "stock": 10})
+    inventory.record_movements([(str(product_id), -2), (str(product_id), -3)], inventory.REASON_ORDER)
+
+    # Segunda execução entra no meio da primeira, depois da leitura do lote
+    bulk_write = database.products_collection.bulk_write
+    nested = []
+
+    def bulk_write_with_concurrent_run(*args, **kwargs):
+        if not nested:
+            nested.append(inventory.apply_pending())
+        return bulk_write(*args, **kwargs)
+
+    monkeypatch.setattr(database.products_collection._get_collection(), "bulk_write", bulk_write_with_concurrent_run)
+    first = inventory.apply_pending()
+
+    assert nested == [{"entries": 0, "products": 0}]
+    assert first == {"entries": 2, "products": 1}
+    assert database.products_collection.find_one({"_id": product_id})["stock"] == 5
+    assert database.inventory_ledger_collection.count_documents({"applied": False}) == 0
+
+
+def test_cart_stock_includes_pending_movements(mongo):
+    from app.routes.cart import format_cart_items
+
+    product_id = ObjectId()
+    database.products_collection.insert_one({"_id": product_id, "name": "Camiseta", "price": 50.0, "stock": 3})
+    inventory.record_movements([(str(product_id), -2)], inventory.REASON_ORDER)
+
+    [item] = format_cart_items([{"product_id": str(product_id), "quantity": 2}])
+
+    assert item["available_stock"] == 1
+    assert item["in_stock"] is False
+
+
+def test_reconcile_keeps_stock_that_predates_the_ledger(mongo):
+    product_id = ObjectId()
+    database.products_collection.insert_one({"_id": product_id, "stock": 10})
+    inventory.record_movements([(str(product_id), -2)], inventory.REASON_ORDER)
+    inventory.apply_pending()
+
+    first = inventory.reconcile()
+    second = inventory.reconcile()
+
+    assert first["opening_balances"] == 1
+    assert first["corrected"] == 0
+    assert second == {"dry_run": False, "opening_balances": 0, "corrected": 0, "drift": []}
+    assert database.products_collection.find_one({"_id": product_id})["stock"] == 8
+    opening = database.inventory_ledger_collection.find_one({"reason": inventory.REASON_OPENING_BALANCE})
+    assert opening["delta"] == 10
+
+
+def test_reconcile_corrects_drift_after_opening_balance(mongo):
+    product_id = ObjectId()
+    database.products_collection.insert_one({"_id": product_id, "stock": 5})
+    inventory.record_movements([(str(product_id), 5)], inventory.REASON_INITIAL, applied=True)
+    database.products_collection.update_one({"_id": product_id}, {"$set": {"stock": 7}})
+
+    result = inventory.reconcile()
+
+    assert result["drift"] == [{"product_id": str(product_id), "stock": 7, "ledger": 5}]
+    assert database.products_collection.find_one({"_id": product_id})["stock"] == 5
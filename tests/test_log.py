@@ -0,0 +1,44 @@
+import io
+import json
+import logging
+from app.utils import log
+from app.utils.log import RequestContextFilter, begin_request, end_request
+
+
+def _record(level):
+    return logging.LogRecord("app.test", level, __file__, 1, "msg", (), None)
+
+
+def test_unsampled_request_drops_info_but_keeps_warnings(monkeypatch):
+    monkeypatch.setattr(log, "_route_sampling", {"/products": 0.0})
+    log_filter = RequestContextFilter(logging.INFO)
+
+    request_id, tokens = begin_request("/products/123", "req-1")
+    try:
+        info, warning = _record(logging.INFO), _record(logging.WARNING)
+        assert log_filter.filter(info) is False
+        assert log_filter.filter(warning) is True
+        assert warning.request_id == "req-1"
+    finally:
+        end_request(tokens)
+
+    assert log_filter.filter(_record(logging.INFO)) is True
+
+
+def test_json_log_with_extra_fields(monkeypatch):
+    monkeypatch.setattr(log.settings, "LOG_FORMAT", "json")
+    log.shutdown_logging()
+    log.setup_logging()
+    output = io.StringIO()
+    log._listener.handlers[0].setStream(output)
+    try:
+        logging.getLogger("app.test").error(
+            "Não foi possível criar índices", extra={"indexes": "app.database"}
+        )
+    finally:
+        log.shutdown_logging()
+        log.setup_logging()
+
+    data = json.loads(output.getvalue())
+    assert data["level"] == "ERROR"
+    assert data["indexes"] == "app.database"
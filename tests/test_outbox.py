@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+
+from app import database
+from app.config import settings
+from app.utils import outbox
+
+
+def _process_one(worker):
+    event = worker._claim()
+    try:
+        asyncio.run(worker._dispatch(event))
+    except Exception as e:
+        worker._fail(event, e)
+    else:
+        worker._complete(event)
+    return event
+
+
+def test_event_is_delivered_and_removed(mongo, monkeypatch):
+    received = []
+    monkeypatch.setattr(outbox, "_handlers", {"order.created": [received.append]})
+    outbox.enqueue_event("order.created", {"order_id": "1"})
+
+    worker = outbox.OutboxWorker()
+    _process_one(worker)
+
+    assert received == [{"order_id": "1"}]
+    assert database.outbox_collection.count_documents({}) == 0
+    assert worker._claim() is None
+
+
+def test_failing_event_is_retried_then_dead_lettered(mongo, monkeypatch):
+    def fail(payload):
+        raise RuntimeError("serviço fora do ar")
+
+    monkeypatch.setattr(outbox, "_handlers", {"order.created": [fail]})
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox, "backoff_delay", lambda attempts: 0)
+    outbox.enqueue_event("order.created", {"order_id": "1"})
+
+    worker = outbox.OutboxWorker()
+    _process_one(worker)
+    pending = database.outbox_collection.find_one({})
+    assert pending["status"] == "pending"
+    assert pending["attempts"] == 1
+    assert pending["last_error"] == "serviço fora do ar"
+
+    _process_one(worker)
+    assert database.outbox_collection.count_documents({}) == 0
+    dead = database.outbox_dead_letter_collection.find_one({})
+    assert dead["attempts"] == 2
+    assert (worker.retried, worker.dead_lettered) == (1, 1)
+
+
+def test_cart_cleanup_keeps_lines_added_after_checkout(mongo):
+    from app.routes import orders
+
+    checkout = datetime(2026, 1, 1)
+    database.carts_collection.insert_one({
+        "user_id": "u1",
+        "items": [
+            {"product_id": "p1", "quantity": 1, "added_at": checkout},
+            {"product_id": "p2", "quantity": 2, "added_at": checkout},
+            {"product_id": "p3", "quantity": 1},
+        ],
+    })
+    payload = {
+        "user_id": "u1",
+        "cart_items": [
+            {"product_id": "p1", "quantity": 1, "added_at": checkout},
+            {"product_id": "p2", "quantity": 2, "added_at": checkout},
+            {"product_id": "p3", "quantity": 1, "added_at": None},
+        ],
+    }
+    # Depois do checkout: p1 removido e adicionado de novo, p2 com quantidade alterada
+    database.carts_collection.update_one(
+        {"user_id": "u1"},
+        {"$set": {"items.0.added_at": datetime(2026, 1, 2), "items.1.quantity": 3}},
+    )
+
+    orders.clear_cart_after_order(payload)
+
+    items = database.carts_collection.find_one({"user_id": "u1"})["items"]
+    assert [(i["product_id"], i["quantity"]) for i in items] == [("p1", 1), ("p2", 3)]
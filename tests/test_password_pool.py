@@ -0,0 +1,22 @@
+import asyncio
+import time
+from fastapi import HTTPException
+from app.utils.password_pool import PasswordHasherPool
+
+
+def test_password_pool_rejects_when_saturated():
+    pool = PasswordHasherPool(workers=1, queue_limit=1)
+
+    async def run():
+        return await asyncio.gather(
+            *[pool.run(time.sleep, 0.05) for _ in range(4)],
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+
+    assert len(rejected) == 2
+    assert rejected[0].status_code == 503
+    assert pool.stats()["completed"] == 2
+    pool.shutdown()
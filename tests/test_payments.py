@@ -0,0 +1,110 @@
+import asyncio
+
+import httpx
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app import database
+from app.config import settings
+from app.utils import payments
+from app.utils.payment_gateway import GatewayError, GatewayTimeout, LimitedTransport, PaymentGateway
+
+
+@pytest.fixture
+def order(mongo):
+    order = {"_id": ObjectId(), "user_id": "user-1", "total": 100.0, "status": "Pendente"}
+    database.orders_collection.insert_one(order)
+    return order
+
+
+def _gateway_returns(monkeypatch, result):
+    async def create_charge(*args, **kwargs):
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(payments.payment_gateway, "create_charge", create_charge)
+
+
+def _payment(order):
+    return database.payments_collection.find_one({"order_id": str(order["_id"])})
+
+
+def test_approved_charge_confirms_order(order, monkeypatch):
+    _gateway_returns(monkeypatch, {"id": "ch_1", "status": "approved"})
+
+    result = asyncio.run(payments.charge_order(order, "card"))
+
+    assert result["status"] == payments.PAYMENT_APPROVED
+    assert result["order_status"] == "Confirmado"
+    assert _payment(order)["active"] is True
+
+
+@pytest.mark.parametrize("failure", [
+    GatewayError("HTTP 503"),
+    ValueError("Expecting value: line 1 column 1 (char 0)"),
+    {"id": "ch_1"},
+])
+def test_failed_charge_releases_order(order, monkeypatch, failure):
+    _gateway_returns(monkeypatch, failure)
+
+    if isinstance(failure, Exception):
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(payments.charge_order(order, "card"))
+        assert exc.value.status_code == 502
+    else:
+        assert asyncio.run(payments.charge_order(order, "card"))["status"] == payments.PAYMENT_ERROR
+
+    payment = _payment(order)
+    assert payment["status"] == payments.PAYMENT_ERROR
+    assert payment["active"] is False
+
+
+def test_timeout_keeps_payment_processing(order, monkeypatch):
+    _gateway_returns(monkeypatch, GatewayTimeout("ReadTimeout: sem resposta"))
+
+    result = asyncio.run(payments.charge_order(order, "card"))
+
+    assert result["status"] == payments.PAYMENT_PROCESSING
+    payment = _payment(order)
+    assert payment["status"] == payments.PAYMENT_PROCESSING
+    assert payment["active"] is True
+    assert payment["last_error"] == "ReadTimeout: sem resposta"
+
+
+@pytest.mark.parametrize("error, expected", [
+    (httpx.ReadTimeout("sem resposta"), GatewayTimeout),
+    (httpx.ConnectTimeout("sem conexão"), GatewayError),
+])
+def test_gateway_reports_unanswered_requests(monkeypatch, error, expected):
+    def handler(request):
+        raise error
+
+    monkeypatch.setattr(settings, "PAYMENT_GATEWAY_MAX_RETRIES", 0)
+    gateway = PaymentGateway()
+    gateway._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://gateway.test")
+
+    with pytest.raises(GatewayError) as exc:
+        asyncio.run(gateway.create_charge("card", 10.0, "ref", "key"))
+    assert type(exc.value) is expected
+
+
+def test_simulator_transport_limits_concurrent_requests():
+    active = []
+    peak = []
+
+    async def handler(request):
+        active.append(1)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.pop()
+        return httpx.Response(200, json={})
+
+    async def run():
+        transport = LimitedTransport(httpx.MockTransport(handler), max_connections=2, pool_timeout=1)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway.test") as client:
+            await asyncio.gather(*(client.get("/charges/1") for _ in range(6)))
+
+    asyncio.run(run())
+    assert max(peak) == 2
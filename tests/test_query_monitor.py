@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from app.config import settings
+from app.utils.query_monitor import QueryMonitor, RequestQueries, _request_queries, filter_shape, plan_summary
+
+
+def test_filter_shape_hides_values():
+    shape = filter_shape({"email": "a@a.com", "total": {"$gt": 10}, "_id": {"$in": [1, 2, 3]}})
+    assert shape == {"email": "?", "total": {"$gt": "?"}, "_id": {"$in": ["?"]}}
+
+
+def test_slow_query_counts_for_request_and_shape(monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 50.0)
+    monitor = QueryMonitor()
+    request = RequestQueries()
+    token = _request_queries.set(request)
+    try:
+        for request_id, micros in ((1, 1000), (2, 80000)):
+            monitor.started(SimpleNamespace(
+                command_name="find", command={"find": "orders", "filter": {"user_id": str(request_id)}},
+                request_id=request_id, connection_id=1, database_name="test"
+            ))
+            monitor.succeeded(SimpleNamespace(
+                command_name="find", request_id=request_id, connection_id=1, duration_micros=micros
+            ))
+    finally:
+        _request_queries.reset(token)
+
+    assert request.count == 2
+    [offender] = monitor.top_offenders()
+    assert offender["shape"] == '{"filter": {"user_id": "?"}}'
+    assert offender["count"] == 2 and offender["slow_count"] == 1
+
+
+def test_plan_summary_flags_collscan():
+    explain = {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "status_1"}}}}
+    assert plan_summary(explain)["collscan"] is False
+    assert plan_summary({"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}})["collscan"] is True
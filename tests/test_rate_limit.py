@@ -0,0 +1,24 @@
+import pytest
+from fastapi import HTTPException
+from app.config import settings
+from app.utils.rate_limit import InMemoryRateLimitStore, AuthThrottle
+
+
+def test_token_bucket_allows_burst_then_rejects():
+    store = InMemoryRateLimitStore()
+
+    assert [store.take("k", capacity=3, refill_per_second=1) for _ in range(3)] == [0, 0, 0]
+    assert store.take("k", capacity=3, refill_per_second=1) > 0
+
+
+def test_account_is_locked_after_consecutive_failures():
+    throttle = AuthThrottle(InMemoryRateLimitStore())
+
+    for _ in range(settings.LOCKOUT_THRESHOLD):
+        throttle.record_failure("Maria@Example.com")
+
+    with pytest.raises(HTTPException) as exc:
+        throttle.check_account("login", "maria@example.com")
+
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= settings.LOCKOUT_BASE_SECONDS - 1
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app import database
+from app.utils import reconciliation
+from app.utils.payment_gateway import GatewayError
+from app.utils.payments import PAYMENT_APPROVED, PAYMENT_ERROR, PAYMENT_EXPIRED, PAYMENT_PENDING, PAYMENT_PROCESSING
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """Estado das cobranças no gateway, por id do pagamento"""
+    charges = {}
+
+    async def find_charge(idempotency_key):
+        return charges.get(idempotency_key)
+
+    async def get_charge(charge_id):
+        return next(c for c in charges.values() if c["id"] == charge_id)
+
+    monkeypatch.setattr(reconciliation.payment_gateway, "find_charge", find_charge)
+    monkeypatch.setattr(reconciliation.payment_gateway, "get_charge", get_charge)
+    return charges
+
+
+def _order(minutes_ago):
+    order = {
+        "_id": ObjectId(),
+        "status": "Pendente",
+        "items": [{"product_id": str(ObjectId()), "quantity": 2}],
+        "created_at": datetime.utcnow() - timedelta(minutes=minutes_ago),
+    }
+    database.orders_collection.insert_one(order)
+    return order
+
+
+def _payment(order, status, active=True):
+    payment = {"_id": ObjectId(), "order_id": str(order["_id"]), "status": status, "active": active}
+    database.payments_collection.insert_one(payment)
+    return payment
+
+
+def _run():
+    return asyncio.run(reconciliation.reconcile_payments(batch_size=10, expire_after_minutes=30))
+
+
+def test_timed_out_payment_is_confirmed_from_gateway(mongo, gateway):
+    order = _order(minutes_ago=5)
+    payment = _payment(order, PAYMENT_PROCESSING)
+    gateway[str(payment["_id"])] = {"id": "ch_1", "status": "approved"}
+
+    report = _run()
+
+    assert report["confirmed"] == 1
+    assert database.orders_collection.find_one({"_id": order["_id"]})["status"] == "Confirmado"
+    stored = database.payments_collection.find_one({"_id": payment["_id"]})
+    assert (stored["status"], stored["active"], stored["transaction_id"]) == (PAYMENT_APPROVED, True, "ch_1")
+
+
+def test_abandoned_order_expires_and_releases_stock(mongo, gateway):
+    order = _order(minutes_ago=60)
+    payment = _payment(order, PAYMENT_ERROR, active=False)
+
+    report = _run()
+
+    assert report["expired"] == 1
+    assert report["stock_released"] == 1
+    assert database.orders_collection.find_one({"_id": order["_id"]})["status"] == "Cancelado"
+    entry = database.inventory_ledger_collection.find_one({})
+    assert (entry["product_id"], entry["delta"]) == (order["items"][0]["product_id"], 2)
+    assert database.payments_collection.find_one({"_id": payment["_id"]})["status"] == PAYMENT_ERROR
+
+
+
+def test_gateway_failure_does_not_expire_order(mongo, gateway, monkeypatch):
+    order = _order(minutes_ago=60)
+    payment = _payment(order, PAYMENT_PENDING)
+
+    async def find_charge(idempotency_key):
+        raise GatewayError("indisponível")
+
+    monkeypatch.setattr(reconciliation.payment_gateway, "find_charge", find_charge)
+
+    report = _run()
+
+    assert report["gateway_errors"] == 1
+    assert report["expired"] == 0
+    assert database.orders_collection.find_one({"_id": order["_id"]})["status"] == "Pendente"
+    stored = database.payments_collection.find_one({"_id": payment["_id"]})
+    assert (stored["status"], stored["active"]) == (PAYMENT_PENDING, True)
+    assert database.inventory_ledger_collection.count_documents({}) == 0
+
+def test_second_approved_payment_is_flagged_for_refund(mongo, gateway):
+    order = _order(minutes_ago=5)
+    first = _payment(order, PAYMENT_PROCESSING)
+    second = _payment(order, PAYMENT_PROCESSING, active=False)
+    gateway[str(first["_id"])] = {"id": "ch_1", "status": "approved"}
+    gateway[str(second["_id"])] = {"id": "ch_2", "status": "approved"}
+
+    _run()
+
+    refunded = database.payments_collection.find_one({"_id": second["_id"]})
+    assert refunded["needs_refund"] is True
+    assert refunded["active"] is False
+    assert database.payments_collection.find_one({"_id": first["_id"]})["active"] is True
+    assert PAYMENT_EXPIRED not in database.payments_collection.distinct("status")
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.utils.query_monitor import QueryCountMiddleware
+from app.utils.tracing import TracedRoute, TracingMiddleware, _parse_traceparent
+
+
+def _client():
+    router = APIRouter(route_class=TracedRoute)
+
+    @router.get("/items/{item_id}")
+    async def read_item(item_id: int):
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(QueryCountMiddleware)
+    return TestClient(app)
+
+
+def test_server_timing_has_phases():
+    response = _client().get("/items/1")
+
+    assert response.json() == {"id": 1}
+    timing = response.headers["server-timing"]
+    for phase in ("handler;dur=", "serialize;dur=", 'db;dur=0.00;desc="0 queries"', "total;dur="):
+        assert phase in timing
+
+
+def test_server_timing_is_off_outside_development(monkeypatch):
+    monkeypatch.setattr(settings, "ENVIRONMENT", "production")
+    monkeypatch.setattr(settings, "TRACE_SERVER_TIMING", None)
+    assert "server-timing" not in _client().get("/items/1").headers
+
+    monkeypatch.setattr(settings, "TRACE_SERVER_TIMING", True)
+    assert "server-timing" in _client().get("/items/1").headers
+
+
+def test_traceparent_is_parsed():
+    trace_id, parent = _parse_traceparent("00-" + "a" * 32 + "-" + "b" * 16 + "-01")
+    assert (trace_id, parent) == ("a" * 32, "b" * 16)
+    assert _parse_traceparent("garbage") == (None, "")
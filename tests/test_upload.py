@@ -0,0 +1,60 @@
+import io
+import threading
+
+from app import database
+from app.utils import upload
+
+
+def _use_tmp_dirs(monkeypatch, tmp_path):
+    monkeypatch.setattr(upload, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(upload, "TEMP_DIR", tmp_path)
+
+
+def _blob(url):
+    return database.image_blobs_collection.find_one({"path": url[len(upload.UPLOAD_URL_PREFIX):]})
+
+
+def test_shared_blob_is_removed_with_last_reference(mongo, tmp_path, monkeypatch):
+    _use_tmp_dirs(monkeypatch, tmp_path)
+
+    first = upload._stream_to_disk(io.BytesIO(b"imagem"), ".png")
+    second = upload._stream_to_disk(io.BytesIO(b"imagem"), ".png")
+    assert first == second
+    assert _blob(first)["refs"] == 2
+
+    upload.delete_file(first)
+    assert upload.path_from_url(first).exists()
+    assert _blob(first)["refs"] == 1
+
+    upload.delete_file(second)
+    assert not upload.path_from_url(first).exists()
+    assert _blob(first) is None
+
+    again = upload._stream_to_disk(io.BytesIO(b"imagem"), ".png")
+    assert upload.path_from_url(again).read_bytes() == b"imagem"
+    assert _blob(again)["refs"] == 1
+
+
+def test_upload_during_delete_writes_the_file_again(mongo, tmp_path, monkeypatch):
+    _use_tmp_dirs(monkeypatch, tmp_path)
+    url = upload._stream_to_disk(io.BytesIO(b"imagem"), ".png")
+
+    # Upload do mesmo conteúdo chega enquanto o delete tira o arquivo do disco
+    remove_stored_files = upload.remove_stored_files
+    uploaded = []
+    uploader = threading.Thread(
+        target=lambda: uploaded.append(upload._stream_to_disk(io.BytesIO(b"imagem"), ".png"))
+    )
+
+    def remove_with_concurrent_upload(file_path):
+        uploader.start()
+        uploader.join(timeout=0.2)
+        remove_stored_files(file_path)
+
+    monkeypatch.setattr(upload, "remove_stored_files", remove_with_concurrent_upload)
+    upload.delete_file(url)
+    uploader.join()
+
+    assert uploaded == [url]
+    assert upload.path_from_url(url).read_bytes() == b"imagem"
+    assert _blob(url)["refs"] == 1